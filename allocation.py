@@ -0,0 +1,297 @@
+from collections import deque
+
+import numpy as np
+
+
+def round_robin(team_counts, capacities) -> np.ndarray:
+    """
+    チームごとの人数を、各グループの人数の上限(capacities)どおりに分ける
+    チームtのc人は、全グループにc//G人ずつ入れ、残りのc%G人を別々のグループに1人ずつ入れる
+    残りはチームの順に、人数の多いグループから順番に巡回して配る
+
+    どのチームも各グループの人数が切り捨て(c/G)か切り上げ(c/G)になるため、
+    被り数の最大値と最小値の差はbounds.stage_lower_boundsの下界に一致し、最適となる
+    (capacitiesの差が1以下であれば、巡回して配った人数の合計は必ずcapacitiesに一致する)
+
+    team_counts: チームごとの人数
+    capacities: 各グループの人数(合計はteam_countsの合計と等しく、差は1以下)
+    返り値: counts[g, t]: グループgに入るt番目のチームの人数
+    """
+    team_counts = np.asarray(team_counts, dtype=np.int64)
+    capacities = np.asarray(capacities, dtype=np.int64)
+    G = len(capacities)
+    if team_counts.sum() != capacities.sum():
+        raise ValueError("チームの人数の合計とグループの人数の合計が一致しません")
+    if capacities.max() - capacities.min() > 1:
+        raise ValueError("グループの人数の差が2以上です")
+
+    counts = np.repeat((team_counts // G)[np.newaxis, :], G, axis=0)
+    # 人数の多いグループから巡回する(同じ人数のときはグループの番号の順)
+    order = np.argsort(-capacities, kind="stable")
+    pos = 0
+    for t, r in enumerate(team_counts % G):
+        groups = order[(pos + np.arange(r)) % G]
+        counts[groups, t] += 1
+        pos = (pos + r) % G
+    return counts
+
+
+def max_flow(num_nodes: int, edges: list, source: int, sink: int):
+    """
+    最大流(Dinic法)
+    edges: (始点, 終点, 容量)のリスト
+    返り値: (流量, 各辺の流量のリスト)
+    """
+    head = [[] for _ in range(num_nodes)]
+    to = []
+    cap = []
+    for u, v, c in edges:
+        head[u].append(len(to))
+        to.append(v)
+        cap.append(c)
+        head[v].append(len(to))
+        to.append(u)
+        cap.append(0)
+
+    flow = 0
+    while True:
+        # 残余グラフで始点からの距離を求める
+        level = [-1] * num_nodes
+        level[source] = 0
+        queue = deque([source])
+        while queue:
+            u = queue.popleft()
+            for e in head[u]:
+                if cap[e] > 0 and level[to[e]] < 0:
+                    level[to[e]] = level[u] + 1
+                    queue.append(to[e])
+        if level[sink] < 0:
+            break
+
+        # 距離が1ずつ増える経路に沿って流す(再帰を使わず、経路を積んで探す)
+        it = [0] * num_nodes
+        while True:
+            path = []
+            u = source
+            while u != sink:
+                while it[u] < len(head[u]):
+                    e = head[u][it[u]]
+                    if cap[e] > 0 and level[to[e]] == level[u] + 1:
+                        break
+                    it[u] += 1
+                if it[u] == len(head[u]):
+                    # 行き止まり: この頂点を使わないようにして一つ戻る
+                    level[u] = -1
+                    if not path:
+                        break
+                    u = to[path.pop() ^ 1]
+                    it[u] += 1
+                    continue
+                e = head[u][it[u]]
+                path.append(e)
+                u = to[e]
+            if u != sink:
+                break
+            f = min(cap[e] for e in path)
+            for e in path:
+                cap[e] -= f
+                cap[e ^ 1] += f
+            flow += f
+
+    return flow, [cap[2 * i + 1] for i in range(len(edges))]
+
+
+def distribute(totals, capacities, low, high):
+    """
+    チームごとの人数を、(グループ, チーム)ごとの人数が[low, high]に入るように各グループへ分ける
+    下限のある流れの問題として、最大流で実行可能な分け方を求める
+
+    totals: チームごとの人数
+    capacities: 各グループの人数
+    low, high: low[g, t], high[g, t]: グループgに入るt番目のチームの人数の下限・上限
+    返り値: counts[g, t](分けられないときはNone)
+    """
+    G, T = low.shape
+    supply = np.asarray(totals) - low.sum(axis=0)
+    demand = np.asarray(capacities) - low.sum(axis=1)
+    # 下限の合計がチームやグループの人数を超える、または上限の合計が足りないときは分けられない
+    if (supply < 0).any() or (demand < 0).any():
+        return None
+    if (high.sum(axis=0) < totals).any() or (high.sum(axis=1) < capacities).any():
+        return None
+
+    # 頂点: 0が始点、1〜Tがチーム、T+1〜T+Gがグループ、T+G+1が終点
+    source, sink = 0, T + G + 1
+    edges = [(source, 1 + t, int(supply[t])) for t in range(T)]
+    edges += [(1 + T + g, sink, int(demand[g])) for g in range(G)]
+    cells = [(g, t) for t in range(T) for g in range(G) if high[g, t] > low[g, t]]
+    edges += [(1 + t, 1 + T + g, int(high[g, t] - low[g, t])) for g, t in cells]
+    flow, flows = max_flow(T + G + 2, edges, source, sink)
+    if flow != supply.sum():
+        return None
+
+    counts = low.astype(np.int64).copy()
+    for (g, t), f in zip(cells, flows[T + G :]):
+        counts[g, t] += f
+    return counts
+
+
+def windows(start: int, stop: int, width_min: int):
+    # [lo, lo + w]の区間を、幅wの小さい順(同じ幅ではloの小さい順)に列挙する
+    for w in range(width_min, stop - start + 1):
+        for lo in range(start, stop - w + 1):
+            yield lo, lo + w
+
+
+def old_counts(young, old_totals, old_capacities, window=None):
+    """
+    若手の人数を固定したときに、若手と同じグループのベテランの被り数(段階2)、
+    ベテラン同士の被り数(段階3)の順に範囲を最小化するベテランの人数
+    範囲の候補を幅の小さい順に試し、distributeで分けられる最初のものを選ぶ
+
+    young: young[g, t]: グループgのt番目のチームの若手の人数
+    old_totals: チームごとのベテランの人数
+    old_capacities: 各グループのベテランの人数
+    window: 段階2の被り数の(最小値, 最大値)。Noneのときは段階2も最小化する
+    返り値: (counts[g, t]: ベテランの人数, 段階2の(最小値, 最大値))
+    """
+    G, T = young.shape
+    old_totals = np.asarray(old_totals, dtype=np.int64)
+    old_capacities = np.asarray(old_capacities, dtype=np.int64)
+    present = young > 0
+    upper = int(min(old_capacities.max(), old_totals.max()))
+    bound = np.minimum(old_totals[np.newaxis, :], old_capacities[:, np.newaxis])
+
+    def solve(window2, window3):
+        low = np.zeros((G, T), dtype=np.int64)
+        high = bound.copy()
+        if window3 is not None:
+            low[:] = window3[0]
+            high = np.minimum(high, window3[1])
+        if window2 is not None:
+            low[present] = np.maximum(low[present], window2[0])
+            high[present] = np.minimum(high[present], window2[1])
+        if (low > high).any():
+            return None
+        return distribute(old_totals, old_capacities, low, high)
+
+    # 段階2: 若手のいる(グループ, チーム)のベテランの人数の範囲を最小化する
+    # 若手のいる(グループ, チーム)がないときは、段階2の被り数は0とする
+    candidates = [window] if window is not None else [None]
+    if window is None and present.any():
+        for width in range(upper + 1):
+            candidates = [
+                (lo, lo + width)
+                for lo in range(upper - width + 1)
+                if solve((lo, lo + width), None) is not None
+            ]
+            if candidates:
+                break
+
+    # 段階3: 段階2の範囲(同じ幅の候補が複数あるときはそれぞれ)のもとで、ベテランの人数の範囲を最小化する
+    # 最小値は切り捨て(c/G)以下、最大値は切り上げ(c/G)以上である
+    low3 = int((old_totals // G).min())
+    high3 = int((-(-old_totals // G)).max())
+    for lo, hi in windows(0, upper, high3 - low3):
+        if lo > low3 or hi < high3:
+            continue
+        for window2 in candidates:
+            counts = solve(window2, (lo, hi))
+            if counts is not None:
+                if window2 is None:
+                    window2 = (0, 0)
+                return counts, window2
+    raise ValueError("ベテランを分けられません")
+
+
+def exact_counts(G: int, young_counts, old_counts_, group_n_list, young_n_list):
+    """
+    (グループ, チーム, 年齢層)ごとの人数を組合せ的に求める
+    若手は各グループの若手の人数を上限としてround_robinで分ける(段階1は常に下界に一致し最適)
+    ベテランは、その若手の人数のもとで段階2、段階3の順に範囲を最小化する(old_counts)
+    段階2と段階3は若手の配置を固定した中での最小値であり、全体の最適値とは限らない
+
+    young_counts, old_counts_: チームごとの若手・ベテランの人数
+    group_n_list: 各グループの人数
+    young_n_list: 各グループの若手の人数
+    返り値: counts[g, t, a]: グループgの、t番目のチーム・年齢層aの人数
+    """
+    young_n_list = np.asarray(young_n_list)
+    old_n_list = np.asarray(group_n_list) - young_n_list
+    counts = np.empty((G, len(young_counts), 2), dtype=np.int64)
+    counts[:, :, 0] = round_robin(young_counts, young_n_list)
+    counts[:, :, 1], _ = old_counts(counts[:, :, 0], old_counts_, old_n_list)
+    return counts
+
+
+def counts_to_assignment(counts, team_idx, age) -> list:
+    """
+    (グループ, チーム, 年齢層)ごとの人数を、(チーム, 年齢層)ごとに社員番号の若い順に各グループへ割り当てる
+
+    counts: counts[g, t, a]
+    team_idx: 各社員のチームの位置(countsの2番目の軸)
+    age: 各社員の年齢層
+    返り値: 各社員のグループ番号のリスト
+    """
+    G, T, _ = counts.shape
+    key = np.asarray(team_idx, dtype=np.int64) * 2 + np.asarray(age, dtype=np.int64)
+    order = np.argsort(key, kind="stable")
+    groups = np.repeat(np.tile(np.arange(G), T * 2), counts.transpose(1, 2, 0).ravel())
+    assignment = np.empty(len(key), dtype=np.int64)
+    assignment[order] = groups
+    return assignment.tolist()
+
+
+def exact_assignment(
+    G: int, team_list: list, age_list: list, group_n_list: list, young_n_list: list
+) -> list:
+    """
+    exact_countsの人数を社員に割り当てる
+    heuristic.greedy_assignmentと同じ引数・返り値の初期解で、段階1は常に下界に一致する
+    段階2と段階3は巡回して配った若手の配置を固定した中で最小化した値であり、下界に一致するとは
+    限らない(若手の配置を変えればより小さくなることがある)ため、最適性は下界との比較で判断する
+
+    G: グループ数
+    team_list: 各社員の所属チーム
+    age_list: 各社員の年齢層(0: 若手, 1: ベテラン）
+    group_n_list: 各グループの人数
+    young_n_list: 各グループの若手の人数
+    返り値: 各社員のグループ番号のリスト
+    """
+    _, team_idx = np.unique(np.asarray(team_list), return_inverse=True)
+    age = np.asarray(age_list, dtype=np.int64)
+    T = int(team_idx.max()) + 1 if len(team_idx) else 0
+    totals = np.bincount(team_idx * 2 + age, minlength=T * 2).reshape(T, 2)
+    counts = exact_counts(G, totals[:, 0], totals[:, 1], group_n_list, young_n_list)
+    return counts_to_assignment(counts, team_idx, age)
+
+
+def rebalance_old(G: int, team_list: list, age_list: list, assignment: list) -> list:
+    """
+    若手の割り当てと段階2の被り数の(最小値, 最大値)を保ったまま、ベテランの被り数の範囲(段階3)を
+    最小化するようにベテランを割り当て直す(段階2をMILPで解いた後、段階3の初期解とする)
+
+    assignment: 各社員のグループ番号のリスト
+    返り値: 各社員のグループ番号のリスト
+    """
+    _, team_idx = np.unique(np.asarray(team_list), return_inverse=True)
+    age = np.asarray(age_list, dtype=np.int64)
+    group = np.asarray(assignment, dtype=np.int64)
+    T = int(team_idx.max()) + 1
+    counts = np.bincount((group * T + team_idx) * 2 + age, minlength=G * T * 2).reshape(
+        G, T, 2
+    )
+    young = counts[:, :, 0]
+    old = counts[:, :, 1]
+    present = young > 0
+    window = (
+        (int(old[present].min()), int(old[present].max())) if present.any() else None
+    )
+    counts[:, :, 1], _ = old_counts(young, old.sum(axis=0), old.sum(axis=1), window)
+
+    # 若手は元のグループのまま、ベテランだけを人数に合わせて割り当て直す
+    new = counts_to_assignment(counts, team_idx, age)
+    result = group.copy()
+    veteran = age == 1
+    result[veteran] = np.asarray(new)[veteran]
+    return result.tolist()
@@ -1,38 +1,71 @@
+import hashlib
+import io
 import os
+import time
 from typing import Dict, List, Optional
 
 import pandas as pd
 import streamlit as st
 
-from data import EmployeeData
-from social_gathering import solve_social_gathering
+import evaluator
+from cache import SolutionCache
+from loader import load_employees
+from result import GroupingResult
+from rules import load_rules
+from social_gathering import SolverOptions, available_backends
+from sweep import sweep_group_sizes
+from worker import SolveWorker
+
+# 段階ごとの説明(進捗の表示用)
+STAGE_NAME_LIST = [
+    "若手同士の被り",
+    "若手と同じグループのベテランの被り",
+    "ベテラン同士の被り",
+]
+STATUS_NAME_DICT = {
+    "started": "求解中",
+    "optimal": "最適解",
+    "feasible": "暫定解",
+    "not_solved": "解なし（暫定解を使用）",
+    "skipped": "初期解が最適",
+    "cached": "キャッシュ",
+    "searching": "局所探索中",
+}
+
+
+@st.cache_data
+def load_input(file_hash: str, _data: bytes):
+    """
+    アップロードされたCSVを読み込み、チームと年齢層を番号に変換する(loader.load_employees)
+    ファイルのハッシュ値ごとにキャッシュし、再実行のたびに読み込み直さないようにする
+    (_dataはキャッシュのキーに含めない)
+    """
+    return load_employees(io.BytesIO(_data))
 
 
 def main():
-    emp = EmployeeData(num_employees=1, num_teams=1)
-
     # セッションステートの初期化
     if "data_upload" not in st.session_state:
         # データがアップロードされたかどうか
         st.session_state.data_upload: bool = False
-    if "df" not in st.session_state:
-        # データがアップロードされたかどうか
-        st.session_state.df: Optional[pd.DataFrame] = None
+    if "file_hash" not in st.session_state:
+        # 求解したデータのハッシュ値
+        st.session_state.file_hash: Optional[str] = None
+    if "worker" not in st.session_state:
+        # 実行中の計算(SolveWorker)
+        st.session_state.worker: Optional[SolveWorker] = None
     if "num_people" not in st.session_state:
         # データがアップロードされたかどうか
         st.session_state.num_people: Optional[int] = None
     if "solved" not in st.session_state:
         # 求解が終了したかどうか
         st.session_state.solved: bool = False
-    if "result_employee_idx" not in st.session_state:
-        # グループごとの社員のindexリスト
-        st.session_state.result_employee_idx: List[int] = list()
-    if "result_age_idx" not in st.session_state:
-        # グループごとの年齢層のリスト
-        st.session_state.result_age_idx: List[int] = list()
-    if "result_team_idx" not in st.session_state:
-        # グループごとのチームのリスト
-        st.session_state.result_team_idx: List[int] = list()
+    if "result" not in st.session_state:
+        # グループ分けの結果（各社員のグループ番号等）
+        st.session_state.result: Optional[GroupingResult] = None
+    if "employee_numbers" not in st.session_state:
+        # 計算に使った入力データの社員番号のリスト
+        st.session_state.employee_numbers: List[str] = []
     if "group_employee_list" not in st.session_state:
         # グループ名ごとの社員番号のリストを示した辞書（画面表示用）
         st.session_state.group_employee_list: Dict[str, str] = dict()
@@ -75,19 +108,31 @@ def main():
     )
     st.sidebar.download_button(
         "サンプルデータのダウンロード",
-        open(os.path.join("data\input\sample_input.csv"), "br"),
+        open(os.path.join("data", "input", "sample_input.csv"), "br"),
         "sample_input.csv",
     )
 
     csv_file = st.sidebar.file_uploader("入力データのアップロード", type=["csv"])
     df = None
+    table = None  # 入力データ(loader.EmployeeTable)
+    file_hash = None
     num_employees = None
     num_teams = None
+    age_list = []  # 年齢層のリスト
+    team_list = []  # チームのリスト
     if csv_file is not None:
-        df = pd.read_csv(csv_file)
-
-        num_employees = len(df)
-        num_teams = len(df[EmployeeData.team_col_name].drop_duplicates())
+        data = csv_file.getvalue()
+        file_hash = hashlib.sha256(data).hexdigest()
+        try:
+            df, table = load_input(file_hash, data)
+        except ValueError as e:
+            st.sidebar.error(f"入力データを読み込めません: {e}")
+            st.stop()
+        team_list = table.team_list
+        age_list = table.age_list
+
+        num_employees = table.N
+        num_teams = table.T
 
         st.sidebar.markdown(
             f"""
@@ -96,13 +141,32 @@ def main():
             """
         )
 
-        emp = EmployeeData(num_employees=num_employees, num_teams=num_teams)
-
         with st.sidebar.expander("データを表示"):
             st.dataframe(df, hide_index=True)
 
         st.session_state.data_upload = True
 
+    # 同じグループにする社員、別々のグループにする社員の指定(任意)
+    rules_file = st.sidebar.file_uploader(
+        "ルールのアップロード（任意）",
+        type=["csv"],
+        help="種類（同じグループ／別のグループ）,社員番号（空白区切り）の2列のCSV",
+    )
+    rules = None
+    if rules_file is not None and table is not None:
+        try:
+            rules = load_rules(io.BytesIO(rules_file.getvalue()), table.employee_numbers)
+            rules.validate(table.N)
+        except (ValueError, KeyError) as e:
+            st.sidebar.error(f"ルールを読み込めません: {e}")
+            st.stop()
+        st.sidebar.markdown(
+            f"""
+            同じグループ: {len(rules.together)}件
+            別のグループ: {len(rules.separate)}件
+            """
+        )
+
     # 1グループの人数を設定
     st.sidebar.markdown(
         """
@@ -114,61 +178,193 @@ def main():
     num_people = st.sidebar.number_input(
         "1グループの人数", min_value=1, max_value=num_employees or 1000000, value=7
     )
+    if rules and num_employees:
+        # グループ数が決まると、1グループに入りきらない指定も分かる
+        try:
+            rules.validate(num_employees, num_employees // num_people)
+        except ValueError as e:
+            st.sidebar.error(f"ルールを満たせません: {e}")
+            st.stop()
+
+    # 求解方法を設定
+    st.sidebar.markdown(
+        """
+        ### 3. 求解方法を設定
+        社員数が多い（数千人以上）ときは、局所探索または分割を選択する
+        """
+    )
+    ENGINE_DICT = {
+        "数理最適化（厳密解）": "milp",
+        "局所探索（大規模向け）": "local_search",
+        "分割して数理最適化（大規模向け）": "partition",
+    }
+    engine_name = st.sidebar.radio("求解方法", list(ENGINE_DICT))
+    engine = ENGINE_DICT[engine_name]
+    if rules and engine != "milp":
+        st.sidebar.error("ルールを指定したときは数理最適化（厳密解）を選択してください")
+        st.stop()
+    with st.sidebar.expander("ソルバーの詳細設定"):
+        backend = st.selectbox(
+            "ソルバー",
+            available_backends(),
+            disabled=engine == "local_search",
+        )
+        threads = st.number_input(
+            "スレッド数（0のときソルバーの既定値）",
+            min_value=0,
+            max_value=os.cpu_count() or 1,
+            value=0,
+            disabled=engine != "milp",
+        )
+        time_limit = st.number_input(
+            "計算時間の上限（秒）（数理最適化では段階ごと、0のとき上限なし）",
+            min_value=0,
+            value=10 if engine != "milp" else 0,
+        )
+        gap_rel = st.number_input(
+            "相対ギャップ",
+            min_value=0.0,
+            max_value=1.0,
+            value=0.0,
+            disabled=engine == "local_search",
+        )
+        weighted = st.checkbox(
+            "3つの段階を1回の求解で解く（重み付きの和、辞書式順序の最適解と一致するかは結果に表示）",
+            disabled=engine != "milp",
+        )
+    objective = "weighted" if weighted and engine == "milp" else "lexicographic"
+    options = SolverOptions(
+        backend=backend,
+        threads=threads or None,
+        time_limit=time_limit or None,
+        gap_rel=gap_rel or None,
+    )
 
-    # データの前準備
-    age_list = []  # 年齢層のリスト
-    team_list = []  # チームのリスト
-    num_group = 0  # グループ数
-    group_name_list = []  # グループ名のリスト
+    # 1グループの人数の比較
+    # 人数ごとに別プロセスで解き、解けた順に表に追加する
+    with st.expander("1グループの人数を比較する"):
+        # 既定値も上限に収める(社員数が少ないときに既定値が上限を超えないように)
+        size_hi = max(min(num_employees or 30, 30), 3)
+        min_size, max_size = st.slider(
+            "比較する1グループの人数の範囲",
+            min_value=2,
+            max_value=size_hi,
+            value=(min(5, size_hi), min(10, size_hi)),
+        )
+        if st.button("比較実行"):
+            if st.session_state.data_upload is False:
+                st.error(
+                    "入力データが指定されていません。サイドバーから入力データを指定してください。"
+                )
+            else:
+                placeholder = st.empty()
+                records = []
+                with st.spinner("計算中"):
+                    for record in sweep_group_sizes(
+                        team_list,
+                        age_list,
+                        range(min_size, max_size + 1),
+                        engine=engine,
+                        options=options,
+                    ):
+                        records.append(
+                            {
+                                "1グループの人数": record["group_size"],
+                                "グループ数": record["num_groups"],
+                                "若手同士の被り": record["young"],
+                                "若手と同じグループのベテランの被り": record[
+                                    "young_with_old"
+                                ],
+                                "ベテラン同士の被り": record["old"],
+                                "最適解": record["optimal"],
+                                "計算時間（秒）": round(record["time"], 2),
+                            }
+                        )
+                        placeholder.dataframe(
+                            pd.DataFrame(records).sort_values("1グループの人数"),
+                            hide_index=True,
+                        )
 
     # グループ分け実行
+    # 計算は別プロセスで行い、画面は進捗の表示と中断を受け付ける
     if st.button("グループ分け実行"):
         if st.session_state.data_upload is False:
             st.error(
                 "入力データが指定されていません。サイドバーから入力データを指定してください。"
             )
+        elif st.session_state.worker is not None:
+            st.warning("計算中です。中断してから実行してください。")
         else:
-            age_list = [
-                emp.age_name2idx[age] for age in df[EmployeeData.age_col_name]
-            ]  # 年齢層のリスト
-            team_list = [
-                emp.teams_name2idx[team] for team in df[EmployeeData.team_col_name]
-            ]  # チームのリスト
             num_group = num_employees // num_people  # グループ数
-            group_name_list = [
-                f"グループ_{group_idx:02}" for group_idx in range(num_group)
-            ]  # グループ名のリスト
-
-            st.session_state.df = df
+            st.session_state.file_hash = file_hash
             st.session_state.num_people = num_people
-            with st.spinner("計算中"):
-                # groupごとの社員のindex、年齢、チームのリストを返す
-                (
-                    st.session_state.result_employee_idx,
-                    st.session_state.result_age_idx,
-                    st.session_state.result_team_idx,
-                ) = solve_social_gathering(
-                    num_employees, num_group, team_list, age_list
-                )
+            st.session_state.solved = False
+            # 計算中に入力データが差し替えられても結果を正しく対応付けられるよう、
+            # 計算に使った社員番号を計算と一緒に保持する
+            st.session_state.employee_numbers = list(table.employee_numbers)
+            st.session_state.worker = SolveWorker(
+                num_employees,
+                num_group,
+                team_list,
+                age_list,
+                engine=engine,
+                options=options,
+                objective=objective,
+                rules=rules,
+                cache=SolutionCache(os.path.join("data", "cache")),
+            )
 
-                # グループ名ごとの社員番号のリストを返す
-                for group_idx in range(num_group):
-                    st.session_state.group_employee_list[group_name_list[group_idx]] = {
-                        i: emp.idx2employees_number[
-                            st.session_state.result_employee_idx[group_idx][i]
-                        ]
-                        for i in range(
-                            len(st.session_state.result_employee_idx[group_idx])
-                        )
-                    }
+    worker = st.session_state.worker
+    if worker is not None:
+        if not worker.poll():
+            # 計算中: 進捗を表示し、少し待ってから画面を更新する
+            with st.status("計算中", expanded=True):
+                for record in worker.progress:
+                    stage_name = STAGE_NAME_LIST[record["stage"] - 1]
+                    st.write(
+                        f"段階{record['stage']}/3（{stage_name}）: "
+                        f"{STATUS_NAME_DICT[record['status']]}、"
+                        f"最大値と最小値の差 = {record['value']}"
+                    )
+            if st.button("中断"):
+                worker.cancel()
+                st.session_state.worker = None
+                st.rerun()
+            time.sleep(0.5)
+            st.rerun()
+
+        st.session_state.worker = None
+        if worker.error is not None:
+            st.error(f"計算に失敗しました: {worker.error}")
+            # 前回の結果が今回の入力データの結果として表示されないよう、状態を戻す
+            st.session_state.file_hash = None
+            st.session_state.solved = False
+        else:
+            st.session_state.result = worker.result
+
+            # グループ名ごとの社員番号のリストを返す
+            st.session_state.group_employee_list = {}
+            for group_idx, members in enumerate(st.session_state.result.members):
+                st.session_state.group_employee_list[f"グループ_{group_idx:02}"] = {
+                    i: st.session_state.employee_numbers[n]
+                    for i, n in enumerate(members)
+                }
             st.session_state.solved = True
 
-    if id(df) != id(st.session_state.df):
+    # 求解したときとデータ・1グループの人数が変わったら、結果を破棄する
+    if csv_file is None:
         st.session_state.data_upload = False
+    if file_hash != st.session_state.file_hash:
         st.session_state.solved = False
     if num_people != st.session_state.num_people:
         st.session_state.solved = False
 
+    # グループ数
+    num_group = 0 if st.session_state.result is None else st.session_state.result.G
+    group_name_list = [
+        f"グループ_{group_idx:02}" for group_idx in range(num_group)
+    ]  # グループ名のリスト
+
     if st.session_state.solved:
         # 20のカラーリスト
         COLOR_LIST = [
@@ -184,11 +380,11 @@ def main():
             "#85C1E9",
         ]
 
+        # 社員番号 -> 社員の番号(表の値は社員番号の末尾に★または全角空白を付けたもの)
+        employee_index = table.employee_index()
+
         def apply_txt_age(x):
-            if (
-                len(x) == emp.EMPLOYEES_DEGIT
-                and age_list[emp.employees_number2idx[x[0 : emp.EMPLOYEES_DEGIT]]] == 0
-            ):
+            if x in employee_index and age_list[employee_index[x]] == 0:
                 return x + "★"
             else:
                 return x + "　"
@@ -197,16 +393,16 @@ def main():
             return x + "　"
 
         def apply_style_team(x):
-            if len(x) < emp.EMPLOYEES_DEGIT:
+            if x[:-1] not in employee_index:
                 return "background-color: #FFFFFF"
-            idx = emp.employees_number2idx[x[0 : emp.EMPLOYEES_DEGIT]]
+            idx = employee_index[x[:-1]]
             return f"background-color: {COLOR_LIST[team_list[idx] % len(COLOR_LIST)]}"
 
         def apply_style_age(x):
-            if len(x) < emp.EMPLOYEES_DEGIT:
+            if x[:-1] not in employee_index:
                 return "background-color: #FFFFFF"
 
-            idx = emp.employees_number2idx[x[0 : emp.EMPLOYEES_DEGIT]]
+            idx = employee_index[x[:-1]]
 
             return f"background-color: {COLOR_LIST[age_list[idx] % len(COLOR_LIST)]}"
 
@@ -217,6 +413,15 @@ def main():
             """
         )
 
+        # 重み付きの和で解いたときは、3段階で解いた解と同じ値であることが示せたかを表示する
+        lexicographic = st.session_state.result.meta.get("lexicographic")
+        if lexicographic is True:
+            st.success("3段階で解いたときと同じ被り数であることを確認しました。")
+        elif lexicographic is False:
+            st.info(
+                "1回の求解で解いた結果です。3段階で解いたときと同じ被り数かは確認できていません。"
+            )
+
         # グループごとの社員一覧をDataFrameに変換
         # さらに、nanを空文字に変換
         output = pd.DataFrame(st.session_state.group_employee_list).T.fillna("")
@@ -244,98 +449,44 @@ def main():
             """
         )
         tab1, tab2 = st.tabs(["年齢層", "チーム"])
-        # 年齢層の内訳を表示
-        group_young_count = list()
-        group_old_count = list()
-        for group_idx in range(num_group):
-            group_young_count.append(
-                st.session_state.result_age_idx[group_idx].count(0)
-            )
-            group_old_count.append(st.session_state.result_age_idx[group_idx].count(1))
+        # 結果の(グループ, チーム, 年齢層)ごとの人数から、内訳と被り数を計算する
+        counts = st.session_state.result.counts
+        breakdown = evaluator.group_breakdown(counts)
+        max_overlaps = evaluator.team_max_overlaps(counts)
 
+        # 年齢層の内訳を表示
         chart_data = pd.DataFrame(
             {
                 "グループ名": group_name_list,
-                emp.idx2age_name[0]: group_young_count,
-                emp.idx2age_name[1]: group_old_count,
+                table.age_names[0]: breakdown["age"][:, 0],
+                table.age_names[1]: breakdown["age"][:, 1],
             }
         )
         tab1.bar_chart(
             chart_data,
             x="グループ名",
-            y=emp.idx2age_name,
-            color=COLOR_LIST[: len(emp.idx2age_name)],
+            y=table.age_names,
+            color=COLOR_LIST[: len(table.age_names)],
         )
 
         # チームの内訳を表示
-        group_team_list = {k: list() for k in emp.idx2teams_name}
-        for group_idx in range(num_group):
-            for k in group_team_list.keys():
-                group_team_list[k].append(
-                    st.session_state.result_team_idx[group_idx].count(
-                        emp.teams_name2idx[k]
-                    )
-                )
+        group_team_list = {
+            k: breakdown["team"][:, t] for t, k in enumerate(table.team_names)
+        }
         group_team_list["グループ名"] = group_name_list
         chart_data = pd.DataFrame(group_team_list)
         tab2.bar_chart(
             chart_data,
             x="グループ名",
-            y=emp.idx2teams_name,
-            color=COLOR_LIST[: len(emp.idx2teams_name)],
+            y=table.team_names,
+            color=COLOR_LIST[: len(table.team_names)],
         )
 
         # チーム被り状況を表示
-        # チームごとの最大被り数を計算
-        max_team_overlap_count = [
-            max(
-                [
-                    st.session_state.result_team_idx[group_idx].count(team_idx)
-                    for group_idx in range(num_group)
-                ]
-            )
-            for team_idx in range(num_teams)
-        ]
-
-        # チームごとの若手同士の被り数を計算
-        max_team_young_overlap_count = [
-            max(
-                [
-                    [
-                        t_id
-                        for idx, t_id in enumerate(
-                            st.session_state.result_team_idx[group_idx]
-                        )
-                        if age_list[
-                            st.session_state.result_employee_idx[group_idx][idx]
-                        ]
-                        == 0
-                    ].count(team_idx)
-                    for group_idx in range(num_group)
-                ]
-            )
-            for team_idx in range(num_teams)
-        ]
-
-        # チームごとのベテラン同士の被り数を計算
-        max_team_old_overlap_count = [
-            max(
-                [
-                    [
-                        t_id
-                        for idx, t_id in enumerate(
-                            st.session_state.result_team_idx[group_idx]
-                        )
-                        if age_list[
-                            st.session_state.result_employee_idx[group_idx][idx]
-                        ]
-                        == 1
-                    ].count(team_idx)
-                    for group_idx in range(num_group)
-                ]
-            )
-            for team_idx in range(num_teams)
-        ]
+        # チームごとの最大被り数(全員、若手同士、ベテラン同士)
+        max_team_overlap_count = max_overlaps["all"].tolist()
+        max_team_young_overlap_count = max_overlaps["young"].tolist()
+        max_team_old_overlap_count = max_overlaps["old"].tolist()
 
         # st.markdown(
         #     """
@@ -364,25 +515,25 @@ def main():
             """
         )
         # チームインデックスをスクロールバーで選択
-        selected_team_name = st.selectbox("チーム名を選択", emp.idx2teams_name)
+        selected_team_name = st.selectbox("チーム名を選択", table.team_names)
+        selected_team = table.team_names.index(selected_team_name)
 
         col1, col2 = st.columns(2)
         col1.metric(
             "若手同士の被り数",
-            max_team_young_overlap_count[emp.teams_name2idx[selected_team_name]],
+            max_team_young_overlap_count[selected_team],
         )
         col2.metric(
             "ベテラン同士の被り数",
-            max_team_old_overlap_count[emp.teams_name2idx[selected_team_name]],
+            max_team_old_overlap_count[selected_team],
         )
 
         # 該当のチームのみを色をつけて表示
         st.table(
             output.applymap(apply_txt_age).style.applymap(
                 lambda x: "background-color: #FFFFFF"
-                if len(x) < emp.EMPLOYEES_DEGIT
-                or emp.teams_name2idx[selected_team_name]
-                != team_list[emp.employees_number2idx[x[0 : emp.EMPLOYEES_DEGIT]]]
+                if x[:-1] not in employee_index
+                or selected_team != team_list[employee_index[x[:-1]]]
                 else apply_style_team(x)
             )
         )
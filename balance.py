@@ -0,0 +1,611 @@
+import argparse
+import dataclasses
+import logging
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+import pulp
+
+from heuristic import balanced_sizes
+from lexicographic import (
+    expand_choices,
+    fix_windows,
+    present_feasible,
+    restore_bounds,
+    solve_windows,
+    spread_feasible,
+    window_bounds,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BalanceSpec:
+    """
+    1つの段階で範囲(最大値と最小値の差)を最小化する、グループごとの人数の指定
+
+    name: 段階の名前
+    columns: 人数を数える属性の名前の組。各グループの、columnsの値の組ごとの人数の範囲を最小化する
+             値の組は全社員に現れるものとする(whereを満たす社員がいない値の組は0人として数える)
+    where: 数える社員の条件({属性の名前: 値})
+    present: 範囲に含める(グループ, 値の組)の条件({属性の名前: 値})。指定したときは、
+             そのグループに同じ値の組でこの条件を満たす社員が1人以上いるときだけ範囲に含める
+    """
+
+    name: str
+    columns: tuple
+    where: dict = field(default_factory=dict)
+    present: dict = None
+
+
+@dataclass
+class BalanceConfig:
+    """
+    グループ分けの条件
+
+    specs: 範囲を最小化する人数の指定(BalanceSpec)のリスト。先頭から順に辞書式順序で最小化する
+    quotas: 各グループにできるだけ均等に分ける社員の条件({属性の名前: 値})のリスト
+            条件ごとの各グループの人数はheuristic.balanced_sizesに従う
+    """
+
+    specs: list
+    quotas: list = field(default_factory=list)
+
+
+# 従来のチーム・年齢層の3段階(若手同士, 若手と同じグループのベテラン, ベテラン同士)と、
+# 各グループの若手の人数を均等にする条件
+TEAM_AGE = BalanceConfig(
+    specs=[
+        BalanceSpec("young", ("team",), where={"age": 0}),
+        BalanceSpec("young_with_old", ("team",), where={"age": 1}, present={"age": 0}),
+        BalanceSpec("old", ("team",), where={"age": 1}),
+    ],
+    quotas=[{"age": 0}],
+)
+
+
+def combine(codes: list):
+    """
+    属性の番号の配列の組を、値の組ごとの番号(0, 1, ...)にする
+    codes: 属性ごとの番号(0以上)の配列のリスト(欠損値も1つの値として番号を付けておく)
+    返り値: (各行の値の組の番号, 値の組の数)
+    """
+    if any(len(c) and int(c.min()) < 0 for c in codes):
+        raise ValueError("属性の番号に負の値があります(欠損値にも番号を付けてください)")
+    dims = [int(c.max()) + 1 if len(c) else 1 for c in codes]
+    flat = np.ravel_multi_index(codes, dims)
+    _, inverse = np.unique(flat, return_inverse=True)
+    return inverse.reshape(-1), int(inverse.max()) + 1 if len(inverse) else 0
+
+
+def matches(table: dict, condition: dict) -> np.ndarray:
+    # 条件({属性の名前: 値})を満たす行か
+    mask = np.ones(len(next(iter(table.values()))), dtype=bool)
+    for name, value in (condition or {}).items():
+        mask &= table[name] == value
+    return mask
+
+
+def incidence(keys: np.ndarray, mask: np.ndarray, num_keys: int) -> list:
+    # 値の組ごとの、maskを満たすセルの番号のリスト
+    cells = np.flatnonzero(mask)
+    order = np.argsort(keys[cells], kind="stable")
+    sizes = np.bincount(keys[cells], minlength=num_keys)
+    return [c.tolist() for c in np.split(cells[order], np.cumsum(sizes)[:-1])]
+
+
+class BalancedGathering:
+    """
+    任意個の属性の人数の範囲を辞書式順序で最小化するグループ分けのモデル
+
+    全属性の値の組(セル)が同じ社員は入れ替えても制約・目的関数が変わらないため、
+    (グループ, セル)ごとの人数を整数変数とする(AggregatedSocialGatheringと同じ考え方)
+    段階ごとの人数は、セルから値の組への対応(疎な接続行列)を属性の配列の演算で一度に作り、
+    その非ゼロ要素だけから式を作るため、属性を増やしてもモデルの作成時間は線形に増える
+    """
+
+    def __init__(
+        self, G: int, attributes: dict, config: BalanceConfig, group_n_list=None
+    ) -> None:
+        """
+        G: グループ数
+        attributes: {属性の名前: 各社員の値の番号(0, 1, ...)の配列}
+        config: グループ分けの条件(BalanceConfig)
+        group_n_list: 各グループの人数。Noneのときはできるだけ均等に分ける
+        """
+        self.G = G
+        self.config = config
+        self.names = list(attributes)
+        codes = [np.asarray(attributes[name], dtype=np.int64) for name in self.names]
+        self.N = len(codes[0])
+        for spec in config.specs:
+            unknown = set(spec.columns) | set(spec.where) | set(spec.present or {})
+            unknown -= set(self.names)
+            if not spec.columns:
+                raise ValueError(f"人数を数える属性がありません: {spec.name}")
+            if unknown:
+                raise ValueError(f"属性がありません: {sorted(unknown)}")
+
+        # cell_of: 各社員のセルの番号, cells: セルごとの各属性の値, cell_sizes: セルごとの人数
+        self.cell_of, C = combine(codes)
+        first = np.unique(self.cell_of, return_index=True)[1]
+        self.cells = {name: c[first] for name, c in zip(self.names, codes)}
+        self.cell_sizes = np.bincount(self.cell_of, minlength=C)
+        self.C = C
+
+        if group_n_list is None:
+            group_n_list = balanced_sizes(self.N, G)
+        self.group_n_list = list(group_n_list)
+
+        self.prob = pulp.LpProblem("balanced_gathering")
+        # z[g][c]: グループgに入る、セルcの人数を示す変数
+        self.z = [
+            [
+                pulp.LpVariable(
+                    f"z_{g}_{c}",
+                    lowBound=0,
+                    upBound=int(self.cell_sizes[c]),
+                    cat="Integer",
+                )
+                for c in range(C)
+            ]
+            for g in range(G)
+        ]
+        # 各セルの社員は、いずれかのグループにちょうど一度ずつ割り当てられる
+        for c in range(C):
+            self.prob += pulp.lpSum(self.z[g][c] for g in range(G)) == int(
+                self.cell_sizes[c]
+            )
+        for g in range(G):
+            self.prob += pulp.lpSum(self.z[g]) == self.group_n_list[g]
+        for condition in config.quotas:
+            self.set_quota(condition)
+
+        # stages: 段階ごとの(最大値の変数, 最小値の変数, 値の組ごとの数えるセルのリスト,
+        #          値の組ごとの存在を示すセルのリスト(presentがないときはNone),
+        #          全ての(グループ, 値の組)を範囲に含めたときの下界)
+        # indicators: 段階の名前 -> {(g, 値の組): 存在を示す変数y}
+        self.indicators = {}
+        self.stages = [self.set_balance(spec) for spec in config.specs]
+
+    def anchor(self, i: int):
+        # i番目の段階のpresentの社員を、同じ属性の組で数える前の段階の番号(ないときはNone)
+        spec = self.config.specs[i]
+        if spec.present is None:
+            return None
+        for j, prev in enumerate(self.config.specs[:i]):
+            if (
+                prev.present is None
+                and prev.columns == spec.columns
+                and prev.where == spec.present
+            ):
+                return j
+        return None
+
+    def lower_bound(self, i: int, at_bound: list) -> int:
+        """
+        i番目の段階の範囲の下界(bounds.stage_lower_boundsを任意の属性に広げたもの)
+        presentがある段階は、presentの社員を同じ属性の組で数える前の段階(anchor)が下界に一致し、
+        その最小値(切り捨て(c/G)の最小値)が1以上のとき、全ての(グループ, 値の組)に
+        presentの社員がいるため、数える人数の下界になる。それ以外は0とする
+
+        at_bound: 前の段階ごとの、最適値が下界に一致したか
+        """
+        bound = self.stages[i][4]
+        if self.config.specs[i].present is None:
+            return bound
+        j = self.anchor(i)
+        if j is not None and at_bound[j] and self.stages[j][1].upBound >= 1:
+            return bound
+        return 0
+
+    def window_feasible(self, windows) -> bool:
+        """
+        範囲の組を満たす割り当てがありうるか(人数だけで確かめる必要条件)
+        windows: 先頭の段階からの(最大値, 最小値)の組
+        """
+        for i, (high, low) in enumerate(windows):
+            spec = self.config.specs[i]
+            _, _, counted, present, _ = self.stages[i]
+            totals = [int(self.cell_sizes[cells].sum()) for cells in counted]
+            if spec.present is None:
+                # 人数を均等に分ける条件と同じ社員を数えるときは、各グループの人数も合わせて確かめる
+                capacities = None
+                if spec.where in self.config.quotas:
+                    capacities = balanced_sizes(sum(totals), self.G)
+                if not spread_feasible(totals, low, high, self.G, capacities):
+                    return False
+                continue
+            j = self.anchor(i)
+            if j is None:
+                continue
+            anchor_high, anchor_low = windows[j]
+            if anchor_low >= 1:
+                # 全ての(グループ, 値の組)にpresentの社員がいるため、全てが範囲に入る
+                feasible = spread_feasible(totals, low, high, self.G)
+            else:
+                anchor_totals = [int(self.cell_sizes[cells].sum()) for cells in present]
+                feasible = present_feasible(totals, anchor_totals, low, anchor_high)
+            if not feasible:
+                return False
+        return True
+
+    def count(self, g: int, cells: list):
+        # グループgに入る、cellsのセルの人数を示す式
+        return pulp.lpSum(self.z[g][c] for c in cells)
+
+    def set_quota(self, condition: dict):
+        # conditionを満たす社員の各グループの人数はbalanced_sizesに従う
+        cells = np.flatnonzero(matches(self.cells, condition)).tolist()
+        sizes = balanced_sizes(int(self.cell_sizes[cells].sum()), self.G)
+        for g in range(self.G):
+            self.prob += self.count(g, cells) == sizes[g]
+
+    def set_balance(self, spec: BalanceSpec):
+        """
+        specの人数の最大値と最小値を示す変数と制約を作る
+        返り値: (最大値の変数, 最小値の変数, 値の組ごとの数えるセルのリスト,
+                 値の組ごとの存在を示すセルのリスト, 範囲の下界)
+        """
+        keys, K = combine([self.cells[name] for name in spec.columns])
+        counted = incidence(keys, matches(self.cells, spec.where), K)
+        upper = max(self.group_n_list)
+        max_var = pulp.LpVariable(f"max_{spec.name}", lowBound=0, upBound=upper)
+        min_var = pulp.LpVariable(f"min_{spec.name}", lowBound=0, upBound=upper)
+        # どの値の組も、人数の多いグループには切り上げ(c/G)人以上、少ないグループには
+        # 切り捨て(c/G)人以下が入るため、全ての(グループ, 値の組)を範囲に含めるときの下界が決まる
+        totals = np.array([self.cell_sizes[cells].sum() for cells in counted])
+        high = int((-(-totals // self.G)).max())
+        low = int((totals // self.G).min())
+
+        if spec.present is None:
+            for g in range(self.G):
+                for cells in counted:
+                    expr = self.count(g, cells)
+                    self.prob += expr <= max_var
+                    self.prob += expr >= min_var
+            max_var.lowBound = high
+            min_var.upBound = low
+            return max_var, min_var, counted, None, high - low
+
+        # 存在を示す社員がいる(グループ, 値の組)だけを範囲に含める
+        # y[g][k] = 1 ならば、グループgに値の組kの存在を示す社員がいる
+        # (SocialGathering.set_young_team_overlap_with_oldと同じ定式化)
+        present = incidence(keys, matches(self.cells, spec.present), K)
+        indicators = self.indicators.setdefault(spec.name, {})
+        for g in range(self.G):
+            n_g = self.group_n_list[g]
+            for k, (cells, present_cells) in enumerate(zip(counted, present)):
+                if not present_cells:
+                    continue
+                y = pulp.LpVariable(f"y_{spec.name}_{g}_{k}", cat="Binary")
+                indicators[(g, k)] = y
+                expr = self.count(g, cells)
+                exists = self.count(g, present_cells)
+                self.prob += y - n_g * (1 - y) <= exists
+                self.prob += exists <= n_g * y
+                self.prob += n_g * y + expr <= n_g + max_var
+                self.prob += n_g * y + min_var <= n_g + expr
+        return max_var, min_var, counted, present, high - low
+
+    def cell_counts(self, assignment) -> np.ndarray:
+        # counts[g, c]: 割り当てでグループgに入る、セルcの人数
+        return np.bincount(
+            np.asarray(assignment, dtype=np.int64) * self.C + self.cell_of,
+            minlength=self.G * self.C,
+        ).reshape(self.G, self.C)
+
+    def stage_tables(self, counts):
+        # 段階ごとの(table[g, k]: 数える人数, exists[g, k]: 存在を示す人数(presentがないときはNone))
+        for _, _, counted, present, _ in self.stages:
+            table = np.stack(
+                [counts[:, cells].sum(axis=1) for cells in counted], axis=1
+            )
+            exists = None
+            if present is not None:
+                exists = np.stack(
+                    [counts[:, cells].sum(axis=1) for cells in present], axis=1
+                )
+            yield table, exists
+
+    def set_initial_assignment(self, assignment):
+        # 割り当て(各社員のグループ番号)を、(グループ, セル)ごとの人数に集計して初期値とする
+        # 最大値・最小値と存在を示す変数にも、その割り当てでの値を設定する
+        counts = self.cell_counts(assignment)
+        for g in range(self.G):
+            for c in range(self.C):
+                self.z[g][c].setInitialValue(int(counts[g, c]))
+        values = self.ranges(assignment)
+        for spec, (max_var, min_var, _, _, _), (_, exists) in zip(
+            self.config.specs, self.stages, self.stage_tables(counts)
+        ):
+            max_var.setInitialValue(values[spec.name][0])
+            min_var.setInitialValue(values[spec.name][1])
+            for (g, k), y in self.indicators.get(spec.name, {}).items():
+                y.setInitialValue(1 if exists[g, k] > 0 else 0)
+
+    def assignment(self) -> list:
+        # 人数の解を、セルごとに社員番号の若い順に各グループへ割り当てる
+        counts = np.array(
+            [[round(var.varValue or 0) for var in row] for row in self.z],
+            dtype=np.int64,
+        )
+        order = np.argsort(self.cell_of, kind="stable")
+        groups = np.repeat(np.tile(np.arange(self.G), self.C), counts.T.ravel())
+        group = np.empty(self.N, dtype=np.int64)
+        group[order] = groups
+        return group.tolist()
+
+    def ranges(self, assignment) -> dict:
+        # 割り当てに対する段階ごとの(最大値, 最小値)
+        values = {}
+        tables = self.stage_tables(self.cell_counts(assignment))
+        for spec, (table, exists) in zip(self.config.specs, tables):
+            if exists is not None:
+                table = table[exists > 0]
+            values[spec.name] = (
+                (int(table.max()), int(table.min())) if table.size else (0, 0)
+            )
+        return values
+
+
+def solve_balanced(
+    G: int,
+    attributes: dict,
+    config: BalanceConfig,
+    options=None,
+    initial=None,
+    progress=None,
+):
+    """
+    configの段階を先頭から順に、範囲の最小化と範囲の幅の制約の追加を繰り返して解く
+    暫定解が段階の下界(BalancedGathering.lower_bound)に一致するときは、その段階の求解を省略する
+
+    G: グループ数
+    attributes: {属性の名前: 各社員の値の番号の配列}
+    config: グループ分けの条件(BalanceConfig)
+    options: ソルバーの設定(social_gathering.SolverOptions)。Noneのとき既定の設定
+    initial: 初期解(各社員のグループ番号のリスト)。Noneのときは最初の段階を初期解なしで解く
+    progress: 進捗を受け取る関数(solve_social_gatheringのprogressと同じ辞書)
+    返り値: (各社員のグループ番号のリスト, 段階ごとの(最大値, 最小値)の辞書, 段階ごとの記録のリスト)
+    """
+    if options is None:
+        from social_gathering import SolverOptions
+
+        options = SolverOptions(msg=False)
+    if progress is None:
+        progress = lambda record: None
+
+    start = time.perf_counter()
+    model = BalancedGathering(G, attributes, config)
+    build_time = time.perf_counter() - start
+    logger.info("モデルの作成: %.2f秒 (セル数: %d)", build_time, model.C)
+
+    incumbent = initial
+    records = []
+    # at_bound: 段階ごとの、最適値が下界に一致したか
+    at_bound = []
+    # 前の段階は範囲の幅だけを制約とする(最大値と最小値は動かせるため、後の段階の解が広がる)
+    # 幅だけの制約はMILPが解きにくいため、前の段階の最適値と同じ幅の範囲(最大値, 最小値)を列挙し、
+    # 範囲ごとに最大値と最小値の変数を固定して解く(lexicographic.solve_windows。
+    # solve_social_gatheringと同じ)
+    # choices: (前の段階までの範囲の組, その範囲に収まる暫定解(ないときはNone))のリスト
+    choices = [((), incumbent)]
+    for stage, (spec, (max_var, min_var, _, _, _)) in enumerate(
+        zip(config.specs, model.stages), 1
+    ):
+        lower_bound = model.lower_bound(stage - 1, at_bound)
+        current = None
+        if incumbent is not None:
+            hi, lo = model.ranges(incumbent)[spec.name]
+            current = hi - lo
+        progress({"stage": stage, "status": "started", "value": current})
+
+        def solve(windows, assignment, time_limit):
+            # 範囲の組を1つ解く(lexicographic.solve_windowsのsolve)
+            if assignment is not None:
+                hi, lo = model.ranges(assignment)[spec.name]
+                if hi - lo <= lower_bound:
+                    return hi - lo, assignment, "skipped"
+            saved = fix_windows(
+                [
+                    (prev[0], prev[1], window)
+                    for prev, window in zip(model.stages, windows)
+                ]
+            )
+            # 初期解は範囲の組に収まる暫定解があるときだけ与える(最大値・最小値の初期値が
+            # 固定した値と食い違うため)
+            if assignment is not None:
+                model.set_initial_assignment(assignment)
+            model.prob.setObjective(max_var - min_var)
+            # 段階全体の上限のうち、残りの時間だけを与える
+            solver = dataclasses.replace(options, time_limit=time_limit).make_solver(
+                warm_start=assignment is not None
+            )
+            model.prob.solve(solver)
+            restore_bounds(saved)
+            if model.prob.sol_status in (
+                pulp.LpSolutionOptimal,
+                pulp.LpSolutionIntegerFeasible,
+            ):
+                solution = model.assignment()
+                value_max, value_min = model.ranges(solution)[spec.name]
+                status = (
+                    "optimal"
+                    if model.prob.sol_status == pulp.LpSolutionOptimal
+                    else "feasible"
+                )
+                return value_max - value_min, solution, status
+            if model.prob.status == pulp.LpStatusInfeasible:
+                # この範囲の組には前の段階の値を満たす解がない
+                return None, None, "infeasible"
+            if assignment is not None:
+                return hi - lo, assignment, "not_solved"
+            return None, None, "not_solved"
+
+        value, entries, status, solved = solve_windows(
+            choices, solve, lower_bound, options.time_limit
+        )
+        if value is None:
+            if incumbent is None:
+                raise RuntimeError(f"段階{stage}({spec.name})の解が得られませんでした")
+            hi, lo = model.ranges(incumbent)[spec.name]
+            value = hi - lo
+        else:
+            incumbent = entries[0][1]
+        if status == "not_solved":
+            logger.warning("段階%d: 解が得られなかったため暫定解を使用", stage)
+        model.prob += max_var - min_var <= value
+        at_bound.append(value <= lower_bound)
+        record = {
+            "stage": stage,
+            "name": spec.name,
+            "status": status,
+            "value": value,
+            "lower_bound": lower_bound,
+            "windows": len(choices),
+            "solved_windows": solved,
+        }
+        records.append(record)
+        progress(record)
+        logger.info(
+            "段階%d: %s (最大値, 最小値) = %s",
+            stage,
+            spec.name,
+            model.ranges(incumbent)[spec.name],
+        )
+
+        # 次の段階の範囲の組: 最良の値になった範囲の組と、より良い解がないことを示せなかった
+        # 範囲の組に、この段階の幅valueの範囲を加える(暫定解が収まる範囲を先に試す)
+        if stage < len(config.specs):
+            choices = expand_choices(
+                entries,
+                *window_bounds(max_var, min_var, value),
+                value,
+                lambda a: model.ranges(a)[spec.name],
+                model.window_feasible,
+            )
+
+    return incumbent, model.ranges(incumbent), records
+
+
+def parse_condition(text: str, names: dict) -> dict:
+    # "属性=値,属性=値"を{属性: 値の番号}にする
+    condition = {}
+    for item in text.split(","):
+        column, _, value = item.partition("=")
+        if column not in names or value not in names[column]:
+            raise ValueError(f"条件の属性または値がありません: {item}")
+        condition[column] = names[column].index(value)
+    return condition
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="任意の属性の列の人数の範囲を、指定した順に最小化してグループ分けする"
+    )
+    parser.add_argument("input", help="入力CSV(社員番号と属性の列)")
+    parser.add_argument(
+        "-n", "--group-size", type=int, required=True, help="1グループの人数"
+    )
+    parser.add_argument(
+        "--balance",
+        action="append",
+        default=[],
+        metavar="列[,列...][:属性=値,...]",
+        help="範囲を最小化する人数(列の値の組ごと、:の後は数える社員の条件)。"
+        "指定した順に最小化する。省略時は所属チーム・年齢層の3段階",
+    )
+    parser.add_argument(
+        "--even",
+        action="append",
+        default=[],
+        metavar="属性=値,...",
+        help="各グループにできるだけ均等に分ける社員の条件",
+    )
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=10.0,
+        help="各段階の計算時間の上限(秒)",
+    )
+    parser.add_argument("-o", "--output", default=None, help="結果のCSVファイル")
+    args = parser.parse_args(argv)
+
+    from data import EmployeeData
+    from social_gathering import SolverOptions
+
+    df = pd.read_csv(args.input, dtype=str)
+    if args.balance:
+        columns = [c for c in df.columns if c != EmployeeData.employee_col_name]
+        attributes, names = {}, {}
+        for column in columns:
+            # 欠損値も1つの値として番号を付ける(combineは負の番号を受け付けない)
+            codes, uniques = pd.factorize(df[column], sort=True, use_na_sentinel=False)
+            attributes[column] = codes
+            names[column] = uniques.tolist()
+        specs = []
+        for text in args.balance:
+            cols, _, where = text.partition(":")
+            specs.append(
+                BalanceSpec(
+                    text,
+                    tuple(cols.split(",")),
+                    where=parse_condition(where, names) if where else {},
+                )
+            )
+        config = BalanceConfig(
+            specs, [parse_condition(text, names) for text in args.even]
+        )
+    else:
+        from loader import encode
+
+        table = encode(df)
+        attributes = {"team": table.team, "age": table.age}
+        config = TEAM_AGE
+
+    G = len(df) // args.group_size
+    if G == 0:
+        raise SystemExit("社員数が1グループの人数より少ないです")
+    initial = None
+    if not args.balance:
+        # チーム・年齢層の設定では、組合せ的に求めた割り当てを初期解とする
+        from allocation import exact_assignment
+
+        N = len(df)
+        initial = exact_assignment(
+            G,
+            table.team_list,
+            table.age_list,
+            balanced_sizes(N, G),
+            balanced_sizes(N - int(table.age.sum()), G),
+        )
+    assignment, values, records = solve_balanced(
+        G,
+        attributes,
+        config,
+        options=SolverOptions(time_limit=args.time_limit, msg=False),
+        initial=initial,
+    )
+    for record in records:
+        print(
+            f"段階{record['stage']}({record['name']}): {record['status']}、"
+            f"(最大値, 最小値) = {values[record['name']]}"
+        )
+
+    if args.output is not None:
+        numbers = df[EmployeeData.employee_col_name].tolist()
+        groups = {}
+        for n, g in enumerate(assignment):
+            groups.setdefault(f"グループ_{g:02}", []).append(numbers[n])
+        pd.DataFrame.from_dict(groups, orient="index").sort_index().fillna("").to_csv(
+            args.output, header=False, encoding="utf_8_sig"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,251 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import evaluator
+from loader import load_employees
+from rules import load_rules
+from social_gathering import SolverOptions, solve_social_gathering
+
+
+def input_files(inputs: list) -> list:
+    # ディレクトリは中のCSVファイル、それ以外はglobのパターンとして入力ファイルを列挙する
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            files.extend(glob.glob(os.path.join(path, "*.csv")))
+        else:
+            files.extend(glob.glob(path))
+    return sorted(set(files))
+
+
+def init_worker(level: int) -> None:
+    # ワーカープロセスのログの出力先と出力レベルを設定する
+    logging.basicConfig(level=level, format="%(processName)s %(name)s: %(message)s")
+
+
+def solve_file(
+    path: str,
+    group_size: int,
+    output_dir: str,
+    engine: str = "milp",
+    aggregate: bool = False,
+    options: SolverOptions = None,
+    profile_dir: str = None,
+    objective: str = "lexicographic",
+    rules_path: str = None,
+) -> dict:
+    """
+    1つの入力CSVをグループ分けし、グループごとの社員番号をCSVファイルに出力する
+    (ワーカープロセスで実行される)
+
+    path: 入力CSV(社員番号,所属チーム,年齢層)
+    group_size: 1グループの人数(割り切れないときは一部グループが+1人)
+    output_dir: 出力先のディレクトリ
+    engine, aggregate, options, objective: solve_social_gatheringの引数
+    profile_dir: cProfileの結果(入力ファイル名.prof)の保存先。Noneのときは計測しない
+    rules_path: ルールのCSV(rules.load_rules)。社員番号はこの入力CSVの社員番号で読む
+    返り値: 被り数などの集計(JSONのサマリーに書き出す辞書)
+    """
+    start = time.perf_counter()
+    _, table = load_employees(path)
+    num_employees = table.N
+    num_teams = table.T
+    num_group = num_employees // group_size  # グループ数
+    if num_group == 0:
+        raise ValueError(f"社員数({num_employees})が1グループの人数より少ないです")
+
+    rules = None
+    if rules_path is not None:
+        rules = load_rules(rules_path, table.employee_numbers)
+
+    stem = os.path.splitext(os.path.basename(path))[0]
+    profile_path = None
+    if profile_dir is not None:
+        profile_path = os.path.join(profile_dir, f"{stem}.prof")
+    result = solve_social_gathering(
+        num_employees,
+        num_group,
+        table.team_list,
+        table.age_list,
+        aggregate=aggregate,
+        engine=engine,
+        options=options,
+        objective=objective,
+        rules=rules,
+        profile=profile_path,
+        trace_memory=profile_dir is not None,
+    )
+
+    # グループごとの社員番号をアプリと同じ形式(グループ名,社員番号,...)で出力する
+    employee_numbers = table.employee_numbers.tolist()
+    group_name_list = [f"グループ_{g:02}" for g in range(num_group)]
+    output = pd.DataFrame(
+        {
+            group_name: {i: employee_numbers[n] for i, n in enumerate(members)}
+            for group_name, members in zip(group_name_list, result.members)
+        }
+    ).T.fillna("")
+    output_path = os.path.join(
+        output_dir, f"output_employee{num_employees}_team{num_teams}_{stem}.csv"
+    )
+    output.to_csv(output_path, header=False, encoding="utf_8_sig")
+
+    max_overlaps = evaluator.team_max_overlaps(result.counts)
+    return {
+        "input": path,
+        "output": output_path,
+        "num_employees": num_employees,
+        "num_teams": num_teams,
+        "num_groups": num_group,
+        "overlap": {
+            key: {"max": hi, "min": lo, "range": hi - lo}
+            for key, (hi, lo) in result.overlap_values().items()
+        },
+        "team_max_overlap": {
+            team_name: {
+                "all": int(max_overlaps["all"][t]),
+                "young": int(max_overlaps["young"][t]),
+                "old": int(max_overlaps["old"][t]),
+            }
+            for t, team_name in enumerate(table.team_names)
+        },
+        "stages": result.meta.get("stages", []),
+        "build_time": result.meta.get("build_time"),
+        "peak_memory": result.meta.get("peak_memory"),
+        "time": time.perf_counter() - start,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="複数の入力CSVをまとめてグループ分けする(画面なしの一括実行)"
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="入力CSVのディレクトリまたはglobのパターン"
+    )
+    parser.add_argument(
+        "-n", "--group-size", type=int, required=True, help="1グループの人数"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=os.path.join("data", "output"),
+        help="出力先のディレクトリ",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="並列に解くプロセス数(省略時はCPU数)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["milp", "local_search", "partition", "balance"],
+        default="milp",
+        help="求解方法",
+    )
+    parser.add_argument(
+        "--aggregate",
+        action="store_true",
+        help="(グループ, チーム, 年齢層)ごとの人数を変数とする定式化で解く",
+    )
+    parser.add_argument(
+        "--weighted",
+        action="store_true",
+        help="3つの段階を重み付きの和として1回の求解で解く",
+    )
+    parser.add_argument(
+        "--rules",
+        default=None,
+        help="同じグループ・別のグループにする社員のCSV(全ての入力CSVに適用する)",
+    )
+    parser.add_argument("--backend", default="CBC", help="MILPソルバー")
+    parser.add_argument(
+        "--time-limit", type=float, default=None, help="各段階の計算時間の上限(秒)"
+    )
+    parser.add_argument(
+        "--gap-rel", type=float, default=None, help="許容する相対ギャップ"
+    )
+    parser.add_argument(
+        "--summary",
+        default=None,
+        help="サマリーのJSONファイル(省略時は出力先のsummary.json)",
+    )
+    parser.add_argument(
+        "--profile",
+        default=None,
+        help="cProfileの結果とメモリ使用量を計測し、結果をこのディレクトリに保存する",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="求解中の表示を出す"
+    )
+    args = parser.parse_args(argv)
+
+    files = input_files(args.inputs)
+    if not files:
+        parser.error("入力CSVが見つかりません")
+    os.makedirs(args.output, exist_ok=True)
+    if args.profile is not None:
+        os.makedirs(args.profile, exist_ok=True)
+
+    # ファイルごとに1プロセスで解くため、ソルバーは1スレッドとする
+    options = SolverOptions(
+        backend=args.backend,
+        threads=1,
+        time_limit=args.time_limit,
+        gap_rel=args.gap_rel,
+        msg=args.verbose,
+    )
+
+    summary = {}
+    # 求解中の表示(各段階の計測値など)はloggingで出力する
+    level = logging.INFO if args.verbose else logging.WARNING
+    with ProcessPoolExecutor(
+        max_workers=args.workers, initializer=init_worker, initargs=(level,)
+    ) as executor:
+        futures = {
+            executor.submit(
+                solve_file,
+                path,
+                args.group_size,
+                args.output,
+                engine=args.engine,
+                aggregate=args.aggregate,
+                options=options,
+                profile_dir=args.profile,
+                objective="weighted" if args.weighted else "lexicographic",
+                rules_path=args.rules,
+            ): path
+            for path in files
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                summary[path] = future.result()
+            except Exception as e:
+                summary[path] = {"input": path, "error": repr(e)}
+                print(f"{path}: 失敗しました ({e!r})")
+            else:
+                record = summary[path]
+                ranges = [v["range"] for v in record["overlap"].values()]
+                print(f"{path}: 被り数の範囲 = {ranges} ({record['time']:.1f}秒)")
+
+    summary_path = args.summary or os.path.join(args.output, "summary.json")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump(
+            [summary[path] for path in files], f, ensure_ascii=False, indent=2
+        )
+    print(f"サマリー: {summary_path}")
+    return 0 if all("error" not in s for s in summary.values()) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
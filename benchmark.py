@@ -0,0 +1,255 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # resourceはUnixだけのモジュール(Windowsでは最大常駐メモリを記録しない)
+    resource = None
+
+import pandas as pd
+import pulp
+
+from data import EmployeeData
+from social_gathering import (
+    AggregatedSocialGathering,
+    SocialGathering,
+    SolverOptions,
+    solve_social_gathering,
+)
+
+# 求解方法 -> solve_social_gatheringの引数
+METHODS = {
+    "milp": {"engine": "milp", "aggregate": False},
+    "aggregate": {"engine": "milp", "aggregate": True},
+    "local_search": {"engine": "local_search"},
+}
+
+
+def generate_instance(
+    num_employees: int, num_teams: int, p: float, seed: int, team_skew: float = 0.0
+):
+    """
+    EmployeeData.generate_data_csvで生成したCSVを読み込み、チームと年齢層のリストを返す
+    生成したファイルは一時ディレクトリに置き、リポジトリのdata/inputは汚さない
+    """
+    emp = EmployeeData(
+        num_employees=num_employees, num_teams=num_teams, p=p, team_skew=team_skew
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        path = emp.generate_data_csv(s=seed, path=os.path.join(tmp, "input.csv"))
+        df = pd.read_csv(path, dtype=str)
+    team_list = [emp.teams_name2idx[team] for team in df[EmployeeData.team_col_name]]
+    age_list = [emp.age_name2idx[age] for age in df[EmployeeData.age_col_name]]
+    return team_list, age_list
+
+
+def model_size(aggregate: bool, N: int, G: int, team_list: list, age_list: list):
+    """
+    全段階の制約を加えた全社員のモデルを作成し、作成時間と変数・制約・非ゼロ要素の数を返す
+    """
+    start = time.perf_counter()
+    model = AggregatedSocialGathering if aggregate else SocialGathering
+    sg = model(N, G, team_list, age_list)
+    sg.set_only_one_group()
+    sg.set_group_num()
+    sg.set_young_num()
+    sg.set_young_team_overlap()
+    sg.set_young_team_overlap_with_old()
+    sg.set_old_team_overlap()
+    build_time = time.perf_counter() - start
+    return {
+        "build_time": build_time,
+        "variables": len(sg.prob.variables()),
+        "constraints": len(sg.prob.constraints),
+        "nonzeros": sum(len(c) for c in sg.prob.constraints.values()),
+    }
+
+
+def run_case(case: dict, options: SolverOptions) -> dict:
+    """
+    1つの条件で問題を生成して解き、計測結果を返す(条件ごとに別のプロセスで実行される)
+    """
+    team_list, age_list = generate_instance(
+        case["num_employees"],
+        case["num_teams"],
+        case["p"],
+        case["seed"],
+        case["team_skew"],
+    )
+    N = len(team_list)
+    G = N // case["group_size"]
+    method = METHODS[case["method"]]
+
+    record = dict(case)
+    if method["engine"] == "milp":
+        record["model"] = model_size(method["aggregate"], N, G, team_list, age_list)
+
+    # 段階ごとの計測値(作成時間、モデルの大きさ、ソルバーの実行時間等)は結果のmetaから取る
+    start = time.perf_counter()
+    result = solve_social_gathering(
+        N, G, team_list, age_list, options=options, trace_memory=True, **method
+    )
+    record["solve_time"] = time.perf_counter() - start
+    record["build_time"] = result.meta.get("build_time")
+    record["python_peak_memory"] = result.meta["peak_memory"]
+    record["stages"] = result.meta["stages"]
+    record["objective"] = list(result.ranges())
+
+    # このプロセスの最大常駐メモリ(KB、resourceがない環境ではNone)
+    # ソルバーの子プロセス(CBC)はfork時の常駐メモリを引き継ぐため、別には計測しない
+    record["peak_rss_kb"] = (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if resource is not None
+        else None
+    )
+    return record
+
+
+def environment() -> dict:
+    # 比較のため、実行したバージョンと環境を記録する
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "pulp": pulp.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def case_key(record: dict) -> tuple:
+    return tuple(
+        record.get(k, default)
+        for k, default in (
+            ("method", None),
+            ("num_employees", None),
+            ("num_teams", None),
+            ("p", None),
+            ("team_skew", 0.0),
+            ("group_size", None),
+            ("seed", None),
+        )
+    )
+
+
+def compare(previous: dict, current: dict) -> None:
+    # 同じ条件の計測結果について、求解時間の比と目的関数値の変化を表示する
+    before = {case_key(r): r for r in previous["runs"] if "error" not in r}
+    for record in current["runs"]:
+        old = before.get(case_key(record))
+        if old is None or "error" in record:
+            continue
+        ratio = record["solve_time"] / max(old["solve_time"], 1e-9)
+        change = "" if record["objective"] == old["objective"] else (
+            f" 目的関数値 {old['objective']} -> {record['objective']}"
+        )
+        print(f"{case_key(record)}: 求解時間 x{ratio:.2f}{change}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="生成した問題で、モデル作成・求解の時間とメモリを計測する"
+    )
+    parser.add_argument(
+        "--employees", type=int, nargs="+", default=[100, 1000, 5000, 20000]
+    )
+    parser.add_argument("--teams", type=int, nargs="+", default=[7])
+    parser.add_argument("--p", type=float, nargs="+", default=[0.4])
+    parser.add_argument(
+        "--team-skew",
+        type=float,
+        nargs="+",
+        default=[0.0],
+        help="チームの大きさの偏り(EmployeeDataのteam_skew)",
+    )
+    parser.add_argument("--group-size", type=int, nargs="+", default=[6])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument(
+        "--methods", nargs="+", choices=list(METHODS), default=["aggregate"]
+    )
+    parser.add_argument("--backend", default="CBC")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument(
+        "--time-limit", type=float, default=60.0, help="各段階の計算時間の上限(秒)"
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=1, help="並列に計測する条件の数"
+    )
+    parser.add_argument(
+        "-o", "--output", default="benchmark.json", help="計測結果のJSONファイル"
+    )
+    parser.add_argument(
+        "--compare", default=None, help="比較する以前の計測結果のJSONファイル"
+    )
+    args = parser.parse_args(argv)
+
+    options = SolverOptions(
+        backend=args.backend,
+        threads=args.threads,
+        time_limit=args.time_limit,
+        msg=False,
+    )
+    cases = [
+        {
+            "method": method,
+            "num_employees": n,
+            "num_teams": t,
+            "p": p,
+            "team_skew": skew,
+            "group_size": k,
+            "seed": seed,
+        }
+        for method, n, t, p, skew, k, seed in itertools.product(
+            args.methods,
+            args.employees,
+            args.teams,
+            args.p,
+            args.team_skew,
+            args.group_size,
+            args.seeds,
+        )
+    ]
+
+    # メモリの計測が混ざらないよう、条件ごとに新しいプロセスで実行する
+    runs = []
+    with ProcessPoolExecutor(max_workers=args.workers, max_tasks_per_child=1) as ex:
+        futures = [ex.submit(run_case, case, options) for case in cases]
+        for case, future in zip(cases, futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                record = dict(case, error=repr(e))
+                print(f"{case_key(record)}: 失敗しました ({e!r})")
+            else:
+                print(
+                    f"{case_key(record)}: {record['solve_time']:.2f}秒 "
+                    f"目的関数値 {record['objective']}"
+                )
+            runs.append(record)
+
+    report = {"environment": environment(), "runs": runs}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"計測結果: {args.output}")
+
+    if args.compare is not None:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+def ceil_div(a: int, b: int) -> int:
+    return -(-a // b)
+
+
+def stage_lower_bounds(
+    young_counts: list, old_counts: list, G: int, min_young: int = 0
+) -> dict:
+    """
+    各段階の目的関数(チーム被り数の最大値と最小値の差)の下界
+    チームtのc人をG個のグループに分けると、どこかのグループには切り上げ(c/G)人以上、
+    どこかのグループには切り捨て(c/G)人以下が入る
+
+    young_counts: チームごとの若手の人数
+    old_counts: チームごとのベテランの人数
+    G: グループ数
+    min_young: 若手のチーム被り数の最小値(段階1で固定した値。固定前は0)
+    返り値: {"young": 若手同士, "young_with_old": 若手と同じグループのベテラン,
+             "old": ベテラン同士} の下界
+    """
+
+    def range_bound(counts):
+        return max(ceil_div(c, G) for c in counts) - min(c // G for c in counts)
+
+    young = range_bound(young_counts)
+    old = range_bound(old_counts)
+    # 若手のチーム被り数の最小値が1以上のときは、全ての(グループ, チーム)に若手がいるため、
+    # 若手と同じグループのベテランの被り数は、ベテラン同士の被り数と同じになる
+    young_with_old = old if min_young >= 1 else 0
+
+    return {"young": young, "young_with_old": young_with_old, "old": old}
+
+
+def overlap_bounds(
+    young_counts: list,
+    old_counts: list,
+    G: int,
+    group_n_list: list,
+    young_n_list: list,
+    min_young: int = 0,
+) -> dict:
+    """
+    チーム被り数の最大値・最小値を示す変数の(下限, 上限)
+    最大値の変数は切り上げ(c/G)以上、最小値の変数は切り捨て(c/G)以下であるため、
+    この範囲を変数の上下限とすると、線形緩和の目的関数値がstage_lower_boundsの下界以上になる
+
+    young_counts: チームごとの若手の人数
+    old_counts: チームごとのベテランの人数
+    G: グループ数
+    group_n_list: 各グループの人数
+    young_n_list: 各グループの若手の人数
+    min_young: 若手のチーム被り数の最小値(段階1で固定した値。固定前は0)
+    返り値: 変数名 -> (下限, 上限)
+    """
+    total_counts = [y + o for y, o in zip(young_counts, old_counts)]
+    max_group = max(group_n_list)
+    max_young = max(young_n_list)
+    max_old = max(n - y for n, y in zip(group_n_list, young_n_list))
+
+    def max_bounds(counts, capacity):
+        # 最大値は、どこかのグループに入る切り上げ(c/G)人以上、1グループに入れる人数以下
+        return (
+            max(ceil_div(c, G) for c in counts),
+            min(max(counts), capacity),
+        )
+
+    def min_bounds(counts):
+        # 最小値は、どこかのグループに入る切り捨て(c/G)人以下
+        return (0, min(c // G for c in counts))
+
+    bounds = {
+        "max_overlap": max_bounds(total_counts, max_group),
+        "min_overlap": min_bounds(total_counts),
+        "max_young_overlap": max_bounds(young_counts, max_young),
+        "min_young_overlap": min_bounds(young_counts),
+        "max_old_overlap": max_bounds(old_counts, max_old),
+        "min_old_overlap": min_bounds(old_counts),
+    }
+
+    # 若手と同じグループのベテランの被り数は、全ての(グループ, チーム)に若手がいるときだけ
+    # ベテラン同士の被り数と同じ上下限となる(そうでないときは若手のいる(グループ, チーム)に限られる)
+    if min_young >= 1:
+        bounds["max_young_overlap_with_old"] = bounds["max_old_overlap"]
+        bounds["min_young_overlap_with_old"] = bounds["min_old_overlap"]
+    else:
+        bounds["max_young_overlap_with_old"] = (0, bounds["max_old_overlap"][1])
+        bounds["min_young_overlap_with_old"] = (0, bounds["max_old_overlap"][1])
+
+    return bounds
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import tempfile
+
+
+class SolutionCache:
+    def __init__(self, path: str = "data/cache", max_entries: int = 256) -> None:
+        """
+        解いた結果を(グループ, チーム, 年齢層)ごとの人数のパターンとしてディスクに保存するキャッシュ
+        チーム名や社員番号が違っても、チームごとの(若手, ベテラン)の人数の組とグループ数が同じなら
+        同じ問題であるため、保存したパターンを今回の社員に割り当て直して使える
+        保存数がmax_entriesを超えたときは、最後に使ってから最も時間の経ったものを削除する
+
+        path: 保存先のディレクトリ
+        max_entries: 保存する結果の最大数
+        """
+        self.path = path
+        self.max_entries = max_entries
+
+    @staticmethod
+    def team_counts(team_list: list, age_list: list) -> dict:
+        # チームごとの[若手の人数, ベテランの人数]
+        counts = {}
+        for t, a in zip(team_list, age_list):
+            counts.setdefault(t, [0, 0])[a] += 1
+        return counts
+
+    def canonical_teams(self, team_list: list, age_list: list) -> list:
+        # チームを(若手の人数, ベテランの人数, チーム番号)の順に並べる
+        # 並べた順番が、キャッシュの中でのチームの番号になる
+        counts = self.team_counts(team_list, age_list)
+        return sorted(counts, key=lambda t: (counts[t][0], counts[t][1], t))
+
+    def signature(self, G: int, team_list: list, age_list: list) -> str:
+        # チームごとの(若手, ベテラン)の人数を並べたものとグループ数から作るキー
+        counts = self.team_counts(team_list, age_list)
+        profile = sorted(tuple(c) for c in counts.values())
+        key = json.dumps({"G": G, "profile": profile})
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def file_path(self, signature: str) -> str:
+        return os.path.join(self.path, f"{signature}.json")
+
+    def get(self, G: int, team_list: list, age_list: list):
+        """
+        保存されたパターンを今回の社員に割り当て直す
+        返り値: 各社員のグループ番号のリスト(保存されていないときはNone)
+        """
+        file_path = self.file_path(self.signature(G, team_list, age_list))
+        # 保存されていない、他のプロセスが削除した、または壊れたファイルは保存されていないものとする
+        try:
+            with open(file_path, encoding="utf-8") as f:
+                counts = json.load(f)["counts"]
+            # 最後に使った時刻として更新日時を更新する
+            os.utime(file_path)
+        except (OSError, json.JSONDecodeError, KeyError, TypeError):
+            return None
+
+        # counts[g][k][a]: グループgに入る、k番目のチームの年齢層aの人数
+        teams = self.canonical_teams(team_list, age_list)
+        members = {(t, a): [] for t in teams for a in (0, 1)}
+        for n, key in enumerate(zip(team_list, age_list)):
+            members[key].append(n)
+
+        assignment = [0] * len(team_list)
+        for k, t in enumerate(teams):
+            for a in (0, 1):
+                i = 0
+                for g in range(G):
+                    for n in members[(t, a)][i : i + counts[g][k][a]]:
+                        assignment[n] = g
+                    i += counts[g][k][a]
+        return assignment
+
+    def put(self, G: int, team_list: list, age_list: list, assignment: list) -> None:
+        """
+        割り当てを(グループ, チーム, 年齢層)ごとの人数のパターンとして保存する
+        """
+        teams = self.canonical_teams(team_list, age_list)
+        team_idx = {t: k for k, t in enumerate(teams)}
+        counts = [[[0, 0] for _ in teams] for _ in range(G)]
+        for n, g in enumerate(assignment):
+            counts[g][team_idx[team_list[n]]][age_list[n]] += 1
+
+        # 同じディレクトリの一時ファイルに書き込んでから置き換え、書きかけのファイルを読まないようにする
+        # (一時ファイルは拡張子が.jsonでないため、getや削除の対象にならない)
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"G": G, "counts": counts}, f)
+            os.replace(tmp_path, self.file_path(self.signature(G, team_list, age_list)))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        # 保存数の上限を超えたら、最後に使ってから最も時間の経ったものから削除する
+        files = [
+            os.path.join(self.path, name)
+            for name in os.listdir(self.path)
+            if name.endswith(".json")
+        ]
+        files.sort(key=os.path.getmtime)
+        for file_path in files[: max(len(files) - self.max_entries, 0)]:
+            os.remove(file_path)
@@ -2,98 +2,218 @@ import pandas as pd
 import numpy as np
 import os
 import json
+from functools import cached_property
 
 
 class EmployeeData:
     employee_col_name = "社員番号"
     team_col_name = "所属チーム"
     age_col_name = "年齢層"
-
-    def __init__(self, num_employees=100, num_teams=7, p=0.4):
+    idx2age_name = ["若手", "ベテラン"]  # 年齢層
+
+    def __init__(
+        self,
+        num_employees=100,
+        num_teams=7,
+        p=0.4,
+        id_width=None,
+        team_skew=0.0,
+        young_ratios=None,
+    ):
         # データの生成
         self.num_employees = num_employees  # 生成する社員数
         self.num_teams = num_teams  # チーム数
         self.p = p  # 若手の割合
 
-        self.EMPLOYEES_DEGIT = 3  # 社員番号の桁数
+        # 社員番号の桁数(省略時は3桁、社員数が999人を超えるときは社員数の桁数)
+        if id_width is None:
+            id_width = max(3, len(str(num_employees)))
+        self.EMPLOYEES_DEGIT = id_width
 
-        self.idx2employees_number = [
-            f"{i:0{self.EMPLOYEES_DEGIT}}" for i in range(1, num_employees + 1)
-        ]
-        self.idx2teams_name = [chr(ord("A") + i) for i in range(num_teams)]  # 所属チーム
-        self.idx2age_name = ["若手", "ベテラン"]  # 年齢層
+        # チームの大きさの偏り。k番目のチームに入る確率を1/(k+1)^team_skewに比例させる
+        # (0のとき一様、1程度で少数の大きなチームと多数の小さなチームになる)
+        self.team_skew = team_skew
+        # チームごとの若手の割合(省略時は全チームp)
+        if young_ratios is None:
+            young_ratios = [p] * num_teams
+        if len(young_ratios) != num_teams:
+            raise ValueError("young_ratiosの長さがチーム数と一致しません")
+        self.young_ratios = np.asarray(young_ratios, dtype=float)
+
+        self.idx2teams_name = [self.team_name(i) for i in range(num_teams)]  # 所属チーム
 
-        self.employees_number2idx = {
-            v: k for k, v in enumerate(self.idx2employees_number)
-        }
         self.teams_name2idx = {v: k for k, v in enumerate(self.idx2teams_name)}
         self.age_name2idx = {v: k for k, v in enumerate(self.idx2age_name)}
 
         self.data_path = f"employee_data_{self.num_teams}_{self.num_employees}_{self.p}"
 
-    def generate_data_csv(self, s=0):
-        np.random.seed(s)
-
-        data = {
-            self.employee_col_name: self.idx2employees_number,
-            self.team_col_name: np.random.choice(
-                self.idx2teams_name, self.num_employees
-            ),
-            self.age_col_name: np.random.choice(
-                self.idx2age_name, self.num_employees, p=[self.p, 1 - self.p]
-            ),
-        }
-
-        df = pd.DataFrame(data)
+    @staticmethod
+    def team_name(i):
+        # チーム名(A, B, ..., Z, AA, AB, ...)
+        name = ""
+        i += 1
+        while i > 0:
+            i, r = divmod(i - 1, 26)
+            name = chr(ord("A") + r) + name
+        return name
+
+    # 社員番号とインデックスの対応は、社員数が多いとき大きくなるため、使うときに作る
+    @cached_property
+    def idx2employees_number(self):
+        return [
+            f"{i:0{self.EMPLOYEES_DEGIT}}" for i in range(1, self.num_employees + 1)
+        ]
 
-        # CSVファイルとして出力
-        if not os.path.exists("data"):
-            os.mkdir("data")
-        df.to_csv(
-            f"data/input/{self.data_path}_{s}.csv",
-            index=False,
+    @cached_property
+    def employees_number2idx(self):
+        return {v: k for k, v in enumerate(self.idx2employees_number)}
+
+    def team_probabilities(self):
+        # 各チームに入る確率
+        weights = 1.0 / np.arange(1, self.num_teams + 1) ** self.team_skew
+        return weights / weights.sum()
+
+    def generate(self, s=0, chunk_size=100000):
+        """
+        社員のデータを、chunk_size人ずつのDataFrameとして順に生成する
+        チームと年齢層は別々の乱数列から生成するため、chunk_sizeによらず同じシードからは
+        同じデータが得られる
+        チームの大きさの偏り・チームごとの若手の割合がないときは、従来(np.random.seed)と
+        同じ乱数列を使うため、同じシードから従来と同じデータが得られる
+
+        s: 乱数のシード
+        chunk_size: 一度に生成する社員数
+        """
+        team_names = np.array(self.idx2teams_name)
+        age_names = np.array(self.idx2age_name)
+        if self.is_legacy():
+            draws = self.legacy_draws(s, chunk_size)
+        else:
+            draws = self.skewed_draws(s, chunk_size)
+
+        for start, (team_idx, age_idx) in zip(
+            range(0, self.num_employees, chunk_size), draws
+        ):
+            n = len(team_idx)
+            employee_numbers = (
+                pd.Series(np.arange(start + 1, start + n + 1))
+                .astype(str)
+                .str.zfill(self.EMPLOYEES_DEGIT)
+            )
+            yield pd.DataFrame(
+                {
+                    self.employee_col_name: employee_numbers.to_numpy(),
+                    self.team_col_name: team_names[team_idx],
+                    self.age_col_name: age_names[age_idx],
+                }
+            )
+
+    def is_legacy(self):
+        # チームの大きさの偏りがなく、若手の割合が全チームで同じか
+        # (このときは従来と同じ乱数列で生成し、同じシードから従来と同じデータを得る)
+        return self.team_skew == 0 and bool((self.young_ratios == self.p).all())
+
+    def legacy_draws(self, s, chunk_size):
+        # 従来(np.random.seed(s)の後、全社員のチーム、全社員の年齢層の順に選ぶ)と同じ乱数列で、
+        # chunk_size人ずつ(チームの番号, 年齢層の番号)の配列を返す
+        # 年齢層の乱数列は、同じシードの乱数列をチームの分だけ進めてから使う
+        team_rng = np.random.RandomState(s)
+        age_rng = np.random.RandomState(s)
+        for start in range(0, self.num_employees, chunk_size):
+            n = min(chunk_size, self.num_employees - start)
+            age_rng.randint(0, self.num_teams, n)
+        for start in range(0, self.num_employees, chunk_size):
+            n = min(chunk_size, self.num_employees - start)
+            team_idx = team_rng.randint(0, self.num_teams, n)
+            age_idx = age_rng.choice(2, n, p=[self.p, 1 - self.p])
+            yield team_idx, age_idx
+
+    def skewed_draws(self, s, chunk_size):
+        # チームの大きさの偏り・チームごとの若手の割合があるときの乱数列
+        # チームと年齢層は、シードから分けた独立な乱数列で選ぶ
+        team_rng, age_rng = (
+            np.random.default_rng(seed) for seed in np.random.SeedSequence(s).spawn(2)
         )
-
-        # 生成したデータフレームの表示
-        print(df)
-
-    def generate_data_json(self, s=0):
-        np.random.seed(s)
-
-        data = {
-            self.employee_col_name: self.idx2employees_number,
-            self.team_col_name: np.random.choice(
-                self.idx2teams_name, self.num_employees
-            ).tolist(),
-            self.age_col_name: np.random.choice(
-                self.idx2age_name, self.num_employees, p=[self.p, 1 - self.p]
-            ).tolist(),
-        }
-
-        # df = pd.DataFrame(data)
-        output = {
+        cdf = np.cumsum(self.team_probabilities())
+        cdf[-1] = 1.0
+        for start in range(0, self.num_employees, chunk_size):
+            n = min(chunk_size, self.num_employees - start)
+            team_idx = np.searchsorted(cdf, team_rng.random(n), side="right")
+            # 若手(0)は、チームごとの若手の割合の確率で選ぶ
+            age_idx = (age_rng.random(n) >= self.young_ratios[team_idx]).astype(int)
+            yield team_idx, age_idx
+
+    def generate_data_csv(self, s=0, path=None, chunk_size=100000, verbose=False):
+        # path: 出力先(省略時はdata/input/employee_data_チーム数_社員数_p_シード.csv)
+        # verbose: Trueのとき、生成したデータの先頭を表示する
+        if path is None:
+            path = f"data/input/{self.data_path}_{s}.csv"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # CSVファイルとして、chunk_size人ずつ追記する
+        for i, df in enumerate(self.generate(s, chunk_size)):
+            df.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            if verbose and i == 0:
+                print(df.head())
+        return path
+
+    def generate_data_json(self, s=0, path=None, chunk_size=100000, verbose=False):
+        # path: 出力先(省略時はdata/employee_data_チーム数_社員数_p_シード.json)
+        # verbose: Trueのとき、生成したデータの先頭を表示する
+        if path is None:
+            path = f"data/{self.data_path}_{s}.json"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # {"num_employee", "num_teams", "p", "seed", "data": {列名: 値のリスト}}の形式
+        # 列ごとにリストを書き出すため、同じシードから列の数だけ生成し直す
+        header = {
             "num_employee": self.num_employees,
             "num_teams": self.num_teams,
             "p": self.p,
             "seed": s,
-            "data": data,
         }
-
-        # JSONファイルとして出力
-        if not os.path.exists("data"):
-            os.mkdir("data")
-        with open(
-            f"data/{self.data_path}_{s}.json",
-            "w",
-            encoding="utf-8",
-        ) as f:
-            json.dump(output, f, ensure_ascii=False)
-        # df.to_json(f'data/employee_data_{self.num_teams}_{self.num_employees}_{self.p}_{s}.json', orient='records',force_ascii=False)
-
-        # 生成したデータフレームの表示
-        print(output)
+        columns = [self.employee_col_name, self.team_col_name, self.age_col_name]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header, ensure_ascii=False)[:-1] + ', "data": {')
+            for k, col in enumerate(columns):
+                f.write(("" if k == 0 else ", ") + json.dumps(col, ensure_ascii=False))
+                f.write(": [")
+                for i, df in enumerate(self.generate(s, chunk_size)):
+                    values = json.dumps(df[col].tolist(), ensure_ascii=False)[1:-1]
+                    f.write(("" if i == 0 else ", ") + values)
+                f.write("]")
+            f.write("}}")
+
+        if verbose:
+            print(header)
+        return path
+
+    def generate_data_parquet(self, s=0, path=None, chunk_size=100000):
+        # Parquetファイルとして出力する(pyarrowが必要)
+        # path: 出力先(省略時はdata/input/employee_data_チーム数_社員数_p_シード.parquet)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquetの出力にはpyarrowが必要です") from e
+
+        if path is None:
+            path = f"data/input/{self.data_path}_{s}.parquet"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        writer = None
+        try:
+            for df in self.generate(s, chunk_size):
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return path
 
 
 if __name__ == "__main__":
     employee_data = EmployeeData(num_employees=100, num_teams=3, p=0.4)
-    employee_data.generate_data_csv(s=1)
+    employee_data.generate_data_csv(s=1, verbose=True)
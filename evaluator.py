@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def count_tensor(assignment, team_list, age_list, G: int):
+    """
+    割り当てから(グループ, チーム, 年齢層)ごとの人数を数える
+    全ての指標はこの人数から計算するため、社員の走査はここでの一度だけで済む
+
+    assignment: 各社員のグループ番号
+    team_list: 各社員の所属チーム
+    age_list: 各社員の年齢層(0: 若手, 1: ベテラン）
+    G: グループ数
+    返り値: (teams, counts)
+            teams: チームの番号(countsの2番目の軸の順)
+            counts[g, t, a]: グループgの、teams[t]のチーム・年齢層aの人数
+    """
+    teams, team_idx = np.unique(np.asarray(team_list), return_inverse=True)
+    T = len(teams)
+    flat = (
+        np.asarray(assignment, dtype=np.int64) * (T * 2)
+        + team_idx.astype(np.int64) * 2
+        + np.asarray(age_list, dtype=np.int64)
+    )
+    counts = np.bincount(flat, minlength=G * T * 2).reshape(G, T, 2)
+    return teams, counts
+
+
+def overlap_values(counts) -> dict:
+    """
+    各段階のチーム被り数の(最大値, 最小値)
+
+    counts: count_tensorの人数
+    返り値: {"young": 若手同士, "young_with_old": 若手と同じグループのベテラン,
+             "old": ベテラン同士} の(最大値, 最小値)
+    """
+    young = counts[:, :, 0]
+    old = counts[:, :, 1]
+    # 若手がいない(グループ, チーム)は、若手と同じグループのベテランの被り数の対象外
+    old_with_young = old[young > 0]
+    if old_with_young.size == 0:
+        old_with_young = np.zeros(1, dtype=counts.dtype)
+
+    return {
+        "young": (int(young.max()), int(young.min())),
+        "young_with_old": (int(old_with_young.max()), int(old_with_young.min())),
+        "old": (int(old.max()), int(old.min())),
+    }
+
+
+def team_max_overlaps(counts) -> dict:
+    """
+    チームごとの、各グループでの被り数の最大値
+
+    counts: count_tensorの人数
+    返り値: {"all": 若手・ベテラン全員, "young": 若手同士, "old": ベテラン同士}
+            それぞれチームの順(count_tensorのteams)の配列
+    """
+    return {
+        "all": counts.sum(axis=2).max(axis=0),
+        "young": counts[:, :, 0].max(axis=0),
+        "old": counts[:, :, 1].max(axis=0),
+    }
+
+
+def group_breakdown(counts) -> dict:
+    """
+    グループごとの年齢層・チームの内訳
+
+    counts: count_tensorの人数
+    返り値: {"age": グループ×年齢層の人数, "team": グループ×チームの人数}
+    """
+    return {"age": counts.sum(axis=1), "team": counts.sum(axis=2)}
+
+
+def duplicated_members(counts, teams) -> list:
+    """
+    グループごとに、2人以上いる(チーム, 年齢層)とその人数
+
+    counts: count_tensorの人数
+    teams: count_tensorのチームの番号
+    返り値: グループごとの{(チーム, 年齢層): 人数}のリスト
+    """
+    result = [{} for _ in range(counts.shape[0])]
+    for g, t, a in np.argwhere(counts > 1):
+        result[g][(teams[t].item(), int(a))] = int(counts[g, t, a])
+    return result
@@ -0,0 +1,59 @@
+import evaluator
+
+
+def balanced_sizes(total: int, G: int) -> list:
+    """
+    total人をG個のグループにできるだけ均等に分けたときの、各グループの人数
+    割り切れないときは、先頭のグループから+1人とする
+    """
+    return [total // G + 1] * (total % G) + [total // G] * (G - total % G)
+
+
+def greedy_assignment(
+    G: int, team_list: list, age_list: list, group_n_list: list, young_n_list: list
+) -> list:
+    """
+    (年齢層, チーム)の順に並べた社員を、グループに順番に1人ずつ配っていく初期解を作成する
+    同じチームの社員は別々のグループに散らばるため、チーム被りは小さくなりやすい
+
+    G: グループ数
+    team_list: 各社員の所属チーム
+    age_list: 各社員の年齢層(0: 若手, 1: ベテラン）
+    group_n_list: 各グループの人数
+    young_n_list: 各グループの若手の人数
+    返り値: 各社員のグループ番号のリスト
+    """
+    # capacity[a][g]: グループgに入れられる年齢層aの残り人数
+    capacity = [
+        [int(young_n_list[g]) for g in range(G)],
+        [int(group_n_list[g] - young_n_list[g]) for g in range(G)],
+    ]
+
+    assignment = [0] * len(team_list)
+    order = sorted(range(len(team_list)), key=lambda n: (age_list[n], team_list[n]))
+    g = 0
+    for n in order:
+        # 空きのあるグループまで進める
+        while capacity[age_list[n]][g] == 0:
+            g = (g + 1) % G
+        assignment[n] = g
+        capacity[age_list[n]][g] -= 1
+        g = (g + 1) % G
+
+    return assignment
+
+
+def overlap_values(assignment: list, G: int, team_list: list, age_list: list) -> dict:
+    """
+    割り当てから、各段階のチーム被り数の(最大値, 最小値)を計算する
+
+    assignment: 各社員のグループ番号のリスト
+    G: グループ数
+    team_list: 各社員の所属チーム
+    age_list: 各社員の年齢層(0: 若手, 1: ベテラン）
+    返り値: {"young": 若手同士, "young_with_old": 若手と同じグループのベテラン,
+             "old": ベテラン同士} の(最大値, 最小値)
+    """
+    _, counts = evaluator.count_tensor(assignment, team_list, age_list, G)
+    return evaluator.overlap_values(counts)
+
@@ -0,0 +1,170 @@
+import time
+
+import numpy as np
+
+from allocation import distribute
+
+
+def window_bounds(max_var, min_var, width: int):
+    # 幅widthの範囲(最大値, 最小値)の最小値が取りうる[low, high](変数の上下限から求める)
+    low = int(min_var.lowBound or 0)
+    high = int(max_var.upBound) - width
+    if min_var.upBound is not None:
+        high = min(high, int(min_var.upBound))
+    if max_var.lowBound is not None:
+        low = max(low, int(max_var.lowBound) - width)
+    return low, high
+
+
+def fix_windows(windows):
+    # windows: (最大値の変数, 最小値の変数, (最大値, 最小値))のリスト
+    # 変数を範囲の値に固定し、元の上下限を返す(restore_boundsで戻す)
+    saved = []
+    for max_var, min_var, (high, low) in windows:
+        for var, v in ((max_var, high), (min_var, low)):
+            saved.append((var, var.lowBound, var.upBound))
+            var.lowBound = v
+            var.upBound = v
+    return saved
+
+
+def restore_bounds(saved):
+    # fix_windowsで固定した変数の上下限を元に戻す
+    for var, low, up in reversed(saved):
+        var.lowBound = low
+        var.upBound = up
+
+
+def spread_feasible(totals, low: int, high: int, G: int, capacities=None) -> bool:
+    """
+    値ごとの人数を、(グループ, 値)ごとの人数が全て[low, high]に入るようにG個のグループへ
+    分けられるか(範囲の組を解く前に、明らかに実行不可能な範囲を除くための必要条件)
+
+    totals: 値ごとの人数
+    capacities: 各グループの人数。指定したときは最大流(allocation.distribute)で確かめる
+    """
+    totals = np.asarray(totals, dtype=np.int64)
+    if ((totals < G * low) | (totals > G * high)).any():
+        return False
+    if capacities is None:
+        return True
+    shape = (G, len(totals))
+    return (
+        distribute(totals, capacities, np.full(shape, low), np.full(shape, high))
+        is not None
+    )
+
+
+def present_feasible(totals, anchor_totals, low: int, anchor_high: int) -> bool:
+    """
+    存在を示す社員(anchor)がいる(グループ, 値)だけを範囲に含めるとき、その最小値をlow以上に
+    できるか(必要条件)
+    anchorの人数aの値は、1グループにanchor_high人までのため切り上げ(a/anchor_high)個以上の
+    グループに現れ、そのそれぞれにlow人以上が入る
+
+    totals: 値ごとの数える人数
+    anchor_totals: 値ごとの存在を示す社員の人数
+    anchor_high: 存在を示す社員の(グループ, 値)ごとの人数の最大値
+    """
+    for total, anchor in zip(totals, anchor_totals):
+        if anchor == 0:
+            continue
+        if anchor_high == 0 or low * -(-anchor // anchor_high) > total:
+            return False
+    return True
+
+
+def expand_choices(entries, low: int, high: int, width: int, ranges, feasible=None):
+    """
+    次の段階で試す範囲の組を作る
+
+    entries: (前の段階までの範囲の組, その範囲の組で得られた割り当て(ないときはNone))のリスト
+    low, high: この段階の範囲の最小値が取りうる値(window_bounds)
+    width: この段階の最適値(範囲の幅)
+    ranges: 割り当てのこの段階の(最大値, 最小値)を返す関数
+    feasible: 範囲の組を満たす割り当てがありうるかを返す関数(人数だけで確かめる必要条件)
+              Falseの範囲の組は試さない
+    返り値: (範囲の組, その範囲の組に収まる割り当て(ないときはNone))のリスト
+            割り当てが収まる範囲の組を先に並べる
+    """
+    fitted = {}
+    others = {}
+    for windows, assignment in entries:
+        value_max, value_min = ranges(assignment) if assignment is not None else (0, 0)
+        for lo in range(low, high + 1):
+            choice = windows + ((lo + width, lo),)
+            if choice in fitted or (feasible is not None and not feasible(choice)):
+                continue
+            if assignment is not None and lo <= value_min and value_max <= lo + width:
+                fitted[choice] = assignment
+                others.pop(choice, None)
+            else:
+                others.setdefault(choice, None)
+    return list(fitted.items()) + list(others.items())
+
+
+def solve_windows(choices, solve, lower_bound: int, time_limit=None):
+    """
+    範囲の組ごとに段階を解き、最良の値の解を求める
+    範囲の組は場合分けであり(前の段階の幅の制約は別に加えてある)、全ての範囲の組の最良の値が
+    この段階の最適値になる
+
+    choices: (前の段階までの範囲の組, その範囲の組に収まる暫定解(ないときはNone))のリスト
+    solve: solve(範囲の組, 暫定解, 残りの計算時間(秒、上限なしのときNone))で範囲の組を解く関数
+           返り値は(この段階の値, 割り当て, 状態)。状態は"skipped"(暫定解が下界に一致),
+           "optimal", "feasible"(時間切れ等で得られた解), "not_solved"(解が得られず暫定解を継続),
+           "infeasible"(範囲の組に解がない)のいずれかで、解がないときは値と割り当てをNoneとする
+    lower_bound: この段階の目的関数の下界。下界に一致する解が得られたら残りの範囲の組は解かない
+    time_limit: 段階全体の計算時間の上限(秒)。各範囲の組には残りの時間だけを与え、
+                使い切ったら残りの範囲の組は解かない。Noneのとき上限なし
+    返り値: (値, 次の段階に渡す(範囲の組, 割り当て)のリスト, 状態, 解いた範囲の組の数)
+            次の段階に渡すのは、最良の値の範囲の組と、より良い解がないことを示せなかった範囲の組
+            (解かなかった、または時間切れ。割り当てはNone)。状態は"skipped", "optimal",
+            "feasible", "not_solved"のいずれかで、解が得られなかったときは値をNoneとする
+            (次の段階には、示せなかった範囲の組を元の暫定解とともに渡す)
+    """
+    deadline = None if time_limit is None else time.perf_counter() + time_limit
+    # results: 解が得られた範囲の組ごとの(値, 範囲の組, 割り当て, 状態)
+    results = []
+    # unproven: より良い解がないことを示せなかった範囲の組
+    unproven = []
+    solved = 0
+    for i, (windows, assignment) in enumerate(choices):
+        if results and min(r[0] for r in results) <= lower_bound:
+            unproven += [w for w, _ in choices[i:]]
+            break
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                unproven += [w for w, _ in choices[i:]]
+                break
+        value, solution, status = solve(windows, assignment, remaining)
+        solved += 1
+        if status in ("feasible", "not_solved"):
+            unproven.append(windows)
+        if solution is not None:
+            results.append((value, windows, solution, status))
+
+    if not results:
+        # 解が得られなかったときは暫定解を使うため、示せなかった範囲の組を暫定解とともに渡す
+        entries = [(w, a) for w, a in choices if w in unproven]
+        return None, entries, "not_solved", solved
+    value = min(r[0] for r in results)
+    # 同じ値では、暫定解をそのまま使った範囲の組("not_solved")を後にする
+    best = sorted(
+        (r for r in results if r[0] == value), key=lambda r: r[3] == "not_solved"
+    )
+    statuses = {r[3] for r in best}
+    if value <= lower_bound and statuses != {"not_solved"}:
+        status = "skipped" if statuses == {"skipped"} else "optimal"
+    elif not unproven:
+        # 全ての範囲の組で、より良い解がないことを示せた
+        status = "optimal"
+    elif {r[3] for r in results} == {"not_solved"}:
+        status = "not_solved"
+    else:
+        status = "feasible"
+    entries = [(r[1], r[2]) for r in best]
+    entries += [(w, None) for w in unproven if all(w != r[1] for r in best)]
+    return value, entries, status, solved
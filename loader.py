@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from data import EmployeeData
+
+
+@dataclass
+class EmployeeTable:
+    """
+    入力データを、チームと年齢層の番号の配列と、番号から名前への対応表にしたもの
+
+    employee_numbers: 各社員の社員番号(文字列)
+    team: 各社員のチームの番号(team_namesの位置)
+    age: 各社員の年齢層の番号(0: 若手, 1: ベテラン）
+    team_names: チームの番号ごとのチーム名(名前の順)
+    age_names: 年齢層の番号ごとの名前(EmployeeData.idx2age_nameと同じ)
+    """
+
+    employee_numbers: np.ndarray
+    team: np.ndarray
+    age: np.ndarray
+    team_names: list
+    age_names: list
+
+    @property
+    def N(self) -> int:
+        return len(self.team)
+
+    @property
+    def T(self) -> int:
+        return len(self.team_names)
+
+    @property
+    def team_list(self) -> list:
+        # solve_social_gatheringに渡す、各社員のチームの番号のリスト
+        return self.team.tolist()
+
+    @property
+    def age_list(self) -> list:
+        # solve_social_gatheringに渡す、各社員の年齢層のリスト
+        return self.age.tolist()
+
+    def employee_index(self) -> dict:
+        # 社員番号 -> 社員の番号(行の位置)
+        return {v: k for k, v in enumerate(self.employee_numbers.tolist())}
+
+
+def read_input(source) -> pd.DataFrame:
+    """
+    入力CSV(社員番号,所属チーム,年齢層)を文字列の列として読み込む
+    pyarrowがあるときは、pyarrowで読み込む(大きなファイルで速い)
+
+    source: ファイルのパスまたはファイルオブジェクト
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        engine = "c"
+    else:
+        engine = "pyarrow"
+    columns = [
+        EmployeeData.employee_col_name,
+        EmployeeData.team_col_name,
+        EmployeeData.age_col_name,
+    ]
+    df = pd.read_csv(source, dtype=str, engine=engine)
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"入力データに列がありません: {missing}")
+    return df
+
+
+def encode(df: pd.DataFrame) -> EmployeeTable:
+    """
+    チームと年齢層の列をそれぞれ一度だけ番号に変換する
+    チーム名は任意の文字列でよく、名前の順に0, 1, ...と番号を付ける
+    年齢層はEmployeeData.idx2age_nameのいずれかでなければならない
+    社員番号は結果を社員に対応付けるため、重複していてはならない
+    """
+    numbers = df[EmployeeData.employee_col_name]
+    duplicated = numbers[numbers.duplicated()]
+    if len(duplicated):
+        raise ValueError(
+            f"社員番号が重複しています: {sorted(set(duplicated.astype(str)))}"
+        )
+
+    team, team_names = pd.factorize(df[EmployeeData.team_col_name], sort=True)
+    if (team < 0).any():
+        raise ValueError("所属チームが空の社員がいます")
+
+    age_names = list(EmployeeData.idx2age_name)
+    age = pd.Categorical(df[EmployeeData.age_col_name], categories=age_names).codes
+    if (age < 0).any():
+        unknown = sorted(set(df[EmployeeData.age_col_name][age < 0].astype(str)))
+        raise ValueError(f"年齢層は{age_names}のいずれかです: {unknown}")
+
+    return EmployeeTable(
+        employee_numbers=df[EmployeeData.employee_col_name].to_numpy(dtype=object),
+        team=team.astype(np.int32),
+        age=age.astype(np.int8),
+        team_names=team_names.tolist(),
+        age_names=age_names,
+    )
+
+
+def load_employees(source):
+    """
+    入力CSVを読み込み、(DataFrame, EmployeeTable)を返す
+
+    source: ファイルのパスまたはファイルオブジェクト
+    """
+    df = read_input(source)
+    return df, encode(df)
@@ -0,0 +1,248 @@
+import logging
+import math
+import random
+import time
+
+import numpy as np
+
+import evaluator
+from bounds import stage_lower_bounds
+from allocation import exact_assignment
+from heuristic import balanced_sizes
+from result import GroupingResult
+
+logger = logging.getLogger(__name__)
+
+
+class LocalSearch:
+    def __init__(
+        self, G: int, team_list: list, age_list: list, assignment: list, seed: int = 0
+    ) -> None:
+        """
+        同じ年齢層・別チームの2人を別々のグループ間で入れ替える局所探索(焼きなまし法)
+        入れ替えではグループの人数と若手の人数が変わらないため、初期解の人数構成が保たれる
+
+        G: グループ数
+        team_list: 各社員の所属チーム
+        age_list: 各社員の年齢層(0: 若手, 1: ベテラン）
+        assignment: 初期解(各社員のグループ番号のリスト)
+        seed: 乱数のシード
+        """
+        self.G = G
+        self.N = len(team_list)
+        self.rng = random.Random(seed)
+
+        # team: 各社員のチーム番号(0, 1, ..., T-1に振り直したもの), age: 各社員の年齢層
+        teams, team_idx = np.unique(np.asarray(team_list), return_inverse=True)
+        self.T = len(teams)
+        self.team = team_idx.astype(np.int32)
+        self.age = np.asarray(age_list, dtype=np.int8)
+
+        # 年齢層ごとの社員番号(入れ替え相手の候補)
+        self.by_age = [np.flatnonzero(self.age == a) for a in (0, 1)]
+
+        self.reset(assignment)
+
+        # 各段階の目的関数の下界
+        totals = self.counts.sum(axis=0).tolist()
+        young_counts = [y for y, _ in totals]
+        old_counts = [o for _, o in totals]
+        lower_bounds = stage_lower_bounds(young_counts, old_counts, self.G)
+        # 若手の被り数の最小値が下界の前提を満たす(全ての(グループ, チーム)に若手がいる)ときは、
+        # 若手と同じグループのベテランの被り数の下界を強められる
+        min_young = min(c // self.G for c in young_counts)
+        lower_bounds["young_with_old"] = stage_lower_bounds(
+            young_counts, old_counts, self.G, min_young=min_young
+        )["young_with_old"]
+        self.lower_bounds = tuple(
+            lower_bounds[key] for key in ("young", "young_with_old", "old")
+        )
+
+        # 目的関数は(若手同士, 若手と同じグループのベテラン, ベテラン同士)の被り数の範囲の辞書式順序
+        # 範囲が同じ解の間では、最大値をとる(グループ, チーム)と最小値をとる(グループ, チーム)の
+        # 少ない方の数が少ないほど良いとする(それらを解消すれば範囲が縮まるため)
+        # (範囲が下界に達した段階では、後の段階の改善を妨げないよう数は考慮しない)
+        self.level_weight = self.G * self.T + 1
+        self.weight = (self.N + 1) * self.level_weight
+
+    def reset(self, assignment):
+        # 割り当てから人数とヒストグラムを作り直す
+        self.assign = np.asarray(assignment, dtype=np.int32).copy()
+
+        # counts[g, t, a]: グループgの、チームt・年齢層aの人数
+        _, counts = evaluator.count_tensor(self.assign, self.team, self.age, self.G)
+        self.counts = counts.astype(np.int32)
+
+        # 被り数ごとの(グループ, チーム)の数のヒストグラム
+        # hist[0]: 若手同士, hist[1]: 若手と同じグループのベテラン, hist[2]: ベテラン同士
+        # 入れ替えで変わるのは4つの(グループ, チーム)だけなので、差分更新で目的関数を評価できる
+        size = int(self.counts.sum(axis=0).max()) + 2
+        young = self.counts[:, :, 0].ravel()
+        old = self.counts[:, :, 1].ravel()
+        self.hist = [
+            np.bincount(young, minlength=size).tolist(),
+            np.bincount(old[young > 0], minlength=size).tolist(),
+            np.bincount(old, minlength=size).tolist(),
+        ]
+        self.extremes = [self.scan(k, size - 1, 0) for k in range(3)]
+
+    def scan(self, k, hi, lo):
+        # ヒストグラムkの最大値と最小値を、hi以下・lo以上の範囲から探す
+        hist = self.hist[k]
+        while hi > 0 and hist[hi] == 0:
+            hi -= 1
+        while lo < hi and hist[lo] == 0:
+            lo += 1
+        return hi, lo
+
+    def ranges(self):
+        # 各段階のチーム被り数の最大値と最小値の差
+        return tuple(hi - lo for hi, lo in self.extremes)
+
+    def score(self):
+        # 辞書式順序を1つの整数で表した目的関数値(小さいほど良い)
+        score = 0
+        for k, (hi, lo) in enumerate(self.extremes):
+            level = (hi - lo) * self.level_weight
+            if hi - lo > self.lower_bounds[k]:
+                level += min(self.hist[k][hi], self.hist[k][lo])
+            score = score * self.weight + level
+        return score
+
+    def update(self, g, t, a, diff, added):
+        # counts[g, t, a]をdiffだけ変え、ヒストグラムを差分更新する
+        # added[k]: ヒストグラムkに新しく加わった値の(最大値, 最小値)
+        young, old = int(self.counts[g, t, 0]), int(self.counts[g, t, 1])
+        self.counts[g, t, a] += diff
+        new_young, new_old = int(self.counts[g, t, 0]), int(self.counts[g, t, 1])
+
+        for k, before, after in ((0, young, new_young), (2, old, new_old)):
+            if before != after:
+                self.hist[k][before] -= 1
+                self.hist[k][after] += 1
+                added[k] = (max(added[k][0], after), min(added[k][1], after))
+        if young > 0:
+            self.hist[1][old] -= 1
+        if new_young > 0:
+            self.hist[1][new_old] += 1
+            added[1] = (max(added[1][0], new_old), min(added[1][1], new_old))
+
+    def swap(self, i, j):
+        # 社員iとjのグループを入れ替える
+        gi, gj = int(self.assign[i]), int(self.assign[j])
+        ti, tj = int(self.team[i]), int(self.team[j])
+        a = int(self.age[i])
+
+        added = [(0, len(self.hist[0]))] * 3
+        self.update(gi, ti, a, -1, added)
+        self.update(gi, tj, a, 1, added)
+        self.update(gj, tj, a, -1, added)
+        self.update(gj, ti, a, 1, added)
+        self.assign[i], self.assign[j] = gj, gi
+
+        for k in range(3):
+            hi, lo = self.extremes[k]
+            self.extremes[k] = self.scan(
+                k, max(hi, added[k][0]), min(lo, added[k][1])
+            )
+
+    def run(self, time_limit: float = 10.0, temperature: float = 1.0, progress=None):
+        """
+        焼きなまし法で解を改善する
+        目的関数が下界に達したとき、またはtime_limit秒経過したときに終了する
+
+        time_limit: 計算時間の上限(秒)
+        temperature: 初期温度
+        progress: 途中経過を受け取る関数(solve_social_gatheringのprogressと同じ形式)
+                  約1秒ごとに、下界に達していない最初の段階について呼ばれる
+        """
+        start = time.perf_counter()
+        reported = 0.0  # 最後に途中経過を通知した経過時間
+        current = self.score()
+        best = current
+        best_assign = self.assign.copy()
+
+        iteration = 0
+        while self.ranges() != self.lower_bounds:
+            # 時間の確認と温度の更新は一定回数ごとに行う
+            if iteration % 1000 == 0:
+                elapsed = time.perf_counter() - start
+                if elapsed >= time_limit:
+                    break
+                # 温度は、範囲が下界に達していない最初の段階の目的関数の単位で測る
+                active = next(
+                    k
+                    for k, (r, lb) in enumerate(zip(self.ranges(), self.lower_bounds))
+                    if r > lb
+                )
+                t = (
+                    temperature
+                    * self.weight ** (2 - active)
+                    * (1 - elapsed / time_limit)
+                    + 1e-9
+                )
+                if progress is not None and elapsed - reported >= 1.0:
+                    reported = elapsed
+                    progress(
+                        {
+                            "stage": active + 1,
+                            "status": "searching",
+                            "value": self.ranges()[active],
+                        }
+                    )
+            iteration += 1
+
+            i = self.rng.randrange(self.N)
+            candidates = self.by_age[self.age[i]]
+            j = int(candidates[self.rng.randrange(len(candidates))])
+            if self.assign[i] == self.assign[j] or self.team[i] == self.team[j]:
+                continue
+
+            self.swap(i, j)
+            new = self.score()
+            delta = new - current
+            if delta <= 0 or self.rng.random() < math.exp(-delta / t):
+                current = new
+                if current < best:
+                    best = current
+                    best_assign = self.assign.copy()
+            else:
+                self.swap(i, j)
+
+        if best < current:
+            self.reset(best_assign)
+        return self.assign.tolist()
+
+
+def solve_local_search(
+    N, G, team_list, age_list, time_limit=10.0, seed=0, progress=None
+):
+    """
+    局所探索でグループ分けを求める(solve_social_gatheringの大規模向けの代替)
+    若手同士・ベテラン同士の被り数が下界に一致する初期解(allocation.exact_assignment)から、
+    同じ年齢層の2人の入れ替えを繰り返して解を改善する
+
+    time_limit: 計算時間の上限(秒)
+    seed: 乱数のシード
+    progress: 途中経過を受け取る関数(solve_social_gatheringのprogressと同じ形式)
+    返り値: solve_social_gatheringと同じグループ分けの結果(GroupingResult)
+    """
+    num_young = sum(1 for a in age_list if a == 0)
+    assignment = exact_assignment(
+        G,
+        team_list,
+        age_list,
+        balanced_sizes(N, G),
+        balanced_sizes(num_young, G),
+    )
+
+    ls = LocalSearch(G, team_list, age_list, assignment, seed=seed)
+    assignment = ls.run(time_limit=time_limit, progress=progress)
+    logger.info(
+        "局所探索: 被り数の範囲(若手同士, 若手とベテラン, ベテラン同士) = %s", ls.ranges()
+    )
+    if progress is not None:
+        for stage, value in enumerate(ls.ranges(), 1):
+            progress({"stage": stage, "status": "feasible", "value": value})
+
+    return GroupingResult(G, assignment, team_list, age_list)
@@ -0,0 +1,130 @@
+import dataclasses
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from heuristic import balanced_sizes, greedy_assignment
+from local_search import LocalSearch
+from result import GroupingResult
+
+logger = logging.getLogger(__name__)
+
+
+def split_blocks(G: int, team_list: list, age_list: list, num_blocks: int) -> list:
+    """
+    社員とグループをnum_blocks個のブロックに分ける
+    貪欲法の初期解((年齢層, チーム)の順に1人ずつ配ったもの)の連続するグループをまとめてブロックとするため、
+    各ブロックにはグループの数に比例した人数の(チーム, 年齢層)の社員が入り、
+    ブロックの人数と若手の人数はブロックのグループの人数の合計と一致する
+
+    返り値: ブロックごとの(グループの番号の配列, 社員の番号の配列)のリスト
+    """
+    N = len(team_list)
+    num_young = sum(1 for a in age_list if a == 0)
+    assignment = np.asarray(
+        greedy_assignment(
+            G,
+            team_list,
+            age_list,
+            balanced_sizes(N, G),
+            balanced_sizes(num_young, G),
+        )
+    )
+    blocks = []
+    for groups in np.array_split(np.arange(G), num_blocks):
+        members = np.flatnonzero((assignment >= groups[0]) & (assignment <= groups[-1]))
+        blocks.append((groups, members))
+    return blocks
+
+
+def solve_block(N, G, team_list, age_list, aggregate, options):
+    # ブロックの部分問題を解き、各社員のブロック内のグループ番号の配列を返す
+    # (ワーカープロセスで実行される)
+    from social_gathering import solve_social_gathering
+
+    result = solve_social_gathering(
+        N, G, team_list, age_list, aggregate=aggregate, options=options
+    )
+    return result.assignment
+
+
+def solve_partitioned(
+    N,
+    G,
+    team_list,
+    age_list,
+    block_size=300,
+    workers=None,
+    aggregate=True,
+    options=None,
+    repair_time=10.0,
+    progress=None,
+):
+    """
+    社員をブロックに分けて、ブロックごとの部分問題を並列に解き、つなぎ合わせる(大規模向け)
+    つなぎ合わせた解は、ブロックをまたぐ入れ替え(local_search.LocalSearch)で全体の被り数の範囲を改善する
+
+    block_size: 1ブロックのおおよその人数
+    workers: 並列に解くプロセス数(Noneのとき CPU数)
+    aggregate, options: 各ブロックのsolve_social_gatheringの引数(engine="milp")
+                        ブロックごとに1プロセスで解くため、ソルバーは1スレッドとする
+    repair_time: 入れ替えの計算時間の上限(秒)
+    progress: 進捗を受け取る関数(solve_social_gatheringのprogressと同じ形式)
+    返り値: solve_social_gatheringと同じグループ分けの結果(GroupingResult)
+            meta["blocks"]にブロック数、meta["block_time"]に部分問題の計算時間(秒)を持つ
+    """
+    from social_gathering import SolverOptions
+
+    if options is None:
+        options = SolverOptions()
+    options = dataclasses.replace(options, threads=1, msg=False)
+
+    num_blocks = max(1, min(G, round(N / block_size)))
+    blocks = split_blocks(G, team_list, age_list, num_blocks)
+    team = np.asarray(team_list)
+    age = np.asarray(age_list)
+    args = [
+        (len(members), len(groups), team[members].tolist(), age[members].tolist())
+        for groups, members in blocks
+    ]
+
+    start = time.perf_counter()
+    # 別プロセスの中(アプリのSolveWorker等、daemonのプロセス)では子プロセスを作れないため、順に解く
+    if num_blocks == 1 or multiprocessing.current_process().daemon:
+        solutions = [solve_block(*a, aggregate, options) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(solve_block, *a, aggregate, options) for a in args
+            ]
+            solutions = [future.result() for future in futures]
+    block_time = time.perf_counter() - start
+    logger.info("部分問題: %dブロック (%.2f秒)", num_blocks, block_time)
+
+    # ブロック内のグループ番号を全体のグループ番号に置き換えてつなぎ合わせる
+    assignment = np.empty(N, dtype=np.int32)
+    for (groups, members), solution in zip(blocks, solutions):
+        assignment[members] = groups[np.asarray(solution)]
+
+    ls = LocalSearch(G, team_list, age_list, assignment)
+    before = ls.ranges()
+    assignment = ls.run(time_limit=repair_time, temperature=0.1, progress=progress)
+    logger.info(
+        "入れ替え: 被り数の範囲(若手同士, 若手とベテラン, ベテラン同士) = %s -> %s",
+        before,
+        ls.ranges(),
+    )
+    if progress is not None:
+        for stage, value in enumerate(ls.ranges(), 1):
+            progress({"stage": stage, "status": "feasible", "value": value})
+
+    return GroupingResult(
+        G,
+        assignment,
+        team_list,
+        age_list,
+        {"blocks": num_blocks, "block_time": block_time},
+    )
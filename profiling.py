@@ -0,0 +1,30 @@
+import contextlib
+import cProfile
+import tracemalloc
+
+
+@contextlib.contextmanager
+def capture(profile_path: str = None, trace_memory: bool = False):
+    """
+    with内の処理の計算時間の内訳(cProfile)とメモリ使用量(tracemalloc)を計測する
+
+    profile_path: cProfileの結果(pstats形式)の保存先。Noneのときは計測しない
+    trace_memory: Trueのとき、Pythonのメモリ使用量の最大値(バイト)を計測する
+    返り値(as): 計測結果の辞書。withを抜けたときに"profile", "peak_memory"が入る
+    """
+    stats = {}
+    profiler = cProfile.Profile() if profile_path is not None else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield stats
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile_path)
+            stats["profile"] = profile_path
+        if trace_memory:
+            _, stats["peak_memory"] = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
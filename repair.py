@@ -0,0 +1,233 @@
+import logging
+import time
+
+import numpy as np
+import pulp
+
+from result import GroupingResult
+from social_gathering import SocialGathering, SolverOptions
+
+logger = logging.getLogger(__name__)
+
+
+def target_sizes(current, total: int, G: int) -> list:
+    """
+    各グループの人数をできるだけ変えずに、total人をG個のグループにできるだけ均等に分けたときの人数
+    今の人数の多いグループから+1人とする
+
+    current: 各グループの今の人数
+    """
+    q, r = divmod(total, G)
+    order = sorted(range(G), key=lambda g: (-current[g], g))
+    target = [q] * G
+    for g in order[:r]:
+        target[g] = q + 1
+    return target
+
+
+def team_counts(group, team, age, G: int, T: int):
+    # counts[g, t, a]: グループgの、チームt・年齢層aの人数(groupが-1の社員は数えない)
+    mask = group >= 0
+    flat = (group[mask].astype(np.int64) * T + team[mask]) * 2 + age[mask]
+    return np.bincount(flat, minlength=G * T * 2).reshape(G, T, 2)
+
+
+def neighborhood(group, team, age, counts, changed, num_added, extra_groups):
+    """
+    解き直すグループを選ぶ
+    人数が変わるグループに加えて、追加した社員ごとに、その(チーム, 年齢層)の社員が最も少ない
+    グループをextra_groups個まで選ぶ(追加した社員の入れ先の候補を増やすため)
+    """
+    hood = set(changed)
+    N = len(group) - num_added
+    for n in range(N, len(group)):
+        if extra_groups <= 0:
+            break
+        candidates = [g for g in range(counts.shape[0]) if g not in hood]
+        if not candidates:
+            break
+        g = min(candidates, key=lambda g: (counts[g, team[n], age[n]], g))
+        hood.add(g)
+        extra_groups -= 1
+    return sorted(hood)
+
+
+def repair_assignment(
+    previous: GroupingResult,
+    removed=(),
+    added_team=(),
+    added_age=(),
+    extra_groups=4,
+    options=None,
+):
+    """
+    公開したグループ分けに、欠席した社員と追加の社員を反映する
+    人数が変わるグループと、追加の社員を入れられるいくつかのグループだけを解き直し、
+    それ以外の社員は今のグループのままとする
+    解き直すグループの中では、チーム被りの範囲を(若手同士, 若手と同じグループのベテラン,
+    ベテラン同士)の辞書式順序で小さくした上で、グループが変わる社員の数を最小化する
+    (解き直さないグループの被り数も範囲に含める)
+
+    previous: 前回のグループ分けの結果
+    removed: 欠席する社員の番号(previousでの番号)
+    added_team: 追加の社員の所属チーム(previousと同じチームの番号。新しいチームでもよい)
+    added_age: 追加の社員の年齢層(0: 若手, 1: ベテラン）
+    extra_groups: 人数が変わるグループのほかに解き直すグループの数の上限
+    options: ソルバーの設定(SolverOptions)。Noneのとき既定の設定
+    返り値: グループ分けの結果(GroupingResult)。社員は、previousから欠席者を除いた社員(元の順)、
+            追加の社員の順に並ぶ
+            meta["moved"]にグループが変わった社員の数、meta["groups"]に解き直したグループの数、
+            meta["solve_time"]に計算時間(秒)を持つ
+    """
+    if options is None:
+        options = SolverOptions(msg=False)
+    if len(added_team) != len(added_age):
+        raise ValueError("added_teamとadded_ageの長さが一致しません")
+    start = time.perf_counter()
+
+    G = previous.G
+    keep = np.setdiff1d(np.arange(previous.N), np.asarray(removed, dtype=np.int64))
+    num_added = len(added_team)
+    team_list = np.concatenate(
+        [previous.team[keep], np.asarray(added_team, dtype=np.int32)]
+    )
+    age_list = np.concatenate(
+        [previous.age[keep], np.asarray(added_age, dtype=np.int8)]
+    )
+    N = len(team_list)
+    if N < G:
+        raise ValueError(f"社員数({N})がグループ数({G})より少ないです")
+    # group: 各社員の今のグループ番号(追加の社員は-1)
+    group = np.concatenate(
+        [previous.assignment[keep], np.full(num_added, -1, dtype=np.int32)]
+    )
+    previous_group = group.copy()
+
+    # 人数ができるだけ変わらないように、各グループの人数と若手の人数を決め直す
+    sizes = np.bincount(group[group >= 0], minlength=G)
+    young_sizes = np.bincount(group[(group >= 0) & (age_list == 0)], minlength=G)
+    group_n_list = target_sizes(sizes, N, G)
+    young_n_list = target_sizes(young_sizes, int((age_list == 0).sum()), G)
+    changed = {
+        g
+        for g in range(G)
+        if group_n_list[g] != sizes[g] or young_n_list[g] != young_sizes[g]
+    }
+    changed.update(previous.assignment[np.asarray(removed, dtype=np.int64)].tolist())
+
+    teams, team_idx = np.unique(team_list, return_inverse=True)
+    counts = team_counts(group, team_idx, age_list, G, len(teams))
+    hood = neighborhood(
+        group, team_idx, age_list, counts, changed, num_added, extra_groups
+    )
+
+    solution = None
+    while solution is None:
+        solution, sub_members = solve_neighborhood(
+            hood,
+            group,
+            team_list,
+            age_list,
+            teams,
+            counts,
+            group_n_list,
+            young_n_list,
+            options,
+        )
+        if solution is None:
+            if len(hood) == G:
+                raise RuntimeError("解き直した問題の解が得られませんでした")
+            # 近傍で解けないときは、全てのグループを解き直す
+            logger.warning(
+                "%dグループでは解が得られないため、全グループを解き直す", len(hood)
+            )
+            hood = list(range(G))
+    group[sub_members] = np.asarray(hood)[solution]
+
+    moved = int(((previous_group >= 0) & (previous_group != group)).sum())
+    solve_time = time.perf_counter() - start
+    logger.info(
+        "再最適化: %dグループを解き直し、%d人のグループを変更 (%.2f秒)",
+        len(hood),
+        moved,
+        solve_time,
+    )
+    return GroupingResult(
+        G,
+        group,
+        team_list,
+        age_list,
+        {"moved": moved, "groups": len(hood), "solve_time": solve_time},
+    )
+
+
+def solve_neighborhood(
+    hood, group, team_list, age_list, teams, counts, group_n_list, young_n_list, options
+):
+    """
+    hoodのグループの社員と追加の社員だけのモデルを作り、解き直す
+    返り値: (部分問題の各社員のhoodでの番号(解が得られなかったときはNone), 部分問題の社員の番号)
+    """
+    in_hood = np.zeros(len(group_n_list), dtype=bool)
+    in_hood[hood] = True
+    # 追加の社員(groupが-1)は必ず部分問題に含める
+    sub_members = np.flatnonzero((group < 0) | in_hood[np.maximum(group, 0)])
+    local = {g: k for k, g in enumerate(hood)}
+
+    sub = SocialGathering(
+        len(sub_members),
+        len(hood),
+        team_list[sub_members].tolist(),
+        age_list[sub_members].tolist(),
+        teams=teams.tolist(),
+        group_n_list=[group_n_list[g] for g in hood],
+        young_n_list=[young_n_list[g] for g in hood],
+    )
+    sub.set_only_one_group()
+    sub.set_group_num()
+    sub.set_young_num()
+    sub.set_young_team_overlap()
+    sub.set_young_team_overlap_with_old()
+    sub.set_old_team_overlap()
+    sub.set_bounds()
+
+    # 解き直さないグループの被り数も、範囲(最大値と最小値)に含める
+    outside = counts[~in_hood]
+    if len(outside) > 0:
+        young = outside[:, :, 0]
+        old = outside[:, :, 1]
+        for max_var, min_var, values in (
+            (sub.max_young_overlap, sub.min_young_overlap, young),
+            (
+                sub.max_young_overlap_with_old,
+                sub.min_young_overlap_with_old,
+                old[young > 0],
+            ),
+            (sub.max_old_overlap, sub.min_old_overlap, old),
+        ):
+            if values.size == 0:
+                continue
+            hi, lo = int(values.max()), int(values.min())
+            max_var.lowBound = max(max_var.lowBound, hi)
+            max_var.upBound = max(max_var.upBound, hi)
+            min_var.upBound = min(min_var.upBound, lo)
+
+    # 目的関数: 被り数の範囲の辞書式順序を優先し、その中でグループが変わる社員の数を最小化する
+    # 範囲は1グループの人数以下、変わる社員の数は部分問題の人数以下であるため、重みで順序を保てる
+    K = max(group_n_list) + 1
+    M = len(sub_members) + 1
+    ranges = (
+        K * K * (sub.max_young_overlap - sub.min_young_overlap)
+        + K * (sub.max_young_overlap_with_old - sub.min_young_overlap_with_old)
+        + (sub.max_old_overlap - sub.min_old_overlap)
+    )
+    moves = pulp.lpSum(
+        1 - sub.x[i][local[group[n]]]
+        for i, n in enumerate(sub_members)
+        if group[n] >= 0
+    )
+    sub.set_objective(M * ranges + moves)
+    sub.solve(options)
+    if not sub.has_solution():
+        return None, sub_members
+    return sub.assignment(), sub_members
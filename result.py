@@ -0,0 +1,105 @@
+import numpy as np
+
+import evaluator
+
+
+class GroupingResult:
+    """
+    グループ分けの結果
+    各社員のグループ番号の配列だけを持ち、グループごとのリストや被り数は必要になったときに作る
+    (result_member, result_age, result_team)として展開でき、従来のタプルの代わりに使える
+
+    G: グループ数
+    assignment: 各社員のグループ番号
+    team_list: 各社員の所属チーム
+    age_list: 各社員の年齢層(0: 若手, 1: ベテラン）
+    meta: 求解の付加情報(各段階の状態など)
+    """
+
+    __slots__ = ("G", "assignment", "team", "age", "meta", "_order", "_counts")
+
+    def __init__(self, G: int, assignment, team_list, age_list, meta=None) -> None:
+        self.G = G
+        self.assignment = np.asarray(assignment, dtype=np.int32)
+        self.team = np.asarray(team_list, dtype=np.int32)
+        self.age = np.asarray(age_list, dtype=np.int8)
+        self.meta = {} if meta is None else meta
+        self._order = None
+        self._counts = None
+
+    @property
+    def N(self) -> int:
+        return len(self.assignment)
+
+    def order(self) -> list:
+        # グループごとの社員番号の配列(グループ内は社員番号の順)
+        if self._order is None:
+            order = np.argsort(self.assignment, kind="stable")
+            sizes = np.bincount(self.assignment, minlength=self.G)
+            self._order = np.split(order, np.cumsum(sizes)[:-1])
+        return self._order
+
+    @property
+    def members(self) -> list:
+        # グループごとの社員番号のリスト
+        return [members.tolist() for members in self.order()]
+
+    @property
+    def ages(self) -> list:
+        # グループごとの年齢層のリスト
+        return [self.age[members].tolist() for members in self.order()]
+
+    @property
+    def teams(self) -> list:
+        # グループごとのチームのリスト
+        return [self.team[members].tolist() for members in self.order()]
+
+    @property
+    def counts(self):
+        # counts[g, t, a]: グループgの、t番目のチーム・年齢層aの人数(evaluator.count_tensor)
+        if self._counts is None:
+            _, self._counts = evaluator.count_tensor(
+                self.assignment, self.team, self.age, self.G
+            )
+        return self._counts
+
+    def overlap_values(self) -> dict:
+        # 各段階のチーム被り数の(最大値, 最小値)
+        return evaluator.overlap_values(self.counts)
+
+    def ranges(self) -> tuple:
+        # 各段階のチーム被り数の最大値と最小値の差(若手同士, 若手と同じグループのベテラン, ベテラン同士)
+        values = self.overlap_values()
+        return tuple(
+            values[key][0] - values[key][1]
+            for key in ("young", "young_with_old", "old")
+        )
+
+    def __iter__(self):
+        # result_member, result_age, result_team = result として展開できるようにする
+        return iter((self.members, self.ages, self.teams))
+
+    def to_dict(self) -> dict:
+        # JSONに保存できる形式(グループごとのリスト等は復元時に作り直す)
+        return {
+            "G": self.G,
+            "assignment": self.assignment.tolist(),
+            "team": self.team.tolist(),
+            "age": self.age.tolist(),
+            "meta": self.meta,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GroupingResult":
+        return cls(
+            data["G"], data["assignment"], data["team"], data["age"], data["meta"]
+        )
+
+    def __getstate__(self):
+        # pickle(プロセス間の受け渡し等)では、配列だけを送る
+        return (self.G, self.assignment, self.team, self.age, self.meta)
+
+    def __setstate__(self, state):
+        self.G, self.assignment, self.team, self.age, self.meta = state
+        self._order = None
+        self._counts = None
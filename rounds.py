@@ -0,0 +1,425 @@
+import argparse
+import json
+import logging
+import os
+import random
+import time
+
+import pandas as pd
+
+from loader import load_employees
+from result import GroupingResult
+from social_gathering import SolverOptions, solve_social_gathering
+
+logger = logging.getLogger(__name__)
+
+
+def to_json_id(v):
+    # numpyの整数などはJSONに保存できないため、Pythonの値に直す
+    return v.item() if hasattr(v, "item") else v
+
+
+def id_key(v):
+    # 型の異なるidも比較できるように、(型の名前, 値)で並べる(numpyの整数はPythonの整数として扱う)
+    v = to_json_id(v)
+    return (type(v).__name__, v)
+
+
+class PairHistory:
+    def __init__(self) -> None:
+        """
+        これまでの回で同じグループになった社員の組と、その回数
+        同じグループになった組だけを社員ごとの辞書に持つため、大きさは社員数の2乗ではなく、
+        (回数)×(社員数)×(1グループの人数)程度になる
+        社員は社員番号などの任意の値(id)で表し、回ごとに参加者が変わってもよい
+        """
+        # partners[i][j]: 社員iとjが同じグループになった回数(i, jの両方向に持つ)
+        self.partners = {}
+        # rounds: 記録した回数
+        self.rounds = 0
+
+    def add_round(self, groups) -> None:
+        # 1回分のグループ分け(グループごとの社員のidのリスト)を記録する
+        for members in groups:
+            for i in members:
+                partners = self.partners.setdefault(i, {})
+                for j in members:
+                    if j != i:
+                        partners[j] = partners.get(j, 0) + 1
+        self.rounds += 1
+
+    def count(self, i, j) -> int:
+        # 社員iとjが同じグループになった回数
+        return self.partners.get(i, {}).get(j, 0)
+
+    def index_partners(self, employee_ids: list) -> list:
+        """
+        今回の参加者だけに絞り、社員のidを今回の社員の番号に置き換える
+        返り値: 社員の番号ごとの{同じグループになった社員の番号: 回数}のリスト
+        """
+        index = {v: k for k, v in enumerate(employee_ids)}
+        result = []
+        for i in employee_ids:
+            partners = self.partners.get(i, {})
+            result.append(
+                {index[j]: c for j, c in partners.items() if j in index}
+            )
+        return result
+
+    def repeats(self, groups) -> dict:
+        """
+        グループ分けの中で、以前にも同じグループになった組の数と回数の合計
+        groups: グループごとの社員のidのリスト
+        返り値: {"repeat_pairs": 組の数, "repeat_cost": 同じグループになった回数の合計}
+        """
+        pairs = 0
+        cost = 0
+        for members in groups:
+            for k, i in enumerate(members):
+                partners = self.partners.get(i, {})
+                for j in members[k + 1 :]:
+                    c = partners.get(j, 0)
+                    if c > 0:
+                        pairs += 1
+                        cost += c
+        return {"repeat_pairs": pairs, "repeat_cost": cost}
+
+    def to_dict(self) -> dict:
+        # JSONに保存できる形式(組は片方向だけ保存する)
+        # 社員のidは型を変えずに保存する(整数のidは整数、文字列のidは文字列のまま読み戻せる)
+        pairs = []
+        for i, partners in self.partners.items():
+            for j, c in partners.items():
+                if id_key(i) < id_key(j):
+                    pairs.append([to_json_id(i), to_json_id(j), c])
+        return {"rounds": self.rounds, "pairs": pairs}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PairHistory":
+        history = cls()
+        history.rounds = data["rounds"]
+        for i, j, c in data["pairs"]:
+            history.partners.setdefault(i, {})[j] = c
+            history.partners.setdefault(j, {})[i] = c
+        return history
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "PairHistory":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+class RepeatSearch:
+    def __init__(
+        self,
+        G: int,
+        team_list: list,
+        age_list: list,
+        assignment: list,
+        partners: list,
+        seed: int = 0,
+    ) -> None:
+        """
+        同じ(チーム, 年齢層)の2人を別々のグループ間で入れ替え、以前にも同じグループになった組を減らす
+        同じ(チーム, 年齢層)の社員の入れ替えでは(グループ, チーム, 年齢層)ごとの人数が変わらないため、
+        チーム被りの値は初期解のまま保たれる
+
+        G: グループ数
+        team_list: 各社員の所属チーム
+        age_list: 各社員の年齢層(0: 若手, 1: ベテラン）
+        assignment: 初期解(各社員のグループ番号のリスト)
+        partners: 社員の番号ごとの{同じグループになった社員の番号: 回数}(PairHistory.index_partners)
+        seed: 乱数のシード
+        """
+        self.G = G
+        self.N = len(assignment)
+        self.rng = random.Random(seed)
+        self.partners = partners
+        self.assign = list(assignment)
+
+        # members[g]: グループgの社員の番号の集合
+        self.members = [set() for _ in range(G)]
+        for n, g in enumerate(self.assign):
+            self.members[g].add(n)
+
+        # same[n]: 社員nと同じ(チーム, 年齢層)の社員の番号(入れ替え相手の候補)
+        classes = {}
+        for n, key in enumerate(zip(team_list, age_list)):
+            classes.setdefault(key, []).append(n)
+        self.same = [classes[key] for key in zip(team_list, age_list)]
+
+        # active: 以前に誰かと同じグループになった社員(入れ替えで改善しうる社員)
+        self.active = [n for n in range(self.N) if partners[n]]
+
+        self.cost = sum(self.group_cost(n, self.assign[n]) for n in range(self.N)) // 2
+
+    def group_cost(self, n, g):
+        # 社員nがグループgの社員と以前に同じグループになった回数の合計
+        partners = self.partners[n]
+        if len(partners) < len(self.members[g]):
+            return sum(c for m, c in partners.items() if self.assign[m] == g and m != n)
+        return sum(partners.get(m, 0) for m in self.members[g])
+
+    def delta(self, i, j):
+        # 社員iとjを入れ替えたときの、回数の合計の変化
+        gi, gj = self.assign[i], self.assign[j]
+        h = self.partners[i].get(j, 0)
+        return (
+            self.group_cost(i, gj)
+            - h
+            - self.group_cost(i, gi)
+            + self.group_cost(j, gi)
+            - h
+            - self.group_cost(j, gj)
+        )
+
+    def swap(self, i, j):
+        gi, gj = self.assign[i], self.assign[j]
+        self.members[gi].remove(i)
+        self.members[gj].remove(j)
+        self.members[gi].add(j)
+        self.members[gj].add(i)
+        self.assign[i], self.assign[j] = gj, gi
+
+    def shuffle(self):
+        # 同じ(チーム, 年齢層)の社員の間でグループを並べ替える(人数の構成は変わらない)
+        for members in {id(c): c for c in self.same}.values():
+            groups = [self.assign[n] for n in members]
+            self.rng.shuffle(groups)
+            for n, g in zip(members, groups):
+                self.assign[n] = g
+        self.members = [set() for _ in range(self.G)]
+        for n, g in enumerate(self.assign):
+            self.members[g].add(n)
+        self.cost = sum(self.group_cost(n, self.assign[n]) for n in range(self.N)) // 2
+
+    def run(self, time_limit: float = 1.0, patience: int = None):
+        """
+        改善する(または変わらない)入れ替えを繰り返す
+        回数の合計が0になったとき、patience回続けて改善しなかったとき、
+        またはtime_limit秒経過したときに終了する
+
+        time_limit: 計算時間の上限(秒)
+        patience: 改善しない入れ替えの試行を続ける回数(Noneのとき社員数の20倍)
+        返り値: 各社員のグループ番号のリスト
+        """
+        if patience is None:
+            patience = 20 * self.N
+        start = time.perf_counter()
+        stall = 0
+        iteration = 0
+        while self.cost > 0 and self.active and stall < patience:
+            if iteration % 1000 == 0 and time.perf_counter() - start >= time_limit:
+                break
+            iteration += 1
+            stall += 1
+
+            i = self.active[self.rng.randrange(len(self.active))]
+            candidates = self.same[i]
+            j = candidates[self.rng.randrange(len(candidates))]
+            if self.assign[i] == self.assign[j]:
+                continue
+            delta = self.delta(i, j)
+            if delta <= 0:
+                self.swap(i, j)
+                self.cost += delta
+                if delta < 0:
+                    stall = 0
+        return list(self.assign)
+
+
+def plan_round(
+    N,
+    G,
+    team_list,
+    age_list,
+    history,
+    employee_ids=None,
+    base=None,
+    time_limit=1.0,
+    seed=0,
+    **kwargs,
+):
+    """
+    これまでの回(history)を踏まえて、次の回のグループ分けを求める
+    solve_social_gatheringでチーム被りを最適化した後、同じ(チーム, 年齢層)の社員の入れ替えで
+    以前にも同じグループになった組を減らす(チーム被りの値は変わらない)
+    historyは更新しない(記録するときはPairHistory.add_roundを呼ぶ)
+
+    history: これまでの回の記録(PairHistory)
+    employee_ids: 各社員のid(historyの社員の表し方)。Noneのとき社員の番号
+    base: チーム被りを最適化したグループ分け(GroupingResult)。Noneのとき
+          solve_social_gatheringで求める(同じ社員で複数回求めるときは使い回せる)
+    time_limit: 入れ替えの計算時間の上限(秒)
+    seed: 乱数のシード
+    kwargs: solve_social_gatheringの引数
+    返り値: グループ分けの結果(GroupingResult)
+            meta["repeat_pairs"], meta["repeat_cost"]に、以前にも同じグループになった組の数と
+            回数の合計を持つ
+    """
+    if employee_ids is None:
+        employee_ids = list(range(N))
+    if base is None:
+        base = solve_social_gathering(N, G, team_list, age_list, **kwargs)
+
+    assignment = base.assignment.tolist()
+    partners = history.index_partners(employee_ids)
+    if any(partners):
+        start = time.perf_counter()
+        search = RepeatSearch(G, team_list, age_list, assignment, partners, seed=seed)
+        before = search.cost
+        # 前回と同じ並びから始めると全員が前回と同じになるため、並べ替えてから探索する
+        search.shuffle()
+        if search.cost > before:
+            search = RepeatSearch(
+                G, team_list, age_list, assignment, partners, seed=seed
+            )
+        assignment = search.run(time_limit=time_limit)
+        logger.info(
+            "同じグループになった回数の合計: %d -> %d (%.2f秒)",
+            before,
+            search.cost,
+            time.perf_counter() - start,
+        )
+
+    result = GroupingResult(G, assignment, team_list, age_list, dict(base.meta))
+    result.meta.update(
+        history.repeats(
+            [[employee_ids[n] for n in members] for members in result.members]
+        )
+    )
+    return result
+
+
+def plan_rounds(
+    N, G, team_list, age_list, rounds, history=None, employee_ids=None, **kwargs
+):
+    """
+    rounds回分のグループ分けを、前の回までに同じグループになった組を避けながら順に求める
+    チーム被りの最適化は最初に一度だけ行い、各回はその人数の構成を保ったまま社員を入れ替える
+
+    rounds: 回数
+    history: これまでの回の記録(PairHistory)。求めた各回を追記する。Noneのとき空の記録から始める
+    employee_ids: 各社員のid(historyの社員の表し方)。Noneのとき社員の番号
+    kwargs: plan_roundの引数(time_limit, seed)とsolve_social_gatheringの引数
+    返り値: 回ごとのグループ分けの結果(GroupingResult)のリスト
+    """
+    if history is None:
+        history = PairHistory()
+    if employee_ids is None:
+        employee_ids = list(range(N))
+    time_limit = kwargs.pop("time_limit", 1.0)
+    seed = kwargs.pop("seed", 0)
+
+    base = solve_social_gathering(N, G, team_list, age_list, **kwargs)
+    results = []
+    for k in range(rounds):
+        result = plan_round(
+            N,
+            G,
+            team_list,
+            age_list,
+            history,
+            employee_ids=employee_ids,
+            base=base,
+            time_limit=time_limit,
+            seed=seed + k,
+        )
+        history.add_round(
+            [[employee_ids[n] for n in members] for members in result.members]
+        )
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="同じ人と同じグループになるのを避けながら、複数回分のグループ分けを行う"
+    )
+    parser.add_argument("input", help="入力CSV(社員番号,所属チーム,年齢層)")
+    parser.add_argument(
+        "-n", "--group-size", type=int, required=True, help="1グループの人数"
+    )
+    parser.add_argument("-k", "--rounds", type=int, default=1, help="回数")
+    parser.add_argument(
+        "--history",
+        default=None,
+        help="これまでの回の記録(JSON)。指定したときは読み込み、求めた回を追記して保存する",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=os.path.join("data", "output"),
+        help="出力先のディレクトリ",
+    )
+    parser.add_argument(
+        "--engine", choices=["milp", "local_search"], default="milp", help="求解方法"
+    )
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        default=1.0,
+        help="各回の入れ替えの計算時間の上限(秒)",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="求解中の表示を出す"
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    _, table = load_employees(args.input)
+    num_group = table.N // args.group_size  # グループ数
+    if num_group == 0:
+        parser.error(f"社員数({table.N})が1グループの人数より少ないです")
+
+    history = PairHistory()
+    if args.history is not None and os.path.exists(args.history):
+        history = PairHistory.load(args.history)
+    first = history.rounds + 1
+
+    employee_ids = table.employee_numbers.tolist()
+    results = plan_rounds(
+        table.N,
+        num_group,
+        table.team_list,
+        table.age_list,
+        args.rounds,
+        history=history,
+        employee_ids=employee_ids,
+        time_limit=args.time_limit,
+        seed=args.seed,
+        engine=args.engine,
+        options=SolverOptions(msg=args.verbose),
+    )
+
+    # 回ごとに、グループごとの社員番号をアプリと同じ形式(グループ名,社員番号,...)で出力する
+    os.makedirs(args.output, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(args.input))[0]
+    for k, result in enumerate(results, first):
+        output = pd.DataFrame(
+            {
+                f"グループ_{g:02}": {
+                    i: employee_ids[n] for i, n in enumerate(members)
+                }
+                for g, members in enumerate(result.members)
+            }
+        ).T.fillna("")
+        output_path = os.path.join(args.output, f"output_{stem}_round{k}.csv")
+        output.to_csv(output_path, header=False, encoding="utf_8_sig")
+        print(
+            f"{k}回目: {output_path} "
+            f"(以前にも同じグループになった組: {result.meta['repeat_pairs']})"
+        )
+
+    if args.history is not None:
+        history.save(args.history)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,174 @@
+from collections import Counter
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from bounds import ceil_div
+from data import EmployeeData
+
+
+@dataclass
+class GroupingRules:
+    """
+    社員の組に対する指定
+
+    together: 同じグループにする社員の番号のリストのリスト
+    separate: 互いに別々のグループにする社員の番号のリストのリスト
+    """
+
+    together: list = field(default_factory=list)
+    separate: list = field(default_factory=list)
+
+    # ルールの種類の名前(CSVの"種類"の列の値)
+    TOGETHER = "同じグループ"
+    SEPARATE = "別のグループ"
+
+    def __bool__(self) -> bool:
+        return bool(self.together or self.separate)
+
+    def representatives(self, N: int) -> list:
+        """
+        同じグループにする社員をまとめ、各社員の代表の社員の番号を返す(Union-Find)
+        代表はまとめた社員の中で最も小さい番号とする
+        """
+        parent = list(range(N))
+
+        def find(n):
+            while parent[n] != n:
+                parent[n] = parent[parent[n]]
+                n = parent[n]
+            return n
+
+        for members in self.together:
+            for n in members[1:]:
+                a, b = find(members[0]), find(n)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+        return [find(n) for n in range(N)]
+
+    def validate(self, N: int, G: int = None) -> None:
+        """
+        満たせないことが人数だけで分かるルールのときはValueErrorを送出する
+
+        N: 社員数
+        G: グループ数。指定したときは、同じグループにする社員が最も大きいグループ
+           (切り上げ(N/G)人)に入りきるか、別々のグループにする社員がG人以下かも確かめる
+        """
+        for members in self.together + self.separate:
+            for n in members:
+                if not 0 <= n < N:
+                    raise ValueError(f"社員の番号が範囲外です: {n}")
+        # 同じグループにする社員の中に、別々のグループにする社員が2人以上いるときは満たせない
+        rep = self.representatives(N)
+        for members in self.separate:
+            reps = [rep[n] for n in members]
+            if len(set(reps)) < len(reps):
+                raise ValueError(
+                    f"同じグループにする社員を別々のグループにはできません: {members}"
+                )
+        if G is None:
+            return
+        # 同じグループにする社員は、重なる指定をまとめた人数で1グループに入る
+        capacity = ceil_div(N, G)
+        sizes = Counter(rep)
+        for members in self.together:
+            if sizes[rep[members[0]]] > capacity:
+                raise ValueError(
+                    f"同じグループにする社員が1グループの人数({capacity}人)を超えています: "
+                    f"{members}"
+                )
+        for members in self.separate:
+            if len(members) > G:
+                raise ValueError(
+                    f"別々のグループにする社員がグループ数({G})を超えています: {members}"
+                )
+
+    def violations(self, assignment) -> int:
+        # 割り当てが満たしていないルールの数
+        count = 0
+        for members in self.together:
+            count += len({assignment[n] for n in members}) > 1
+        for members in self.separate:
+            count += len({assignment[n] for n in members}) < len(members)
+        return count
+
+    def repair(self, assignment, age_list) -> list:
+        """
+        ルールを満たすように、同じ年齢層の社員との入れ替えで割り当てを直す
+        (グループの人数と若手の人数は変わらない)
+        入れ替える相手はルールに含まれない社員とする。相手が見つからないときはそのままにする
+
+        assignment: 各社員のグループ番号のリスト
+        返り値: 各社員のグループ番号のリスト(満たせたかはviolationsで確認する)
+        """
+        assignment = list(assignment)
+        N = len(assignment)
+        ruled = {n for members in self.together + self.separate for n in members}
+        # free[(g, a)]: グループgの、ルールに含まれない年齢層aの社員
+        free = {}
+        for n in range(N):
+            if n not in ruled:
+                free.setdefault((assignment[n], age_list[n]), []).append(n)
+
+        def move(n, g):
+            # 社員nをグループgの同じ年齢層の社員と入れ替える
+            candidates = free.get((g, age_list[n]))
+            if not candidates:
+                return False
+            j = candidates.pop()
+            free.setdefault((assignment[n], age_list[n]), []).append(j)
+            assignment[j], assignment[n] = assignment[n], g
+            return True
+
+        rep = self.representatives(N)
+        nodes = {}
+        for n in range(N):
+            nodes.setdefault(rep[n], []).append(n)
+        # 同じグループにする社員は、代表の社員のグループに集める
+        for r, members in nodes.items():
+            for n in members:
+                if assignment[n] != assignment[r]:
+                    move(n, assignment[r])
+
+        # 別々のグループにする社員が同じグループにいるときは、まとめていない社員を空いたグループに移す
+        G = max(assignment) + 1
+        for members in self.separate:
+            used = set()
+            for n in members:
+                g = assignment[n]
+                if g not in used:
+                    used.add(g)
+                    continue
+                if len(nodes[rep[n]]) == 1:
+                    for h in range(G):
+                        if h not in used and move(n, h):
+                            break
+                used.add(assignment[n])
+        return assignment
+
+
+def load_rules(source, employee_numbers) -> GroupingRules:
+    """
+    ルールのCSV(種類,社員番号)を読み込む
+    1行が1つのルールで、種類は"同じグループ"または"別のグループ"、
+    社員番号は対象の社員の社員番号を空白で区切って並べたもの
+
+    source: ファイルのパスまたはファイルオブジェクト
+    employee_numbers: 入力データの各社員の社員番号(loader.EmployeeTable.employee_numbers)
+    """
+    df = pd.read_csv(source, dtype=str)
+    index = {v: k for k, v in enumerate(employee_numbers)}
+    rules = GroupingRules()
+    for kind, numbers in zip(df["種類"], df[EmployeeData.employee_col_name]):
+        numbers = numbers.split()
+        unknown = [v for v in numbers if v not in index]
+        if unknown:
+            raise ValueError(f"入力データにない社員番号です: {unknown}")
+        members = [index[v] for v in numbers]
+        if kind == GroupingRules.TOGETHER:
+            rules.together.append(members)
+        elif kind == GroupingRules.SEPARATE:
+            rules.separate.append(members)
+        else:
+            raise ValueError(f"未対応のルールの種類です: {kind}")
+    return rules
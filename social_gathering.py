@@ -1,14 +1,131 @@
+import dataclasses
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
 import pulp
 import numpy as np
 
+import evaluator
+from bounds import overlap_bounds, stage_lower_bounds
+from allocation import exact_assignment, rebalance_old
+from balance import TEAM_AGE, solve_balanced
+from heuristic import balanced_sizes, overlap_values
+from lexicographic import (
+    expand_choices,
+    fix_windows,
+    present_feasible,
+    restore_bounds,
+    solve_windows,
+    spread_feasible,
+    window_bounds,
+)
+from local_search import solve_local_search
+from partition import solve_partitioned
+from profiling import capture
+from result import GroupingResult
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SolverOptions:
+    """
+    ソルバーの設定
+
+    backend: 使用するソルバー("CBC" または "HiGHS")
+    threads: スレッド数(Noneのときソルバーの既定値)
+    time_limit: 段階ごとの計算時間の上限(秒)。Noneのとき上限なし
+                段階の中で複数の範囲の組を解くときは、その合計の上限とする
+                (各範囲の組には残りの時間だけを与える。lexicographic.solve_windows)
+                時間切れのときは、それまでに見つかった最良の解を使う
+                objective="weighted"のときは1回の求解の上限
+                engine="local_search"のときは全体の計算時間の上限(Noneのとき10秒)
+    gap_rel: 相対ギャップ。最良の解と下界の差がこの割合以下になったら終了する
+    msg: ソルバーのログを表示するか
+    """
+
+    backend: str = "CBC"
+    threads: Optional[int] = None
+    time_limit: Optional[float] = None
+    gap_rel: Optional[float] = None
+    msg: bool = True
+
+    def make_solver(self, warm_start=False):
+        # PuLPのソルバーを作成する
+        # HiGHSはPuLPのインターフェースが初期解に対応していないため、warm_startは無視される
+        if self.backend == "CBC":
+            solver = pulp.PULP_CBC_CMD(
+                msg=self.msg,
+                timeLimit=self.time_limit,
+                gapRel=self.gap_rel,
+                threads=self.threads,
+                warmStart=warm_start,
+            )
+        elif self.backend == "HiGHS":
+            solver = pulp.HiGHS(
+                msg=self.msg,
+                timeLimit=self.time_limit,
+                gapRel=self.gap_rel,
+                threads=self.threads,
+            )
+        else:
+            raise ValueError(f"未対応のソルバーです: {self.backend}")
+        if not solver.available():
+            raise pulp.PulpSolverError(f"ソルバーが利用できません: {self.backend}")
+        return solver
+
+
+def available_backends():
+    # この環境で利用できるソルバーの一覧
+    backends = {"CBC": pulp.PULP_CBC_CMD, "HiGHS": pulp.HiGHS}
+    return [name for name, solver in backends.items() if solver().available()]
+
+
+def build_member_index(team_list: list, age_list: list, teams: list = None) -> dict:
+    """
+    (チーム, 年齢層)ごとの社員番号のリストを作成する
+    全社員を一度だけ走査するため、各制約の式はこの索引から非ゼロ要素の数に比例する時間で作れる
+
+    team_list: 各社員の所属チーム
+    age_list: 各社員の年齢層(0: 若手, 1: ベテラン）
+    teams: 対象とするチームの番号。Noneのときはteam_listに含まれるチーム
+           (社員のいないチームも被り数0として扱いたいときに指定する)
+    """
+    if teams is None:
+        teams = set(team_list)
+    members = {(t, a): [] for t in teams for a in (0, 1)}
+    for n, key in enumerate(zip(team_list, age_list)):
+        members[key].append(n)
+    return members
+
 
 class SocialGathering:
-    def __init__(self, N: int, G: int, team_list: list, age_list: list) -> None:
+    def __init__(
+        self,
+        N: int,
+        G: int,
+        team_list: list,
+        age_list: list,
+        members: dict = None,
+        teams: list = None,
+        group_n_list: list = None,
+        young_n_list: list = None,
+        rules=None,
+    ) -> None:
         """
         N: 人数
         G: グループ数
         team_list: 各社員の所属チーム
         age_list: 各社員の年齢層(0: 若手, 1: ベテラン）
+        members: (チーム, 年齢層)ごとの社員番号のリスト(build_member_indexの結果)
+                 Noneのときはteam_list, age_listから作成する
+        teams: 対象とするチームの番号(build_member_indexを参照)
+        group_n_list: 各グループの人数。Noneのときはできるだけ均等に分ける
+        young_n_list: 各グループの若手の人数。Noneのときはできるだけ均等に分ける
+        rules: 社員の組に対する指定(rules.GroupingRules)。同じグループにする社員は
+               割り当ての変数を共有し、別々のグループにする社員はset_rulesで制約とする
         """
 
         self.N = N
@@ -16,284 +133,956 @@ class SocialGathering:
         self.G = G
         self.age_list = age_list
 
-        # T: チーム数
-        self.T = len(self.team_list)
+        # members: (チーム, 年齢層)ごとの社員番号のリスト
+        if members is None:
+            members = build_member_index(self.team_list, self.age_list, teams)
+        self.members = members
 
-        # group_n_list: 各グループの人数
-        n_by_grp = self.N // self.G  # 1グループの人数(割り切れないときは一部グループが+1人)
-        pls_1_grp = self.N % self.G  # +1人のグループの数
-        self.group_n_list = [n_by_grp + 1] * pls_1_grp + [n_by_grp] * (
-            self.G - pls_1_grp
-        )
+        # rep: 各社員の割り当ての変数を持つ社員(同じグループにする社員の代表)の番号
+        self.rules = rules
+        self.rep = rules.representatives(N) if rules else list(range(N))
+
+        # teams: 存在するチームの番号, T: チーム数
+        self.teams = sorted({t for t, _ in self.members})
+        self.T = len(self.teams)
+
+        # group_n_list: 各グループの人数(割り切れないときは一部グループが+1人)
+        if group_n_list is None:
+            group_n_list = balanced_sizes(self.N, self.G)
+        self.group_n_list = list(group_n_list)
 
         # young_n_list: グループごとの若手の人数
-        yng_n_by_grp = len([a for a in self.age_list if a == 0]) // self.G
-        yng_plus_1_grp = len([a for a in age_list if a == 0]) % G
-        self.young_n_list = np.array(
-            [yng_n_by_grp + 1] * yng_plus_1_grp + [yng_n_by_grp] * (G - yng_plus_1_grp)
-        )
+        if young_n_list is None:
+            num_young = sum(len(self.members[(t, 0)]) for t in self.teams)
+            young_n_list = balanced_sizes(num_young, self.G)
+        self.young_n_list = np.array(young_n_list)
 
-        # x： nがグループgに入るとき1, そうでないとき0を示す変数
-        # g: グループの番号, n: 人の番号
-        self.x = [
-            [
-                pulp.LpVariable("x_{}_{}".format(n, g), cat="Binary")
-                for g in range(self.G)
-            ]
-            for n in range(self.N)
-        ]
+        # 割り当てを示す変数
+        self.make_assign_variables()
+
+        # count_expr: (グループ, チーム, 年齢層)ごとの人数を示す式のキャッシュ
+        self.count_expr = {}
 
         # 各グループのチーム被り数の最大値と最小値を示す変数
-        self.max_overlap = pulp.LpVariable(f"max_overlap", lowBound=0, upBound=8)
-        self.min_overlap = pulp.LpVariable(f"min_overlap", lowBound=0, upBound=8)
+        self.max_overlap = pulp.LpVariable(f"max_overlap")
+        self.min_overlap = pulp.LpVariable(f"min_overlap")
 
         # 各グループの若手のチーム被り数の最大値と最小値を示す変数
-        self.max_young_overlap = pulp.LpVariable(
-            f"max_young_overlap", lowBound=0, upBound=8
-        )
-        self.min_young_overlap = pulp.LpVariable(
-            f"min_young_overlap", lowBound=0, upBound=8
-        )
+        self.max_young_overlap = pulp.LpVariable(f"max_young_overlap")
+        self.min_young_overlap = pulp.LpVariable(f"min_young_overlap")
 
         # 各若手と同じグループのベテランのチーム被り数の最大値と最小値を示す変数
         self.max_young_overlap_with_old = pulp.LpVariable(
-            f"max_young_overlap_with_old", lowBound=0, upBound=8
+            f"max_young_overlap_with_old"
         )
         self.min_young_overlap_with_old = pulp.LpVariable(
-            f"min_young_overlap_with_old ", lowBound=0, upBound=8
+            f"min_young_overlap_with_old "
         )
 
         # 各グループのベテランのチーム被り数の最大値と最小値を示す変数
-        self.max_old_overlap = pulp.LpVariable(
-            f"max_old_overlap", lowBound=0, upBound=8
-        )
-        self.min_old_overlap = pulp.LpVariable(
-            f"min_old_overlap", lowBound=0, upBound=8
-        )
+        self.max_old_overlap = pulp.LpVariable(f"max_old_overlap")
+        self.min_old_overlap = pulp.LpVariable(f"min_old_overlap")
+
+        # 上下限はチーム・年齢層ごとの人数から計算する(bounds.overlap_bounds)
+        self.set_bounds()
 
         # グループgに、チームtの若手が存在するとき1, そうでないとき0を示す変数
         # g: グループの番号, t: チームの番号
         self.y = [
-            [
-                pulp.LpVariable("y_{}_{}".format(g, t), cat="Binary")
-                for t in range(self.T)
-            ]
+            {
+                t: pulp.LpVariable("y_{}_{}".format(g, t), cat="Binary")
+                for t in self.teams
+            }
             for g in range(self.G)
         ]
 
         self.prob = pulp.LpProblem("social_gathering")
 
+    def make_assign_variables(self):
+        # x： nがグループgに入るとき1, そうでないとき0を示す変数
+        # g: グループの番号, n: 人の番号
+        # 同じグループにする社員は、代表の社員の変数(同じリスト)を使う
+        self.x = [None] * self.N
+        for n in range(self.N):
+            if self.rep[n] == n:
+                self.x[n] = [
+                    pulp.LpVariable("x_{}_{}".format(n, g), cat="Binary")
+                    for g in range(self.G)
+                ]
+        for n in range(self.N):
+            self.x[n] = self.x[self.rep[n]]
+
+    def count(self, g, t, a):
+        # グループgに入る、チームt・年齢層aの人数を示す式
+        # 同じ式を複数の制約で使うため、一度作った式はキャッシュする
+        key = (g, t, a)
+        if key not in self.count_expr:
+            self.count_expr[key] = pulp.lpSum(
+                self.x[n][g] for n in self.members[(t, a)]
+            )
+        return self.count_expr[key]
+
     def set_objective(self, ob):
-        self.prob += ob
+        # 既に目的関数が設定されているときは置き換える(段階ごとに目的関数を切り替えるため)
+        self.prob.setObjective(ob)
+
+    def fix_range(self, max_var, min_var, value):
+        # 最大値と最小値の差を前の段階の最適値以下とする制約を加える
+        # 最大値と最小値そのものは固定しない(同じ幅の範囲のうちどれを選ぶかで、後の段階の
+        # 最適値が悪くならないようにするため)
+        self.prob += max_var - min_var <= value
+
+    def team_counts(self, a):
+        # チームごとの年齢層aの人数
+        return [len(self.members[(t, a)]) for t in self.teams]
+
+    def set_bounds(self, min_young=0):
+        # チーム被り数の最大値・最小値を示す変数に、人数から計算した上下限を設定する
+        # 既に固定した変数は変更しない
+        # min_young: 若手のチーム被り数の最小値の下限(段階1が下界に一致したときに決まる値)
+        bounds = overlap_bounds(
+            self.team_counts(0),
+            self.team_counts(1),
+            self.G,
+            self.group_n_list,
+            self.young_n_list,
+            min_young=min_young,
+        )
+        for name, (low, up) in bounds.items():
+            var = getattr(self, name)
+            if var.lowBound is None or var.lowBound != var.upBound:
+                var.lowBound = low
+                var.upBound = up
+
+    def lower_bounds(self, min_young=0):
+        # 各段階の目的関数(チーム被り数の最大値と最小値の差)の下界
+        return stage_lower_bounds(
+            self.team_counts(0), self.team_counts(1), self.G, min_young=min_young
+        )
+
+    def window_feasible(self, windows):
+        """
+        範囲の組を満たす割り当てがありうるか(人数だけで確かめる必要条件)
+        windows: 段階1からの(最大値, 最小値)の組
+        """
+        young = self.team_counts(0)
+        if windows and not spread_feasible(
+            young, windows[0][1], windows[0][0], self.G, self.young_n_list
+        ):
+            return False
+        if len(windows) >= 2:
+            high, low = windows[1]
+            if windows[0][1] >= 1:
+                # 全ての(グループ, チーム)に若手がいるため、ベテランの全ての(グループ, チーム)が範囲に入る
+                old_n_list = [
+                    n - y for n, y in zip(self.group_n_list, self.young_n_list)
+                ]
+                return spread_feasible(
+                    self.team_counts(1), low, high, self.G, old_n_list
+                )
+            return present_feasible(self.team_counts(1), young, low, windows[0][0])
+        return True
+
+    def set_initial_assignment(self, assignment):
+        # 割り当て(各社員のグループ番号)を、ソルバーに渡す初期解として設定する
+        for n in range(self.N):
+            for g in range(self.G):
+                self.x[n][g].setInitialValue(1 if assignment[n] == g else 0)
+        self.set_indicator_values(assignment)
+
+    def set_indicator_values(self, assignment):
+        # 割り当てから、グループにチームの若手が存在するかを示す変数yの初期値を設定する
+        young = {(assignment[n], t) for t in self.teams for n in self.members[(t, 0)]}
+        for g in range(self.G):
+            for t in self.teams:
+                self.y[g][t].setInitialValue(1 if (g, t) in young else 0)
 
     def set_only_one_group(self):
-        # 各人は一つのグループにしか入れない
+        # 各人は一つのグループにしか入れない(変数を共有する社員は代表の社員だけ)
         for n in range(self.N):
-            self.prob += pulp.lpSum(self.x[n][g] for g in range(self.G)) == 1
+            if self.rep[n] == n:
+                self.prob += pulp.lpSum(self.x[n][g] for g in range(self.G)) == 1
+
+    def set_rules(self):
+        # 別々のグループにする社員は、各グループに高々1人(代表の社員の変数で表す)
+        # 制約の数はルールの数×グループ数で、社員の組の数によらない
+        if not self.rules:
+            return
+        for members in self.rules.separate:
+            reps = sorted({self.rep[n] for n in members})
+            for g in range(self.G):
+                self.prob += pulp.lpSum(self.x[n][g] for n in reps) <= 1
 
     def set_group_num(self):
         # グループ内の人数はgroup_n_listに従う
         for g in range(self.G):
             self.prob += (
-                pulp.lpSum(self.x[n][g] for n in range(self.N)) == self.group_n_list[g]
+                pulp.lpSum(self.count(g, t, a) for t in self.teams for a in (0, 1))
+                == self.group_n_list[g]
             )
 
     def set_young_num(self):
         # 各グループの若手の人数はyoung_n_listに従う
         for g in range(self.G):
             self.prob += (
-                pulp.lpSum(
-                    [self.x[n][g] for n in range(self.N) if self.age_list[n] == 0]
-                )
+                pulp.lpSum(self.count(g, t, 0) for t in self.teams)
                 == self.young_n_list[g]
             )
 
     def set_team_overlap(self):
         # 各グループのチーム被りをできるだけ小さくする
         for g in range(self.G):
-            for t in range(self.T):
-                self.prob += (
-                    pulp.lpSum(
-                        [self.x[n][g] for n in range(self.N) if self.team_list[n] == t]
-                    )
-                    <= self.max_overlap
-                )
-                self.prob += (
-                    pulp.lpSum(
-                        [self.x[n][g] for n in range(self.N) if self.team_list[n] == t]
-                    )
-                    >= self.min_overlap
-                )
+            for t in self.teams:
+                overlap = self.count(g, t, 0) + self.count(g, t, 1)
+                self.prob += overlap <= self.max_overlap
+                self.prob += overlap >= self.min_overlap
 
     def set_young_team_overlap(self):
         # 各グループの若手内のチーム被りをできるだけ小さくする
         for g in range(self.G):
-            for t in range(self.T):
-                self.prob += (
-                    pulp.lpSum(
-                        [
-                            self.x[n][g]
-                            for n in range(self.N)
-                            if self.team_list[n] == t and self.age_list[n] == 0
-                        ]
-                    )
-                    <= self.max_young_overlap
-                )
-                self.prob += (
-                    pulp.lpSum(
-                        [
-                            self.x[n][g]
-                            for n in range(self.N)
-                            if self.team_list[n] == t and self.age_list[n] == 0
-                        ]
-                    )
-                    >= self.min_young_overlap
-                )
+            for t in self.teams:
+                self.prob += self.count(g, t, 0) <= self.max_young_overlap
+                self.prob += self.count(g, t, 0) >= self.min_young_overlap
 
     def set_old_team_overlap(self):
         # 各グループのベテランのチーム被りをできるだけ小さくする
         for g in range(self.G):
-            for t in range(self.T):
-                self.prob += (
-                    pulp.lpSum(
-                        [
-                            self.x[n][g]
-                            for n in range(self.N)
-                            if self.team_list[n] == t and self.age_list[n] == 1
-                        ]
-                    )
-                    <= self.max_old_overlap
-                )
-                self.prob += (
-                    pulp.lpSum(
-                        [
-                            self.x[n][g]
-                            for n in range(self.N)
-                            if self.team_list[n] == t and self.age_list[n] == 1
-                        ]
-                    )
-                    >= self.min_old_overlap
-                )
+            for t in self.teams:
+                self.prob += self.count(g, t, 1) <= self.max_old_overlap
+                self.prob += self.count(g, t, 1) >= self.min_old_overlap
 
     def set_young_team_overlap_with_old(self):
         # 各若手と同じグループのベテランのチーム被り数をできるだけ少なくする
         for g in range(self.G):
-            for t in range(self.T):
+            for t in self.teams:
                 # y[g][t] = 1 ならば、gにtの若手が存在する
                 # 定式化は以下を参考にした
                 # https://www.msi.co.jp/solution/nuopt/docs/techniques/articles/indicator-variables.html
                 self.prob += self.y[g][t] - self.group_n_list[g] * (
                     1 - self.y[g][t]
-                ) <= pulp.lpSum(
-                    [
-                        self.x[n][g]
-                        for n in range(self.N)
-                        if self.team_list[n] == t and self.age_list[n] == 0
-                    ]
-                )
-                self.prob += (
-                    pulp.lpSum(
-                        [
-                            self.x[n][g]
-                            for n in range(self.N)
-                            if self.team_list[n] == t and self.age_list[n] == 0
-                        ]
-                    )
-                    <= self.group_n_list[g] * self.y[g][t]
-                )
+                ) <= self.count(g, t, 0)
+                self.prob += self.count(g, t, 0) <= self.group_n_list[g] * self.y[g][t]
 
                 # gにtの若手が存在するとき、tのベテランの数はmax_young_overlap_with_old以下になるようにする。
                 # なお、gにtの若手が存在しないときは、以下の式は必ず成り立つ。
                 self.prob += (
-                    self.group_n_list[g] * self.y[g][t]
-                    + pulp.lpSum(
-                        [
-                            self.x[n][g]
-                            for n in range(self.N)
-                            if self.team_list[n] == t and self.age_list[n] == 1
-                        ]
-                    )
+                    self.group_n_list[g] * self.y[g][t] + self.count(g, t, 1)
                     <= self.group_n_list[g] + self.max_young_overlap_with_old
                 )
 
                 # gにtの若手が存在するとき、tのベテランの数はmin_young_overlap_with_old以上になるようにする。
                 # なお、gにtの若手が存在しないときは、以下の式は必ず成り立つ。
-                self.prob += self.group_n_list[g] * self.y[g][
-                    t
-                ] + self.min_young_overlap_with_old <= self.group_n_list[
-                    g
-                ] + pulp.lpSum(
-                    [
-                        self.x[n][g]
-                        for n in range(self.N)
-                        if self.team_list[n] == t and self.age_list[n] == 1
-                    ]
+                self.prob += (
+                    self.group_n_list[g] * self.y[g][t] + self.min_young_overlap_with_old
+                    <= self.group_n_list[g] + self.count(g, t, 1)
+                )
+
+    def solve(self, options=None, warm_start=False):
+        # options: ソルバーの設定(SolverOptions)。Noneのとき既定の設定
+        # warm_start: Trueのとき、変数の現在の値を初期解としてソルバーに渡す
+        if options is None:
+            options = SolverOptions()
+        solver = options.make_solver(warm_start=warm_start)
+        start = time.perf_counter()
+        try:
+            self.prob.solve(solver)
+        except pulp.PulpSolverError:
+            # 計算時間の上限があるとき、CBCは解を書き出す前に時間切れになると異常終了する
+            # その場合は解が得られなかったものとして扱う(上限がないときはそのまま例外とする)
+            if options.time_limit is None:
+                raise
+            logger.warning("ソルバーが解を返さずに終了しました(時間切れ)")
+            self.prob.status = pulp.LpStatusNotSolved
+            self.prob.sol_status = pulp.LpSolutionNoSolutionFound
+        # solve_time: ソルバーの実行時間(秒)
+        self.solve_time = time.perf_counter() - start
+        logger.info("%s (%.2f秒)", pulp.LpStatus[self.prob.status], self.solve_time)
+
+    def model_stats(self):
+        # モデルの変数・制約・非ゼロ要素の数
+        return {
+            "variables": len(self.prob.variables()),
+            "constraints": len(self.prob.constraints),
+            "nonzeros": sum(len(c) for c in self.prob.constraints.values()),
+        }
+
+    def has_solution(self):
+        # 求解で整数解が得られたか(時間切れでも、それまでに見つかった解があればTrue)
+        return self.prob.sol_status in (
+            pulp.LpSolutionOptimal,
+            pulp.LpSolutionIntegerFeasible,
+        )
+
+    def is_optimal(self):
+        # 最適性が証明された解か(時間切れ・ギャップによる終了はFalse)
+        return self.prob.sol_status == pulp.LpSolutionOptimal
+
+    def group_of(self):
+        # 各社員のグループ番号の配列(割り当てられていない社員は-1)
+        # 値が1の変数を一度だけ走査して求める
+        # 2つ以上のグループに割り当てられた社員がいるときはNoneを返す
+        group = np.full(self.N, -1, dtype=np.int32)
+        for n, variables in enumerate(self.x):
+            for g, var in enumerate(variables):
+                if (var.varValue or 0) > 0.5:
+                    if group[n] >= 0:
+                        return None
+                    group[n] = g
+        return group
+
+    def assignment(self):
+        # 各社員のグループ番号のリストを返す
+        # 解が割り当てとして成り立っていない(人数が合わない等)ときはNoneを返す
+        group = self.group_of()
+        if group is None or (group < 0).any():
+            return None
+        group_n_list = np.bincount(group, minlength=self.G)
+        young_n_list = np.bincount(
+            group[np.asarray(self.age_list) == 0], minlength=self.G
+        )
+        if group_n_list.tolist() != list(self.group_n_list) or (
+            young_n_list.tolist() != list(self.young_n_list)
+        ):
+            return None
+        return group.tolist()
+
+
+class AggregatedSocialGathering(SocialGathering):
+    """
+    同じ(チーム, 年齢層)の社員は入れ替えても制約・目的関数が変わらないため、
+    社員ごとの0-1変数の代わりに、(グループ, チーム, 年齢層)ごとの人数を整数変数とする定式化
+    変数の数はN×GからG×T×2に減り、社員の入れ替えによる対称性もなくなる
+    """
+
+    def make_assign_variables(self):
+        # z: グループgに入る、チームt・年齢層aの人数を示す変数
+        # g: グループの番号, t: チームの番号, a: 年齢層
+        self.z = [
+            {
+                (t, a): pulp.LpVariable(
+                    "z_{}_{}_{}".format(g, t, a),
+                    lowBound=0,
+                    upBound=len(self.members[(t, a)]),
+                    cat="Integer",
+                )
+                for t in self.teams
+                for a in (0, 1)
+            }
+            for g in range(self.G)
+        ]
+
+    def count(self, g, t, a):
+        return self.z[g][(t, a)]
+
+    def set_only_one_group(self):
+        # 各(チーム, 年齢層)の社員は、いずれかのグループにちょうど一度ずつ割り当てられる
+        for t in self.teams:
+            for a in (0, 1):
+                self.prob += pulp.lpSum(
+                    self.z[g][(t, a)] for g in range(self.G)
+                ) == len(self.members[(t, a)])
+
+    def set_initial_assignment(self, assignment):
+        # 割り当て(各社員のグループ番号)を、グループ・チーム・年齢層ごとの人数に集計して初期値とする
+        counts = [{key: 0 for key in self.z[g]} for g in range(self.G)]
+        for key, members in self.members.items():
+            for n in members:
+                counts[assignment[n]][key] += 1
+        for g in range(self.G):
+            for key, var in self.z[g].items():
+                var.setInitialValue(counts[g][key])
+        self.set_indicator_values(assignment)
+
+    def group_of(self):
+        # 人数の解を、(チーム, 年齢層)ごとに社員番号の若い順に各グループへ割り当てる
+        group = np.full(self.N, -1, dtype=np.int32)
+        for (t, a), members in self.members.items():
+            i = 0
+            for g in range(self.G):
+                k = round(self.z[g][(t, a)].varValue or 0)
+                group[members[i : i + k]] = g
+                i += k
+        return group
+
+
+def solve_stage(sg, max_var, min_var, assignment, options):
+    # assignmentを初期解として、max_var - min_varを最小化する
+    # 返り値: (得られた割り当て(時間切れ等で解が得られなかったときはNone), 最適解か,
+    #          求解の記録(モデルの大きさ、ソルバーの実行時間・状態・目的関数値))
+    sg.set_initial_assignment(assignment)
+    sg.set_objective(max_var - min_var)
+    sg.solve(options, warm_start=True)
+    solution = sg.assignment() if sg.has_solution() else None
+    stats = sg.model_stats()
+    stats["solve_time"] = sg.solve_time
+    stats["solver_status"] = pulp.LpStatus[sg.prob.status]
+    stats["objective"] = pulp.value(sg.prob.objective)
+    return solution, solution is not None and sg.is_optimal(), stats
+
+
+def solve_young_stage(model, sg, assignment, options):
+    """
+    段階1(若手のチーム被り)を、若手だけの部分問題として解く
+    段階1の制約と目的関数は若手にしか関係しないため、ベテランの変数を含めずに解ける
+    ベテランはassignmentの割り当てのまま残す
+
+    model: 部分問題の定式化のクラス
+    sg: 全社員のモデル
+    assignment: 初期解(各社員のグループ番号のリスト)
+    options: ソルバーの設定(SolverOptions)
+    返り値: (若手の割り当てを更新したassignment(解が得られなかったときはNone), 最適解か,
+             求解の記録(solve_stageの記録に部分問題の作成時間"build_time"を加えたもの))
+    """
+    # 各グループの若手の人数がグループの人数を超えなければ、ベテランは残りの枠に入れられる
+    if any(y > n for y, n in zip(sg.young_n_list, sg.group_n_list)):
+        raise ValueError("若手の人数がグループの人数を超えています")
+
+    start = time.perf_counter()
+    young = [n for t in sg.teams for n in sg.members[(t, 0)]]
+    sub = model(
+        len(young),
+        sg.G,
+        [sg.team_list[n] for n in young],
+        [0] * len(young),
+        teams=sg.teams,
+    )
+    sub.set_only_one_group()
+    sub.set_group_num()
+    sub.set_young_team_overlap()
+    build_time = time.perf_counter() - start
+
+    solution, optimal, stats = solve_stage(
+        sub,
+        sub.max_young_overlap,
+        sub.min_young_overlap,
+        [assignment[n] for n in young],
+        options,
+    )
+    stats["build_time"] = build_time
+    if solution is None:
+        return None, False, stats
+    assignment = list(assignment)
+    for i, n in enumerate(young):
+        assignment[n] = solution[i]
+    return assignment, optimal, stats
+
+
+def lexicographic_weights(group_n_list):
+    # 各段階の目的関数(最大値と最小値の差)は1グループの人数以下であるため、
+    # 人数+1の累乗を重みとすると、重み付きの和の最小化が辞書式順序の最小化と一致する
+    K = max(group_n_list) + 1
+    return (K * K, K, 1)
+
+
+def solve_weighted(
+    model,
+    N,
+    G,
+    team_list,
+    age_list,
+    weights,
+    options,
+    progress,
+    rules=None,
+    members=None,
+):
+    """
+    3つの段階の目的関数の重み付きの和を、1回の求解で最小化する
+    weightsがNoneのときはlexicographic_weightsの重みとし、最適解は3段階で解いた解と同じ値になる
+    下界に一致する段階だけを省略することはできない(全段階が下界に一致するときだけ省略する)ため、
+    3段階で解くより速いとは限らない(重みの大きな目的関数は、問題によっては解きにくくなる)
+
+    model: 定式化のクラス
+    weights: (若手同士, 若手と同じグループのベテラン, ベテラン同士)の被り数の範囲の重み
+    options: ソルバーの設定(SolverOptions)
+    progress: solve_social_gatheringのprogress(段階ごとの最終的な状態を通知する)
+    rules: 社員の組に対する指定(rules.GroupingRules)
+    members: (チーム, 年齢層)ごとの社員番号のリスト(build_member_indexの結果)
+    返り値: グループ分けの結果(GroupingResult)。meta["lexicographic"]に、3段階で解いた解と
+            同じ値であることが示せたか(重みが既定で最適解が得られた、または全段階が下界に一致)を持つ
+    """
+    start = time.perf_counter()
+    sg = model(N, G, team_list, age_list, members=members, rules=rules)
+    sg.set_only_one_group()
+    sg.set_group_num()
+    sg.set_young_num()
+    sg.set_rules()
+    sg.set_young_team_overlap()
+    sg.set_young_team_overlap_with_old()
+    sg.set_old_team_overlap()
+    build_time = time.perf_counter() - start
+    logger.info("モデルの作成: %.2f秒", build_time)
+
+    # 段階1が下界に一致する解の若手の被り数の最小値は、チームごとの切り捨て(c/G)の最小値になる
+    # (3段階で解くときに段階1で固定される値)
+    min_young = min(c // G for c in sg.team_counts(0))
+    lower_bounds = sg.lower_bounds(min_young=min_young)
+    strict = weights is None
+    if strict:
+        weights = lexicographic_weights(sg.group_n_list)
+        if not rules:
+            # 段階1は暫定解(exact_assignment)が常に下界に一致するため、辞書式順序の最適解の
+            # 段階1の差は下界になる。差を下界以下に制限し、若手の被り数の上下限も強めておく
+            sg.fix_range(
+                sg.max_young_overlap, sg.min_young_overlap, lower_bounds["young"]
+            )
+            sg.set_bounds(min_young=min_young)
+    incumbent = exact_assignment(
+        G, team_list, age_list, sg.group_n_list, sg.young_n_list
+    )
+    if rules:
+        incumbent = rules.repair(incumbent, age_list)
+    # 暫定解の全段階の値が下界に一致するときは、重みによらず最適であるため求解を省略する
+    # (段階1を下界に制限していないときは、若手の被り数の最小値を使わない下界と比べる)
+    skip_bounds = lower_bounds if strict and not rules else sg.lower_bounds()
+    values = overlap_values(incumbent, G, team_list, age_list)
+    skip = all(
+        values[key][0] - values[key][1] <= skip_bounds[key] for key in skip_bounds
+    ) and (not rules or rules.violations(incumbent) == 0)
+    sg.solve_time = 0.0
+    if skip:
+        logger.info("暫定解が下界に一致したため求解を省略")
+        status = "skipped"
+    else:
+        sg.set_initial_assignment(incumbent)
+        sg.set_objective(
+            weights[0] * (sg.max_young_overlap - sg.min_young_overlap)
+            + weights[1]
+            * (sg.max_young_overlap_with_old - sg.min_young_overlap_with_old)
+            + weights[2] * (sg.max_old_overlap - sg.min_old_overlap)
+        )
+        sg.solve(options, warm_start=True)
+        solution = sg.assignment() if sg.has_solution() else None
+        if solution is not None:
+            incumbent = solution
+            status = "optimal" if sg.is_optimal() else "feasible"
+        else:
+            logger.warning("解が得られなかったため暫定解を使用")
+            status = "not_solved"
+    if rules and rules.violations(incumbent) > 0:
+        logger.warning("ルールを満たすグループ分けが得られませんでした")
+
+    values = overlap_values(incumbent, G, team_list, age_list)
+    at_bounds = True
+    for stage, key in enumerate(("young", "young_with_old", "old"), 1):
+        value = values[key][0] - values[key][1]
+        at_bounds = at_bounds and value <= lower_bounds[key]
+        progress(
+            {
+                "stage": stage,
+                "status": status,
+                "value": value,
+                "lower_bound": lower_bounds[key],
+                "gap": (
+                    (value - lower_bounds[key]) / value
+                    if status not in ("optimal", "skipped") and value > 0
+                    else 0.0
+                ),
+            }
+        )
+
+    lexicographic = (strict and status == "optimal") or at_bounds
+    return GroupingResult(
+        G,
+        incumbent,
+        team_list,
+        age_list,
+        {
+            "build_time": build_time,
+            "solve_time": sg.solve_time,
+            **sg.model_stats(),
+            "weights": list(weights),
+            "lexicographic": lexicographic,
+        },
+    )
+
+
+def solve_social_gathering(
+    N,
+    G,
+    team_list,
+    age_list,
+    aggregate=False,
+    engine="milp",
+    options=None,
+    cache=None,
+    progress=None,
+    profile=None,
+    trace_memory=False,
+    objective="lexicographic",
+    weights=None,
+    rules=None,
+    members=None,
+):
+    """
+    aggregate: Trueのとき、(グループ, チーム, 年齢層)ごとの人数を変数とする定式化
+               (AggregatedSocialGathering)で解く
+    engine: "milp"のときPuLPで厳密に解く
+            "local_search"のとき入れ替えによる局所探索(焼きなまし法)で近似的に解く(大規模向け)
+            "partition"のとき社員をブロックに分けて並列に解き、入れ替えでつなぎ合わせる
+            (partition.solve_partitioned、大規模向け)
+            "balance"のとき汎用の属性のモデル(balance.BalancedGathering)にチーム・年齢層の
+            設定(balance.TEAM_AGE)を与えて解く。段階ごとに範囲の幅だけを固定する
+    options: ソルバーの設定(SolverOptions)。Noneのとき既定の設定
+    cache: 解のキャッシュ(cache.SolutionCache)。engine="milp"のとき、チーム名や社員番号を
+           入れ替えただけの同じ問題は保存した解を使う。全段階で最適解が得られたときだけ保存する
+    progress: 進捗を受け取る関数。段階ごとに次の辞書を引数として呼ばれる
+              {"stage": 段階(1〜3), "status": 状態, "value": 暫定解のその段階の目的関数値}
+              状態は"started"(求解開始), "optimal"(最適解), "feasible"(時間切れ等で得られた解),
+              "not_solved"(解なし、暫定解を継続), "skipped"(暫定解が下界に一致), "cached",
+              "searching"(局所探索の途中経過)のいずれか
+              engine="milp"のとき、段階の最終的な状態の辞書には次の計測値も入る
+                "build_time": 段階の制約の追加(段階1は若手の部分問題の作成)の時間(秒)
+                "lower_bound": 目的関数の下界(bounds.stage_lower_bounds)
+                "gap": 最適性が示されていないときの(値 - 下界) / 値(最適なときは0)
+                "windows": 試す範囲の組の数, "solved_windows": そのうち解いた数
+              求解した段階ではさらに次の値も入る
+                "variables", "constraints", "nonzeros": 解いたモデルの大きさ
+                "solve_time": ソルバーの実行時間(秒), "solver_status": ソルバーの状態
+                "objective": ソルバーが返した目的関数値
+    profile: cProfileの結果の保存先(pstats形式)。Noneのときは計測しない
+    trace_memory: Trueのとき、Pythonのメモリ使用量の最大値をmeta["peak_memory"]に記録する
+    objective: engine="milp"のときの解き方
+               "lexicographic"のとき段階ごとに3回解く
+               "weighted"のとき3つの段階の重み付きの和を1回で解く(solve_weighted)
+    weights: objective="weighted"のときの各段階の重み。Noneのとき辞書式順序を保つ重み
+    rules: 同じグループ・別々のグループにする社員の指定(rules.GroupingRules)
+           engine="milp"かつaggregate=Falseのときだけ指定でき、cacheは使わない
+    members: (チーム, 年齢層)ごとの社員番号のリスト(build_member_indexの結果)。engine="milp"のとき
+             モデルの作成に使う。同じ社員でグループ数を変えて何度も解くときに作り直さないため
+             Noneのときはteam_list, age_listから作成する
+    返り値: グループ分けの結果(GroupingResult)。(result_member, result_age, result_team)
+            として展開でき、meta["stages"]に各段階の最終的な進捗の辞書を持つ
+            engine="milp"のときは、meta["build_time"]に全社員のモデルの作成時間を持つ
+    """
+    if profile is not None or trace_memory:
+        with capture(profile, trace_memory) as stats:
+            result = solve_social_gathering(
+                N,
+                G,
+                team_list,
+                age_list,
+                aggregate=aggregate,
+                engine=engine,
+                options=options,
+                cache=cache,
+                progress=progress,
+                objective=objective,
+                weights=weights,
+                rules=rules,
+                members=members,
+            )
+        result.meta.update(stats)
+        return result
+
+    if options is None:
+        options = SolverOptions()
+    # 段階ごとの最終的な状態を結果に記録する
+    stage_records = []
+    report = progress
+
+    def progress(record):
+        if record["status"] not in ("started", "searching"):
+            stage_records.append(record)
+            logger.info("段階%d: %s", record["stage"], record)
+        if report is not None:
+            report(record)
+
+    if rules:
+        if engine != "milp" or aggregate:
+            raise ValueError(
+                'rulesはengine="milp"かつaggregate=Falseのときだけ指定できます'
+            )
+        rules.validate(N, G)
+        # キャッシュは(チーム, 年齢層)ごとの人数だけで問題を区別するため、ルールがあるときは使わない
+        cache = None
+
+    if engine == "local_search":
+        time_limit = 10.0 if options.time_limit is None else options.time_limit
+        result = solve_local_search(
+            N, G, team_list, age_list, time_limit=time_limit, progress=progress
+        )
+        result.meta["stages"] = stage_records
+        return result
+    if engine == "partition":
+        # 各ブロックはtime_limitを段階ごとの上限として解き、入れ替えも同じ時間(Noneのとき10秒)とする
+        repair_time = 10.0 if options.time_limit is None else options.time_limit
+        result = solve_partitioned(
+            N,
+            G,
+            team_list,
+            age_list,
+            aggregate=True,
+            options=options,
+            repair_time=repair_time,
+            progress=progress,
+        )
+        result.meta["stages"] = stage_records
+        return result
+    if engine == "balance":
+        # 汎用の属性のモデル(balance.BalancedGathering)に、チーム・年齢層の設定を与えて解く
+        initial = exact_assignment(
+            G,
+            team_list,
+            age_list,
+            balanced_sizes(N, G),
+            balanced_sizes(N - sum(age_list), G),
+        )
+        start = time.perf_counter()
+        assignment, _, _ = solve_balanced(
+            G,
+            {"team": team_list, "age": age_list},
+            TEAM_AGE,
+            options=options,
+            initial=initial,
+            progress=progress,
+        )
+        return GroupingResult(
+            G,
+            assignment,
+            team_list,
+            age_list,
+            {"stages": stage_records, "solve_time": time.perf_counter() - start},
+        )
+    if engine != "milp":
+        raise ValueError(f"未対応のengineです: {engine}")
+
+    if cache is not None:
+        assignment = cache.get(G, team_list, age_list)
+        if assignment is not None:
+            logger.info("キャッシュした解を使用")
+            values = overlap_values(assignment, G, team_list, age_list)
+            for stage, key in enumerate(("young", "young_with_old", "old"), 1):
+                progress(
+                    {
+                        "stage": stage,
+                        "status": "cached",
+                        "value": values[key][0] - values[key][1],
+                    }
                 )
+            return GroupingResult(
+                G, assignment, team_list, age_list, {"stages": stage_records}
+            )
 
-    def solve(self):
-        self.prob.solve()
-        print(pulp.LpStatus[self.prob.status])
-
-
-def solve_social_gathering(N, G, team_list, age_list):
-    sg1 = SocialGathering(N, G, team_list, age_list)
-    sg1.set_objective(sg1.max_young_overlap - sg1.min_young_overlap)
-    sg1.set_only_one_group()
-    sg1.set_group_num()
-    sg1.set_young_num()
-    sg1.set_young_team_overlap()
-    sg1.solve()
-
-    sg2 = SocialGathering(N, G, team_list, age_list)
-    sg2.max_young_overlap = sg1.max_young_overlap.value()
-    sg2.min_young_overlap = sg1.min_young_overlap.value()
-    sg2.set_objective(sg2.max_young_overlap_with_old - sg2.min_young_overlap_with_old)
-    sg2.set_only_one_group()
-    sg2.set_group_num()
-    sg2.set_young_num()
-    sg2.set_young_team_overlap()
-    sg2.set_young_team_overlap_with_old()
-    sg2.solve()
-
-    sg3 = SocialGathering(N, G, team_list, age_list)
-    sg3.max_young_overlap = sg2.max_young_overlap
-    sg3.min_young_overlap = sg2.min_young_overlap
-    sg3.max_young_overlap_with_old = sg2.max_young_overlap_with_old.value()
-    sg3.min_young_overlap_with_old = sg2.min_young_overlap_with_old.value()
-    sg3.set_objective(sg3.max_old_overlap - sg3.min_old_overlap)
-    sg3.set_only_one_group()
-    sg3.set_group_num()
-    sg3.set_young_num()
-    sg3.set_young_team_overlap()
-    sg3.set_young_team_overlap_with_old()
-    sg3.set_old_team_overlap()
-    sg3.solve()
-    print(sg3.max_young_overlap)
-    print(sg3.min_young_overlap)
-    print(sg3.max_young_overlap_with_old)
-    print(sg3.min_young_overlap_with_old)
-    print(sg3.max_old_overlap.value())
-    print(sg3.min_old_overlap.value())
-
-    sg = sg3
-    print(pulp.LpStatus[sg.prob.status])
-    result_member = [[] for _ in range(G)]
-    result_age = [[] for _ in range(G)]
-    result_team = [[] for _ in range(G)]
-    for g in range(G):
-        for n in range(N):
-            if pulp.value(sg.x[n][g]) == 1:
-                result_member[g].append(n)
-                result_age[g].append(age_list[n])
-                result_team[g].append(team_list[n])
-
-    for g in range(G):
-        d = {}
-        for i in range(len(result_team[g])):
-            d[(result_team[g][i], result_age[g][i])] = (
-                d.get((result_team[g][i], result_age[g][i]), 0) + 1
+    model = AggregatedSocialGathering if aggregate else SocialGathering
+
+    if objective == "weighted":
+        result = solve_weighted(
+            model,
+            N,
+            G,
+            team_list,
+            age_list,
+            weights,
+            options,
+            progress,
+            rules=rules,
+            members=members,
+        )
+        result.meta["stages"] = stage_records
+        if cache is not None and result.meta["lexicographic"]:
+            cache.put(G, team_list, age_list, result.assignment.tolist())
+        return result
+    if objective != "lexicographic":
+        raise ValueError(f"未対応のobjectiveです: {objective}")
+
+    # モデルは一度だけ作成し、段階ごとに制約を追加、目的関数を切り替えて解き直す
+    # 段階1は若手だけの部分問題として解き、全社員のモデルは段階2から使う
+    # (ルールがあるときは若手とベテランが結びつくため、段階1も全社員のモデルで解く)
+    start = time.perf_counter()
+    sg = model(N, G, team_list, age_list, members=members, rules=rules)
+    sg.set_only_one_group()
+    sg.set_group_num()
+    sg.set_young_num()
+    sg.set_rules()
+    build_time = time.perf_counter() - start
+    logger.info("モデルの作成: %.2f秒", build_time)
+
+    # 組合せ的に求めた割り当て(allocation.exact_assignment)を暫定解とし、各段階はこれを初期解として解く
+    # 暫定解の目的関数値が下界(bounds.stage_lower_bounds)に一致するときは最適であるため、
+    # その段階の求解を省略する。段階1は常に下界に一致する。段階2と段階3は若手の配置を固定した中で
+    # 求めた値であり、下界に一致しないときはMILPで解く
+    incumbent = exact_assignment(
+        G, team_list, age_list, sg.group_n_list, sg.young_n_list
+    )
+    # ルールがあるときは入れ替えでルールを満たすように直す
+    # 直せなかったときは暫定解が実行可能でないため、どの段階も求解を省略しない
+    feasible = True
+    if rules:
+        incumbent = rules.repair(incumbent, age_list)
+        feasible = rules.violations(incumbent) == 0
+    values = overlap_values(incumbent, G, team_list, age_list)
+    # optimal: 全段階で最適解が得られたか(求解を省略した段階は最適)
+    optimal = True
+
+    # 段階1: 若手のチーム被りの最大値と最小値の差を最小化
+    # 段階2: 段階1の差を最適値以下に保ち、若手と同じグループのベテランのチーム被りの差を最小化
+    # 段階3: 段階2までの差を最適値以下に保ち、ベテランのチーム被りの差を最小化
+    stages = [
+        (
+            "young",
+            sg.set_young_team_overlap,
+            sg.max_young_overlap,
+            sg.min_young_overlap,
+        ),
+        (
+            "young_with_old",
+            sg.set_young_team_overlap_with_old,
+            sg.max_young_overlap_with_old,
+            sg.min_young_overlap_with_old,
+        ),
+        ("old", sg.set_old_team_overlap, sg.max_old_overlap, sg.min_old_overlap),
+    ]
+    # 前の段階は差の制約(fix_range)だけを加え、最大値と最小値は固定しない
+    # ただし差だけの制約ではMILPが解きにくいため、前の段階の最適値と同じ幅の範囲(最大値, 最小値)を
+    # 列挙し、範囲ごとに最大値と最小値の変数を固定して解く(lexicographic.solve_windows)
+    # 人数だけで実行不可能と分かる範囲(SocialGathering.window_feasible)は解かない
+    # choices: 前の段階の範囲の組と、その範囲に収まる暫定解(ないときはNone)のリスト
+    choices = [((), incumbent)]
+    min_young_fixed = 0
+    for stage, (key, set_constraints, max_var, min_var) in enumerate(stages, 1):
+        start = time.perf_counter()
+        set_constraints()
+        # 段階1の最適値が下界に一致するときは、幅が下界以下の解の若手の被り数の最小値は
+        # 切り捨て(c/G)の最小値に決まるため、以降の段階の上下限を強められる
+        min_young = min_young_fixed if stage > 1 else 0
+        sg.set_bounds(min_young=min_young)
+        lower_bound = sg.lower_bounds(min_young=min_young)[key]
+        # stats: この段階の計測値(進捗の最終的な状態の辞書に加える)
+        stats = {"build_time": time.perf_counter() - start, "windows": len(choices)}
+        progress(
+            {
+                "stage": stage,
+                "status": "started",
+                "value": values[key][0] - values[key][1],
+            }
+        )
+
+        def solve(windows, assignment, time_limit):
+            # 範囲の組を1つ解く(lexicographic.solve_windowsのsolve)
+            current = (
+                overlap_values(assignment, G, team_list, age_list)
+                if assignment is not None
+                else None
             )
-        d = {k: v for k, v in d.items() if v > 1}
-        print(f"グループ{g} 各(チーム,年層)ごとの人数:{d}")
+            if (
+                current is not None
+                and stage == 3
+                and not rules
+                and current[key][0] - current[key][1] > lower_bound
+            ):
+                # 若手と段階2の範囲を保ったまま、ベテランを組合せ的に割り当て直し、段階3を下界に近づける
+                assignment = rebalance_old(G, team_list, age_list, assignment)
+                current = overlap_values(assignment, G, team_list, age_list)
+            if (
+                current is not None
+                and feasible
+                and current[key][0] - current[key][1] <= lower_bound
+            ):
+                # 暫定解の目的関数値が下界に一致するときは最適であるため、求解を省略する
+                return current[key][0] - current[key][1], assignment, "skipped"
+
+            saved = fix_windows(
+                [
+                    (stages[j][2], stages[j][3], window)
+                    for j, window in enumerate(windows)
+                ]
+            )
+            # 段階全体の上限のうち、残りの時間だけを与える
+            window_options = dataclasses.replace(options, time_limit=time_limit)
+            if stage == 1 and not rules:
+                solution, stage_optimal, solve_stats = solve_young_stage(
+                    model, sg, assignment, window_options
+                )
+                stats["build_time"] += solve_stats.pop("build_time")
+            else:
+                solution, stage_optimal, solve_stats = solve_stage(
+                    sg,
+                    max_var,
+                    min_var,
+                    assignment if assignment is not None else incumbent,
+                    window_options,
+                )
+            infeasible = sg.prob.status == pulp.LpStatusInfeasible
+            restore_bounds(saved)
+            for name in ("solve_time", "variables", "constraints", "nonzeros"):
+                stats[name] = stats.get(name, 0) + solve_stats[name]
+            stats["solver_status"] = solve_stats["solver_status"]
+            if solution is not None:
+                current = overlap_values(solution, G, team_list, age_list)
+                status = "optimal" if stage_optimal else "feasible"
+                return current[key][0] - current[key][1], solution, status
+            if infeasible:
+                # この範囲の組には前の段階の値を満たす解がない
+                return None, None, "infeasible"
+            if current is not None:
+                # 時間切れ等で解が得られなかったときは、暫定解(初期解)をそのまま使う
+                return current[key][0] - current[key][1], assignment, "not_solved"
+            return None, None, "not_solved"
+
+        value, entries, status, stats["solved_windows"] = solve_windows(
+            choices, solve, lower_bound, options.time_limit
+        )
+        if value is None:
+            # どの範囲の組でも解が得られなかったときは、暫定解をそのまま使う
+            current = overlap_values(incumbent, G, team_list, age_list)
+            value = current[key][0] - current[key][1]
+        else:
+            incumbent = entries[0][1]
+        if status == "skipped":
+            logger.info("段階%d: 暫定解が下界に一致したため求解を省略", stage)
+        elif status == "not_solved":
+            logger.warning("段階%d: 解が得られなかったため暫定解を使用", stage)
+            if not feasible:
+                logger.warning("段階%d: ルールを満たす解が得られませんでした", stage)
+        else:
+            feasible = True
+        optimal = optimal and status in ("skipped", "optimal")
+        values = overlap_values(incumbent, G, team_list, age_list)
+
+        progress(
+            {
+                "stage": stage,
+                "status": status,
+                "value": value,
+                "lower_bound": lower_bound,
+                "gap": (
+                    (value - lower_bound) / value
+                    if status not in ("optimal", "skipped") and value > 0
+                    else 0.0
+                ),
+                **stats,
+            }
+        )
+        sg.fix_range(max_var, min_var, value)
+        if stage == 1:
+            min_young_fixed = values["young"][1] if value <= lower_bound else 0
+        logger.info("段階%d: %s (最大値, 最小値) = %s", stage, key, values[key])
+
+        # 次の段階の範囲の組: 最良の値になった範囲の組と、より良い解がないことを示せなかった
+        # 範囲の組に、この段階の幅valueの範囲を加える
+        if stage < len(stages):
+            choices = expand_choices(
+                entries,
+                *window_bounds(max_var, min_var, value),
+                value,
+                lambda a: overlap_values(a, G, team_list, age_list)[key],
+                sg.window_feasible,
+            )
+
+    if cache is not None and optimal:
+        cache.put(G, team_list, age_list, incumbent)
+
+    result = GroupingResult(
+        G,
+        incumbent,
+        team_list,
+        age_list,
+        {"stages": stage_records, "build_time": build_time},
+    )
+    if logger.isEnabledFor(logging.DEBUG):
+        teams, counts = evaluator.count_tensor(incumbent, team_list, age_list, G)
+        for g, d in enumerate(evaluator.duplicated_members(counts, teams)):
+            logger.debug("グループ%d 各(チーム,年層)ごとの人数:%s", g, d)
 
-    return result_member, result_age, result_team
+    return result
@@ -0,0 +1,166 @@
+import argparse
+import dataclasses
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from bounds import stage_lower_bounds
+from loader import load_employees
+from social_gathering import SolverOptions, build_member_index, solve_social_gathering
+
+# ワーカープロセスごとに一度だけ受け取る入力(グループの人数ごとに送り直さない)
+_shared = {}
+
+
+def init_worker(team_list: list, age_list: list) -> None:
+    _shared["team_list"] = team_list
+    _shared["age_list"] = age_list
+    # グループの人数によらない前処理(社員の索引、チームごとの若手・ベテランの人数)も一度だけ行う
+    members = build_member_index(team_list, age_list)
+    _shared["members"] = members
+    teams = sorted({t for t, _ in members})
+    _shared["counts"] = [[len(members[(t, a)]) for t in teams] for a in (0, 1)]
+
+
+def solve_size(group_size: int, engine: str, aggregate: bool, options) -> dict:
+    # 1グループの人数group_sizeで解き、被り数の範囲と計算時間を返す(ワーカープロセスで実行される)
+    team_list = _shared["team_list"]
+    age_list = _shared["age_list"]
+    N = len(team_list)
+    G = N // group_size
+    start = time.perf_counter()
+    result = solve_social_gathering(
+        N,
+        G,
+        team_list,
+        age_list,
+        aggregate=aggregate,
+        engine=engine,
+        options=options,
+        members=_shared["members"],
+    )
+    young, young_with_old, old = result.ranges()
+    stages = result.meta.get("stages", [])
+    # 下界はソルバーが段階ごとに使った値(段階1の結果で強めた値)を使う
+    # 記録がない(局所探索等、キャッシュを使った)ときはチームごとの人数から計算する
+    lower_bounds = {r["stage"]: r["lower_bound"] for r in stages if "lower_bound" in r}
+    if len(lower_bounds) < 3:
+        bounds = stage_lower_bounds(*_shared["counts"], G)
+        lower_bounds = {
+            stage: bounds[key]
+            for stage, key in enumerate(("young", "young_with_old", "old"), 1)
+        }
+    return {
+        "group_size": group_size,
+        "num_groups": G,
+        "young": young,
+        "young_with_old": young_with_old,
+        "old": old,
+        "lower_bound": tuple(lower_bounds[stage] for stage in (1, 2, 3)),
+        # 段階の記録がないときは最適性を示せていない
+        "optimal": bool(stages)
+        and all(
+            record["status"] in ("optimal", "skipped", "cached") for record in stages
+        ),
+        "time": time.perf_counter() - start,
+    }
+
+
+def sweep_group_sizes(
+    team_list,
+    age_list,
+    sizes,
+    engine="milp",
+    aggregate=True,
+    options=None,
+    workers=None,
+):
+    """
+    1グループの人数を変えて並列に解き、解けた順に結果を返す(ジェネレーター)
+    入力はワーカープロセスの起動時に一度だけ渡す
+
+    team_list: 各社員の所属チーム
+    age_list: 各社員の年齢層(0: 若手, 1: ベテラン）
+    sizes: 1グループの人数のリスト(グループが1つもできない人数は除く)
+    engine, aggregate, options: solve_social_gatheringの引数
+                                人数ごとに1プロセスで解くため、ソルバーは1スレッドとする
+    workers: 並列に解くプロセス数(Noneのとき CPU数)
+    返り値(yield): 人数ごとの辞書
+        {"group_size", "num_groups", "young", "young_with_old", "old": 各段階の被り数の範囲,
+         "lower_bound": 各段階の下界(young, young_with_old, oldの順), "optimal": 全段階で最適か,
+         "time": 計算時間(秒)}
+    """
+    if options is None:
+        options = SolverOptions()
+    options = dataclasses.replace(options, threads=1, msg=False)
+    N = len(team_list)
+    sizes = sorted({k for k in sizes if 0 < k <= N})
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(team_list, age_list)
+    ) as executor:
+        futures = [
+            executor.submit(solve_size, k, engine, aggregate, options) for k in sizes
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="1グループの人数を変えて解き、被り数と計算時間を比較する"
+    )
+    parser.add_argument("input", help="入力CSV(社員番号,所属チーム,年齢層)")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=list(range(5, 11)),
+        help="1グループの人数",
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="並列に解くプロセス数(省略時はCPU数)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["milp", "local_search", "partition", "balance"],
+        default="milp",
+        help="求解方法",
+    )
+    parser.add_argument(
+        "--time-limit", type=float, default=None, help="各段階の計算時間の上限(秒)"
+    )
+    parser.add_argument("-o", "--output", default=None, help="結果のCSVファイル")
+    args = parser.parse_args(argv)
+
+    _, table = load_employees(args.input)
+    records = []
+    for record in sweep_group_sizes(
+        table.team_list,
+        table.age_list,
+        args.sizes,
+        engine=args.engine,
+        options=SolverOptions(time_limit=args.time_limit),
+        workers=args.workers,
+    ):
+        records.append(record)
+        print(
+            f"{record['group_size']}人: 被り数の範囲 = "
+            f"{(record['young'], record['young_with_old'], record['old'])} "
+            f"({record['time']:.1f}秒)"
+        )
+
+    frontier = pd.DataFrame(records).sort_values("group_size")
+    print(frontier.to_string(index=False))
+    if args.output is not None:
+        frontier.to_csv(args.output, index=False, encoding="utf_8_sig")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,74 @@
+import itertools
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from allocation import exact_assignment, old_counts, round_robin  # noqa: E402
+from bounds import stage_lower_bounds  # noqa: E402
+
+
+def brute_force_old(young, old_totals, old_capacities):
+    # ベテランの人数の分け方を全て列挙し、(段階2の幅, 段階3の幅)の辞書式最小値を求める
+    G, T = young.shape
+    present = young > 0
+    best = None
+    for cells in itertools.product(range(max(old_totals) + 1), repeat=G * T):
+        counts = np.array(cells).reshape(G, T)
+        if (counts.sum(axis=0) != old_totals).any():
+            continue
+        if (counts.sum(axis=1) != old_capacities).any():
+            continue
+        width2 = int(np.ptp(counts[present])) if present.any() else 0
+        width3 = int(np.ptp(counts))
+        if best is None or (width2, width3) < best:
+            best = (width2, width3)
+    return best
+
+
+# (グループ数, チームごとの若手の人数, チームごとのベテランの人数)
+CASES = [
+    (2, [1, 1, 2], [2, 1, 3]),
+    (2, [3, 0, 1], [1, 2, 2]),
+    (3, [1, 2], [3, 2]),
+    (3, [2, 1, 0], [1, 1, 2]),
+    (2, [0, 0, 1], [3, 1, 2]),
+]
+
+
+@pytest.mark.parametrize("G, young_totals, old_totals", CASES)
+def test_old_counts_matches_brute_force(G, young_totals, old_totals):
+    N = sum(young_totals) + sum(old_totals)
+    group_n_list = [N // G + (g < N % G) for g in range(G)]
+    Y = sum(young_totals)
+    young_n_list = [Y // G + (g < Y % G) for g in range(G)]
+    old_capacities = np.array(group_n_list) - np.array(young_n_list)
+
+    young = round_robin(young_totals, young_n_list)
+    lower = stage_lower_bounds(young_totals, old_totals, G)
+    assert int(np.ptp(young)) == lower["young"]
+
+    counts, _ = old_counts(young, old_totals, old_capacities)
+    assert (counts.sum(axis=0) == old_totals).all()
+    assert (counts.sum(axis=1) == old_capacities).all()
+    present = young > 0
+    width2 = int(np.ptp(counts[present])) if present.any() else 0
+    width3 = int(np.ptp(counts))
+    assert (width2, width3) == brute_force_old(
+        young, np.array(old_totals), old_capacities
+    )
+
+
+def test_exact_assignment_group_sizes():
+    team_list = [3, 7, 7, 3, 9, 9, 3, 7, 9, 3]
+    age_list = [0, 1, 0, 1, 0, 1, 1, 1, 0, 0]
+    group_n_list = [4, 3, 3]
+    young_n_list = [2, 1, 2]
+    assignment = exact_assignment(3, team_list, age_list, group_n_list, young_n_list)
+    group = np.array(assignment)
+    age = np.array(age_list)
+    assert np.bincount(group, minlength=3).tolist() == group_n_list
+    assert np.bincount(group[age == 0], minlength=3).tolist() == young_n_list
@@ -0,0 +1,97 @@
+import itertools
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from balance import (  # noqa: E402
+    TEAM_AGE,
+    BalanceConfig,
+    BalancedGathering,
+    BalanceSpec,
+    combine,
+    solve_balanced,
+)
+from bounds import stage_lower_bounds  # noqa: E402
+from loader import load_employees  # noqa: E402
+from social_gathering import (  # noqa: E402
+    SocialGathering,
+    SolverOptions,
+    solve_social_gathering,
+)
+from test_social_gathering import BASELINE, INPUT  # noqa: E402
+
+
+def test_combine_rejects_negative_codes():
+    with pytest.raises(ValueError):
+        combine([np.array([0, -1, 1]), np.array([0, 0, 1])])
+
+
+def test_combine_numbers_value_pairs():
+    keys, K = combine([np.array([0, 1, 1, 0]), np.array([2, 0, 0, 2])])
+    assert K == 2
+    assert keys[0] == keys[3] and keys[1] == keys[2] and keys[0] != keys[1]
+
+
+def test_team_age_lower_bounds():
+    _, employees = load_employees(INPUT / "sample_input.csv")
+    G = employees.N // 7
+    model = BalancedGathering(
+        G, {"team": employees.team_list, "age": employees.age_list}, TEAM_AGE
+    )
+    young = np.bincount(employees.team_list, weights=1 - np.asarray(employees.age_list))
+    old = np.bincount(employees.team_list, weights=employees.age_list)
+    teams = np.unique(employees.team_list)
+    young = young[teams].astype(int).tolist()
+    old = old[teams].astype(int).tolist()
+    min_young = min(c // G for c in young)
+    expected = stage_lower_bounds(young, old, G, min_young=min_young)
+    bounds = [model.lower_bound(i, [True, True]) for i in range(3)]
+    assert bounds == [expected[key] for key in ("young", "young_with_old", "old")]
+
+
+def test_window_feasible_matches_social_gathering():
+    # チーム・年齢層の設定では、範囲の組を除く条件がSocialGatheringと同じになる
+    _, employees = load_employees(INPUT / "sample_input.csv")
+    G = employees.N // 10
+    model = BalancedGathering(
+        G, {"team": employees.team_list, "age": employees.age_list}, TEAM_AGE
+    )
+    sg = SocialGathering(employees.N, G, employees.team_list, employees.age_list)
+    windows = [(lo + w, lo) for lo in range(4) for w in range(3)]
+    checked = set()
+    for young, young_with_old in itertools.product(windows, windows):
+        for choice in ((young,), (young, young_with_old)):
+            feasible = sg.window_feasible(choice)
+            assert model.window_feasible(choice) == feasible
+            checked.add(feasible)
+    assert checked == {True, False}
+
+
+@pytest.mark.parametrize("name, size", sorted(BASELINE))
+def test_balance_engine_not_worse_than_baseline(name, size):
+    _, employees = load_employees(INPUT / f"{name}.csv")
+    result = solve_social_gathering(
+        employees.N,
+        employees.N // size,
+        employees.team_list,
+        employees.age_list,
+        options=SolverOptions(msg=False),
+        engine="balance",
+    )
+    assert result.ranges() <= BASELINE[(name, size)]
+
+
+def test_solve_without_initial():
+    team = [0, 0, 1, 1, 2, 2, 0, 1]
+    level = [0, 1, 0, 1, 0, 1, 1, 0]
+    assignment, values, records = solve_balanced(
+        2,
+        {"team": team, "level": level},
+        BalanceConfig([BalanceSpec("team", ("team",))], quotas=[{"level": 0}]),
+    )
+    assert values["team"][0] - values["team"][1] == records[0]["lower_bound"]
+    assert np.bincount(assignment, minlength=2).tolist() == [4, 4]
@@ -0,0 +1,107 @@
+import itertools
+import pathlib
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import evaluator  # noqa: E402
+from bounds import overlap_bounds, stage_lower_bounds  # noqa: E402
+from heuristic import balanced_sizes  # noqa: E402
+from loader import load_employees  # noqa: E402
+from test_social_gathering import BASELINE, INPUT  # noqa: E402
+
+KEYS = ("young", "young_with_old", "old")
+VARIABLES = {
+    "young": ("max_young_overlap", "min_young_overlap"),
+    "young_with_old": ("max_young_overlap_with_old", "min_young_overlap_with_old"),
+    "old": ("max_old_overlap", "min_old_overlap"),
+}
+
+
+def team_totals(team_list, age_list):
+    team = np.asarray(team_list)
+    age = np.asarray(age_list)
+    teams = np.unique(team)
+    young = [int(((team == t) & (age == 0)).sum()) for t in teams]
+    old = [int(((team == t) & (age == 1)).sum()) for t in teams]
+    return young, old
+
+
+def brute_force(G, team_list, age_list):
+    # グループの人数と若手の人数を均等にした全ての割り当てから、辞書式順序で最小の
+    # 各段階の(最大値, 最小値)を求める
+    N = len(team_list)
+    group_n_list = balanced_sizes(N, G)
+    young_n_list = balanced_sizes(age_list.count(0), G)
+    best = None
+    for assignment in itertools.product(range(G), repeat=N):
+        group = np.asarray(assignment)
+        if sorted(np.bincount(group, minlength=G)) != sorted(group_n_list):
+            continue
+        young = np.bincount(group[np.asarray(age_list) == 0], minlength=G)
+        if sorted(young) != sorted(young_n_list):
+            continue
+        _, counts = evaluator.count_tensor(group, team_list, age_list, G)
+        values = evaluator.overlap_values(counts)
+        key = tuple(values[k][0] - values[k][1] for k in KEYS)
+        if best is None or key < best[0]:
+            best = (key, values)
+    return best
+
+
+def random_problem(seed):
+    rng = random.Random(seed)
+    N, G = rng.choice([(8, 2), (9, 3)])
+    team_list = [rng.randrange(3) for _ in range(N)]
+    age_list = [int(rng.random() < 0.5) for _ in range(N)]
+    return G, team_list, age_list
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_bounds_do_not_exceed_brute_force_optimum(seed):
+    G, team_list, age_list = random_problem(seed)
+    N = len(team_list)
+    optimum, values = brute_force(G, team_list, age_list)
+    young, old = team_totals(team_list, age_list)
+    lower = stage_lower_bounds(young, old, G)
+    assert all(lower[k] <= v for k, v in zip(KEYS, optimum))
+
+    # 段階1が下界に一致するときは、若手の被り数の最小値で強めた下界も最適値以下になる
+    min_young = 0
+    if optimum[0] == lower["young"]:
+        min_young = min(c // G for c in young)
+        tight = stage_lower_bounds(young, old, G, min_young=min_young)
+        assert all(tight[k] <= v for k, v in zip(KEYS, optimum))
+
+    # 最適解の最大値・最小値は、変数の上下限に収まる
+    bounds = overlap_bounds(
+        young,
+        old,
+        G,
+        balanced_sizes(N, G),
+        balanced_sizes(age_list.count(0), G),
+        min_young=min_young,
+    )
+    for key in KEYS:
+        max_name, min_name = VARIABLES[key]
+        high, low = values[key]
+        assert bounds[max_name][0] <= high <= bounds[max_name][1]
+        assert bounds[min_name][0] <= low <= bounds[min_name][1]
+
+
+@pytest.mark.parametrize("name, size", sorted(BASELINE))
+def test_lower_bounds_do_not_exceed_baseline(name, size):
+    _, employees = load_employees(INPUT / f"{name}.csv")
+    young, old = team_totals(employees.team_list, employees.age_list)
+    G = employees.N // size
+    optimum = BASELINE[(name, size)]
+    lower = stage_lower_bounds(young, old, G)
+    assert all(lower[k] <= v for k, v in zip(KEYS, optimum))
+    if optimum[0] == lower["young"]:
+        min_young = min(c // G for c in young)
+        tight = stage_lower_bounds(young, old, G, min_young=min_young)
+        assert all(tight[k] <= v for k, v in zip(KEYS, optimum))
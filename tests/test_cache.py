@@ -0,0 +1,66 @@
+import pathlib
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from allocation import exact_assignment  # noqa: E402
+from cache import SolutionCache  # noqa: E402
+from heuristic import balanced_sizes, overlap_values  # noqa: E402
+
+
+def test_hit_on_permuted_teams_keeps_quality(tmp_path):
+    # チーム名と社員の並びを入れ替えた同じ構成の問題では、保存した解と同じ被り数になる
+    rng = random.Random(0)
+    N, G = 50, 6
+    team_list = [rng.randrange(6) for _ in range(N)]
+    age_list = [int(rng.random() < 0.4) for _ in range(N)]
+    assignment = exact_assignment(
+        G,
+        team_list,
+        age_list,
+        balanced_sizes(N, G),
+        balanced_sizes(N - sum(age_list), G),
+    )
+    cache = SolutionCache(str(tmp_path))
+    cache.put(G, team_list, age_list, assignment)
+
+    rename = {t: f"T{k}" for k, t in enumerate(rng.sample(range(6), 6))}
+    order = list(range(N))
+    rng.shuffle(order)
+    permuted_teams = [rename[team_list[n]] for n in order]
+    permuted_ages = [age_list[n] for n in order]
+
+    hit = cache.get(G, permuted_teams, permuted_ages)
+    assert hit is not None
+    assert overlap_values(hit, G, permuted_teams, permuted_ages) == overlap_values(
+        assignment, G, team_list, age_list
+    )
+    assert sorted(np.bincount(hit, minlength=G).tolist()) == sorted(
+        np.bincount(assignment, minlength=G).tolist()
+    )
+
+
+def test_miss_on_different_profile(tmp_path):
+    cache = SolutionCache(str(tmp_path))
+    cache.put(2, [0, 0, 1, 1], [0, 1, 0, 1], [0, 1, 0, 1])
+    assert cache.get(2, [0, 0, 1, 1], [0, 0, 0, 1]) is None
+
+
+def test_put_leaves_no_temporary_files(tmp_path):
+    cache = SolutionCache(str(tmp_path))
+    cache.put(2, [0, 0, 1, 1], [0, 1, 0, 1], [0, 1, 0, 1])
+    cache.put(2, [0, 0, 1, 1], [0, 1, 0, 1], [1, 0, 1, 0])
+    assert [p.suffix for p in tmp_path.iterdir()] == [".json"]
+    assert cache.get(2, [0, 0, 1, 1], [0, 1, 0, 1]) == [1, 0, 1, 0]
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    # 書きかけ等で壊れたファイルは、例外にせず保存されていないものとする
+    cache = SolutionCache(str(tmp_path))
+    cache.put(2, [0, 0, 1, 1], [0, 1, 0, 1], [0, 1, 0, 1])
+    (entry,) = tmp_path.iterdir()
+    entry.write_text('{"G": 2, "counts": [[', encoding="utf-8")
+    assert cache.get(2, [0, 0, 1, 1], [0, 1, 0, 1]) is None
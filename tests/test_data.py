@@ -0,0 +1,37 @@
+import pathlib
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from data import EmployeeData  # noqa: E402
+
+
+@pytest.mark.parametrize("s", [1, 2, 3])
+def test_legacy_stream_matches_fixtures(s):
+    # 偏りのない設定では、従来のnp.random.seedと同じデータになる
+    fixture = pathlib.Path(__file__).resolve().parent.parent / "data" / "input"
+    expected = pd.read_csv(fixture / f"employee_data_7_100_0.4_{s}.csv", dtype=str)
+    for chunk_size in (100000, 13):
+        df = pd.concat(EmployeeData(100, 7, 0.4).generate(s, chunk_size))
+        assert df.reset_index(drop=True).equals(expected)
+
+
+def test_legacy_stream_matches_random_seed():
+    data = EmployeeData(250, 5, 0.3)
+    np.random.seed(4)
+    teams = np.random.choice(data.idx2teams_name, 250)
+    ages = np.random.choice(data.idx2age_name, 250, p=[0.3, 0.7])
+    df = pd.concat(data.generate(4, chunk_size=60))
+    assert (df[EmployeeData.team_col_name].to_numpy() == teams).all()
+    assert (df[EmployeeData.age_col_name].to_numpy() == ages).all()
+
+
+def test_skewed_stream_does_not_depend_on_chunk_size():
+    data = EmployeeData(300, 6, 0.4, team_skew=1.0)
+    whole = pd.concat(data.generate(5, chunk_size=1000)).reset_index(drop=True)
+    chunked = pd.concat(data.generate(5, chunk_size=7)).reset_index(drop=True)
+    assert whole.equals(chunked)
@@ -0,0 +1,70 @@
+import pathlib
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+import evaluator  # noqa: E402
+
+
+def make_groups(seed):
+    # チームの番号は連続しない値とする(countsの軸はチームの番号の順)
+    rng = random.Random(seed)
+    N, G = 60, 7
+    team_list = [rng.choice([2, 5, 9, 11]) for _ in range(N)]
+    age_list = [int(rng.random() < 0.4) for _ in range(N)]
+    assignment = [n % G for n in range(N)]
+    rng.shuffle(assignment)
+    # 従来のapp.pyと同じ、グループごとの社員・チーム・年齢層のリスト
+    members = [[n for n in range(N) if assignment[n] == g] for g in range(G)]
+    teams = [[team_list[n] for n in m] for m in members]
+    ages = [[age_list[n] for n in m] for m in members]
+    return G, team_list, age_list, assignment, members, teams, ages
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_matches_loop_baseline(seed):
+    G, team_list, age_list, assignment, members, teams, ages = make_groups(seed)
+    team_ids, counts = evaluator.count_tensor(assignment, team_list, age_list, G)
+    assert team_ids.tolist() == sorted(set(team_list))
+
+    # グループごとの内訳: list.countで数えた人数
+    breakdown = evaluator.group_breakdown(counts)
+    for g in range(G):
+        assert breakdown["age"][g].tolist() == [ages[g].count(0), ages[g].count(1)]
+        assert breakdown["team"][g].tolist() == [teams[g].count(t) for t in team_ids]
+
+    # チームごとの最大被り数: グループごとにlist.countで数えた人数の最大値
+    def team_count(g, t, a=None):
+        return [
+            team_list[n] for n in members[g] if a is None or age_list[n] == a
+        ].count(t)
+
+    maxima = evaluator.team_max_overlaps(counts)
+    for k, t in enumerate(team_ids):
+        assert maxima["all"][k] == max(team_count(g, t) for g in range(G))
+        assert maxima["young"][k] == max(team_count(g, t, 0) for g in range(G))
+        assert maxima["old"][k] == max(team_count(g, t, 1) for g in range(G))
+
+    # 各段階の(最大値, 最小値)
+    young = [team_count(g, t, 0) for g in range(G) for t in team_ids]
+    old = [team_count(g, t, 1) for g in range(G) for t in team_ids]
+    with_young = [o for y, o in zip(young, old) if y > 0] or [0]
+    assert evaluator.overlap_values(counts) == {
+        "young": (max(young), min(young)),
+        "young_with_old": (max(with_young), min(with_young)),
+        "old": (max(old), min(old)),
+    }
+
+    # 2人以上いる(チーム, 年齢層)
+    duplicated = evaluator.duplicated_members(counts, team_ids)
+    for g in range(G):
+        expected = {}
+        for t in team_ids:
+            for a in (0, 1):
+                c = team_count(g, t, a)
+                if c > 1:
+                    expected[(int(t), a)] = c
+        assert duplicated[g] == expected
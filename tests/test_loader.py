@@ -0,0 +1,29 @@
+import io
+import pathlib
+import sys
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from loader import load_employees  # noqa: E402
+
+HEADER = "社員番号,所属チーム,年齢層\n"
+
+
+def test_encode_numbers_teams_by_name():
+    source = io.StringIO(
+        HEADER + "a1,チームB,若手\na2,チームA,ベテラン\na3,チームB,若手\n"
+    )
+    _, table = load_employees(source)
+    assert table.team_names == ["チームA", "チームB"]
+    assert table.team_list == [1, 0, 1]
+    assert table.age_list == [0, 1, 0]
+
+
+def test_duplicated_employee_numbers_are_rejected():
+    source = io.StringIO(
+        HEADER + "a1,チームA,若手\na2,チームB,ベテラン\na1,チームB,若手\n"
+    )
+    with pytest.raises(ValueError, match="a1"):
+        load_employees(source)
@@ -0,0 +1,41 @@
+import pathlib
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from allocation import exact_assignment  # noqa: E402
+from heuristic import balanced_sizes  # noqa: E402
+from local_search import LocalSearch  # noqa: E402
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_swap_delta_matches_full_evaluation(seed):
+    # 差分更新した目的関数値が、入れ替え後の割り当てから作り直した値と一致する
+    rng = random.Random(seed)
+    N, G = 60, 7
+    team_list = [rng.randrange(5) * 3 + 1 for _ in range(N)]
+    age_list = [int(rng.random() < 0.4) for _ in range(N)]
+    initial = exact_assignment(
+        G,
+        team_list,
+        age_list,
+        balanced_sizes(N, G),
+        balanced_sizes(N - sum(age_list), G),
+    )
+    search = LocalSearch(G, team_list, age_list, initial, seed=seed)
+    for _ in range(300):
+        a = rng.randrange(2)
+        i, j = rng.sample(search.by_age[a].tolist(), 2)
+        if search.assign[i] == search.assign[j]:
+            continue
+        search.swap(i, j)
+        full = LocalSearch(G, team_list, age_list, search.assign.tolist())
+        assert search.extremes == full.extremes
+        assert search.hist == full.hist
+        assert search.score() == full.score()
+        assert (search.counts == full.counts).all()
+        assert np.bincount(search.assign, minlength=G).tolist() == balanced_sizes(N, G)
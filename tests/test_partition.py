@@ -0,0 +1,65 @@
+import pathlib
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from bounds import stage_lower_bounds  # noqa: E402
+from heuristic import balanced_sizes  # noqa: E402
+from loader import load_employees  # noqa: E402
+from partition import solve_partitioned, split_blocks  # noqa: E402
+from test_social_gathering import INPUT  # noqa: E402
+
+NAMES = ["employee_data_7_100_0.4_1", "employee_data_7_100_0.4_2", "sample_input"]
+
+
+def test_blocks_partition_groups_and_members():
+    _, employees = load_employees(INPUT / "sample_input.csv")
+    G = employees.N // 7
+    age = np.asarray(employees.age_list)
+    sizes = balanced_sizes(employees.N, G)
+    young_sizes = balanced_sizes(int((age == 0).sum()), G)
+    blocks = split_blocks(G, employees.team_list, employees.age_list, 3)
+    assert len(blocks) == 3
+
+    groups = np.concatenate([g for g, _ in blocks])
+    members = np.concatenate([m for _, m in blocks])
+    assert sorted(groups.tolist()) == list(range(G))
+    assert sorted(members.tolist()) == list(range(employees.N))
+    # ブロックの人数と若手の人数は、ブロックのグループの人数の合計と一致する
+    for g, m in blocks:
+        assert len(m) == sum(sizes[k] for k in g)
+        assert (age[m] == 0).sum() == sum(young_sizes[k] for k in g)
+
+
+@pytest.mark.parametrize("name", NAMES)
+def test_stitched_solution_reaches_bound(name):
+    _, employees = load_employees(INPUT / f"{name}.csv")
+    G = employees.N // 5
+    result = solve_partitioned(
+        employees.N,
+        G,
+        employees.team_list,
+        employees.age_list,
+        block_size=50,
+        repair_time=5,
+    )
+    assert result.meta["blocks"] == 2
+    team = np.asarray(employees.team_list)
+    age = np.asarray(employees.age_list)
+    young = np.bincount(team[age == 0], minlength=team.max() + 1)
+    old = np.bincount(team[age == 1], minlength=team.max() + 1)
+    present = (young + old) > 0
+    bounds = stage_lower_bounds(
+        young[present].tolist(),
+        old[present].tolist(),
+        G,
+        min_young=int((young[present] // G).min()),
+    )
+    assert result.ranges() == tuple(
+        bounds[key] for key in ("young", "young_with_old", "old")
+    )
+    sizes = np.bincount(result.assignment, minlength=G)
+    assert sorted(sizes.tolist()) == sorted(balanced_sizes(employees.N, G))
@@ -0,0 +1,74 @@
+import pathlib
+import sys
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from heuristic import balanced_sizes  # noqa: E402
+from loader import load_employees  # noqa: E402
+from repair import repair_assignment, target_sizes  # noqa: E402
+from social_gathering import SolverOptions, solve_social_gathering  # noqa: E402
+from test_social_gathering import INPUT  # noqa: E402
+
+
+def solve_sample():
+    _, employees = load_employees(INPUT / "sample_input.csv")
+    return solve_social_gathering(
+        employees.N,
+        employees.N // 7,
+        employees.team_list,
+        employees.age_list,
+        options=SolverOptions(msg=False),
+        aggregate=True,
+    )
+
+
+def test_target_sizes_keep_larger_groups():
+    # 今の人数の多いグループから+1人とする
+    assert target_sizes([3, 5, 4], 13, 3) == [4, 5, 4]
+    assert target_sizes([5, 3, 5], 12, 3) == [4, 4, 4]
+
+
+def test_replacement_stays_in_place():
+    # 欠席者と同じチーム・年齢層の社員を追加すると、欠席者のグループだけを解き直し、
+    # 他の社員はグループが変わらない
+    previous = solve_sample()
+    n = 0
+    result = repair_assignment(
+        previous,
+        removed=[n],
+        added_team=[previous.team[n]],
+        added_age=[previous.age[n]],
+        extra_groups=0,
+    )
+    assert result.meta["groups"] == 1
+    assert result.meta["moved"] == 0
+    assert (result.assignment[:-1] == previous.assignment[1:]).all()
+    assert result.assignment[-1] == previous.assignment[n]
+
+
+def test_repair_reaches_target_sizes():
+    previous = solve_sample()
+    removed = [m[0] for m in previous.members[:3]]
+    result = repair_assignment(
+        previous, removed=removed, added_team=[0, 1], added_age=[0, 1]
+    )
+    assert result.N == previous.N - 1
+
+    # 人数と若手の人数はできるだけ均等になる
+    sizes = np.bincount(result.assignment, minlength=result.G)
+    young = np.bincount(result.assignment[result.age == 0], minlength=result.G)
+    assert sorted(sizes.tolist()) == sorted(balanced_sizes(result.N, result.G))
+    assert sorted(young.tolist()) == sorted(
+        balanced_sizes(int((result.age == 0).sum()), result.G)
+    )
+
+    # グループが変わった社員は、解き直したグループの間でだけ動く
+    keep = np.setdiff1d(np.arange(previous.N), removed)
+    before = previous.assignment[keep]
+    after = result.assignment[: len(keep)]
+    moved = before != after
+    assert moved.sum() == result.meta["moved"]
+    touched = set(before[moved].tolist()) | set(after[moved].tolist())
+    assert len(touched) <= result.meta["groups"] < result.G
@@ -0,0 +1,54 @@
+import json
+import pathlib
+import pickle
+import sys
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from result import GroupingResult  # noqa: E402
+
+TEAM = [3, 7, 7, 3, 9, 9, 3, 7]
+AGE = [0, 1, 0, 1, 0, 1, 1, 1]
+ASSIGNMENT = [0, 1, 1, 0, 0, 1, 0, 1]
+
+
+def make_result():
+    return GroupingResult(
+        2, ASSIGNMENT, TEAM, AGE, {"stages": [{"stage": 1, "status": "optimal"}]}
+    )
+
+
+def assert_same(restored, result):
+    assert restored.G == result.G
+    assert (restored.assignment == result.assignment).all()
+    assert restored.meta == result.meta
+    assert restored.members == result.members
+    assert restored.ages == result.ages
+    assert restored.teams == result.teams
+    assert (restored.counts == result.counts).all()
+    assert restored.ranges() == result.ranges()
+
+
+def test_unpacks_like_the_tuple():
+    result_member, result_age, result_team = make_result()
+    assert result_member == [[0, 3, 4, 6], [1, 2, 5, 7]]
+    assert result_age == [[0, 1, 0, 1], [1, 0, 1, 1]]
+    assert result_team == [[3, 3, 9, 3], [7, 7, 9, 7]]
+
+
+def test_to_dict_round_trip():
+    result = make_result()
+    data = json.loads(json.dumps(result.to_dict()))
+    assert_same(GroupingResult.from_dict(data), result)
+
+
+def test_pickle_round_trip():
+    result = make_result()
+    # 計算済みのグループごとのリストは送らず、復元後に作り直す
+    assert result.members
+    restored = pickle.loads(pickle.dumps(result))
+    assert restored._order is None and restored._counts is None
+    assert restored.assignment.dtype == np.int32
+    assert_same(restored, result)
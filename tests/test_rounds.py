@@ -0,0 +1,32 @@
+import json
+import pathlib
+import sys
+
+import numpy as np
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from rounds import PairHistory  # noqa: E402
+
+
+def round_trip(history):
+    return PairHistory.from_dict(json.loads(json.dumps(history.to_dict())))
+
+
+def test_round_trip_keeps_id_types():
+    history = PairHistory()
+    history.add_round([[1, 2, 3], [4, 5]])
+    history.add_round([["001", "002"], ["003", "004"]])
+    loaded = round_trip(history)
+    assert loaded.rounds == 2
+    assert loaded.partners == history.partners
+    assert loaded.count(1, 2) == 1 and loaded.count("1", "2") == 0
+    assert loaded.count("001", "002") == 1
+
+
+def test_round_trip_numpy_ids():
+    history = PairHistory()
+    history.add_round([np.array([3, 7, 9]), np.array([1, 2])])
+    loaded = round_trip(history)
+    assert loaded.count(3, 9) == 1
+    assert loaded.index_partners([1, 2, 3]) == history.index_partners([1, 2, 3])
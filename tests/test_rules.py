@@ -0,0 +1,87 @@
+import pathlib
+import random
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from rules import GroupingRules  # noqa: E402
+from social_gathering import SolverOptions, solve_social_gathering  # noqa: E402
+
+
+def make_problem(seed):
+    rng = random.Random(seed)
+    N, G = 40, 5
+    team_list = [rng.randrange(4) for _ in range(N)]
+    age_list = [int(rng.random() < 0.5) for _ in range(N)]
+    assignment = [n % G for n in range(N)]
+    return rng, N, G, team_list, age_list, assignment
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_repair_satisfies_rules(seed):
+    rng, N, G, team_list, age_list, assignment = make_problem(seed)
+    people = rng.sample(range(N), 10)
+    rules = GroupingRules(
+        together=[people[0:3], people[3:5]],
+        separate=[people[5:8], [people[0], people[8]]],
+    )
+    rules.validate(N)
+    repaired = rules.repair(assignment, age_list)
+    assert rules.violations(repaired) == 0
+
+    # 入れ替えだけで直すため、グループの人数と若手の人数は変わらない
+    before, after = np.asarray(assignment), np.asarray(repaired)
+    young = np.asarray(age_list) == 0
+    assert (
+        np.bincount(after, minlength=G).tolist()
+        == np.bincount(before, minlength=G).tolist()
+    )
+    assert (
+        np.bincount(after[young], minlength=G).tolist()
+        == np.bincount(before[young], minlength=G).tolist()
+    )
+
+
+def test_validate_rejects_contradiction():
+    rules = GroupingRules(together=[[0, 1], [1, 2]], separate=[[0, 2]])
+    with pytest.raises(ValueError):
+        rules.validate(4)
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        # 12人を3グループに分けると1グループは4人のため、6人は同じグループに入りきらない
+        GroupingRules(together=[[0, 1, 2, 3, 4, 5]]),
+        # 重なる指定をまとめると5人になる
+        GroupingRules(together=[[0, 1, 2], [2, 3, 4]]),
+        # 4人を3グループに別々に分けることはできない
+        GroupingRules(separate=[[0, 1, 2, 3]]),
+    ],
+)
+def test_validate_rejects_oversized_rules(rules):
+    rules.validate(12)
+    with pytest.raises(ValueError):
+        rules.validate(12, 3)
+
+
+def test_validate_accepts_rules_that_fit():
+    GroupingRules(together=[[0, 1, 2, 3]], separate=[[4, 5, 6]]).validate(12, 3)
+
+
+def test_solve_with_rules():
+    rng, N, G, team_list, age_list, _ = make_problem(3)
+    people = rng.sample(range(N), 6)
+    rules = GroupingRules(together=[people[0:2]], separate=[people[2:6]])
+    result = solve_social_gathering(
+        N,
+        G,
+        team_list,
+        age_list,
+        options=SolverOptions(msg=False, time_limit=20),
+        rules=rules,
+    )
+    assert rules.violations(result.assignment.tolist()) == 0
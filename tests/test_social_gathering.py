@@ -0,0 +1,120 @@
+import pathlib
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from loader import load_employees  # noqa: E402
+from social_gathering import SolverOptions, solve_social_gathering  # noqa: E402
+
+INPUT = pathlib.Path(__file__).resolve().parent.parent / "data" / "input"
+
+# 段階ごとに最適値を固定していた変更前の実装で得られた、(若手, 若手と同じグループのベテラン, ベテラン)の
+# チーム被りの最大値と最小値の差
+BASELINE = {
+    ("employee_data_7_100_0.4_1", 5): (1, 0, 1),
+    ("employee_data_7_100_0.4_1", 7): (1, 0, 2),
+    ("employee_data_7_100_0.4_1", 10): (1, 0, 6),
+    ("employee_data_7_100_0.4_2", 5): (1, 0, 1),
+    ("employee_data_7_100_0.4_2", 7): (1, 0, 3),
+    ("employee_data_7_100_0.4_2", 10): (2, 0, 2),
+    ("employee_data_7_100_0.4_3", 5): (1, 0, 1),
+    ("employee_data_7_100_0.4_3", 7): (1, 0, 2),
+    ("employee_data_7_100_0.4_3", 10): (1, 0, 2),
+    ("sample_input", 5): (1, 0, 1),
+    ("sample_input", 7): (1, 0, 2),
+    ("sample_input", 10): (1, 0, 6),
+}
+
+
+@pytest.mark.parametrize("name, size", sorted(BASELINE))
+def test_not_worse_than_baseline(name, size):
+    _, employees = load_employees(INPUT / f"{name}.csv")
+    result = solve_social_gathering(
+        employees.N,
+        employees.N // size,
+        employees.team_list,
+        employees.age_list,
+        options=SolverOptions(msg=False),
+        aggregate=True,
+    )
+    assert result.ranges() <= BASELINE[(name, size)]
+
+
+@pytest.mark.parametrize("aggregate", [False, True])
+def test_previous_stage_range_is_not_pinned(aggregate):
+    # 段階1の(最大値, 最小値)を固定すると、同じ幅の別の範囲を選べず段階3が2になる例
+    team_list = [3, 7, 7, 3, 9, 9, 3, 7]
+    age_list = [0, 1, 0, 1, 0, 1, 1, 1]
+    result = solve_social_gathering(
+        8,
+        2,
+        team_list,
+        age_list,
+        options=SolverOptions(msg=False),
+        aggregate=aggregate,
+    )
+    assert result.ranges() == (1, 0, 1)
+
+
+def test_binary_and_aggregated_agree():
+    _, employees = load_employees(INPUT / "sample_input.csv")
+    ranges = [
+        solve_social_gathering(
+            employees.N,
+            employees.N // 7,
+            employees.team_list,
+            employees.age_list,
+            options=SolverOptions(msg=False),
+            aggregate=aggregate,
+        ).ranges()
+        for aggregate in (False, True)
+    ]
+    assert ranges[0] == ranges[1]
+
+
+@pytest.mark.parametrize("size", [5, 7])
+def test_weighted_matches_lexicographic(size):
+    _, employees = load_employees(INPUT / "employee_data_7_100_0.4_2.csv")
+    results = [
+        solve_social_gathering(
+            employees.N,
+            employees.N // size,
+            employees.team_list,
+            employees.age_list,
+            options=SolverOptions(msg=False),
+            aggregate=True,
+            objective=objective,
+        )
+        for objective in ("lexicographic", "weighted")
+    ]
+    assert results[0].ranges() == results[1].ranges()
+    assert results[1].meta["lexicographic"]
+
+
+def test_time_limit_is_per_stage():
+    # 範囲の組が複数ある段階でも、段階全体の計算時間がtime_limitに収まる
+    _, employees = load_employees(INPUT / "employee_data_7_100_0.4_3.csv")
+    time_limit = 1.0
+    started = {}
+    elapsed = {}
+
+    def progress(record):
+        if record["status"] == "started":
+            started[record["stage"]] = time.perf_counter()
+        else:
+            elapsed[record["stage"]] = time.perf_counter() - started[record["stage"]]
+
+    result = solve_social_gathering(
+        employees.N,
+        employees.N // 10,
+        employees.team_list,
+        employees.age_list,
+        options=SolverOptions(msg=False, time_limit=time_limit),
+        progress=progress,
+    )
+    assert max(record["windows"] for record in result.meta["stages"]) >= 2
+    # ソルバーの起動やモデルの書き出しの分だけ超えることがある
+    assert max(elapsed.values()) < time_limit + 0.5
@@ -0,0 +1,30 @@
+import pathlib
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+
+from loader import load_employees  # noqa: E402
+from social_gathering import SolverOptions, solve_social_gathering  # noqa: E402
+from sweep import init_worker, solve_size  # noqa: E402
+from test_social_gathering import BASELINE, INPUT  # noqa: E402
+
+
+def test_solve_size_reuses_member_index():
+    _, employees = load_employees(INPUT / "sample_input.csv")
+    init_worker(employees.team_list, employees.age_list)
+    record = solve_size(7, "milp", True, SolverOptions(msg=False))
+    ranges = (record["young"], record["young_with_old"], record["old"])
+    assert ranges == BASELINE[("sample_input", 7)]
+    assert record["optimal"]
+    assert all(b <= r for b, r in zip(record["lower_bound"], ranges))
+
+    # 事前に作った索引を渡しても、渡さないときと同じ解になる
+    result = solve_social_gathering(
+        employees.N,
+        employees.N // 7,
+        employees.team_list,
+        employees.age_list,
+        aggregate=True,
+        options=SolverOptions(msg=False),
+    )
+    assert result.ranges() == ranges
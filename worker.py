@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import queue
+import signal
+
+from social_gathering import solve_social_gathering
+
+
+def run_solve(messages, args, kwargs):
+    # 別プロセスで実行される関数
+    # 進捗は("progress", 辞書)、結果は("result", 結果)、例外は("error", 文字列)としてキューに送る
+    if hasattr(os, "setpgrp"):
+        # 中断時にソルバー(CBC)の子プロセスもまとめて終了できるよう、プロセスグループを分ける
+        os.setpgrp()
+    try:
+        result = solve_social_gathering(
+            *args, progress=lambda record: messages.put(("progress", record)), **kwargs
+        )
+    except Exception as e:
+        messages.put(("error", repr(e)))
+    else:
+        messages.put(("result", result))
+
+
+class SolveWorker:
+    def __init__(self, *args, **kwargs) -> None:
+        """
+        solve_social_gatheringを別プロセスで実行し、進捗の取得と中断を行う
+        引数はsolve_social_gatheringと同じ(progressは除く)
+        """
+        context = multiprocessing.get_context("spawn")
+        self.messages = context.Queue()
+        self.process = context.Process(
+            target=run_solve, args=(self.messages, args, kwargs), daemon=True
+        )
+        self.process.start()
+
+        # progress: 受け取った進捗のリスト
+        self.progress = []
+        self.result = None
+        self.error = None
+
+    def poll(self):
+        """
+        届いた進捗と結果を取り込む
+        返り値: 終了したか(結果またはエラーを受け取ったか、プロセスが終了したか)
+        """
+        # 先に生死を確認しておくと、終了済みのプロセスが送った結果は必ず取り込める
+        alive = self.process.is_alive()
+        while True:
+            try:
+                kind, payload = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                self.progress.append(payload)
+            elif kind == "result":
+                self.result = payload
+            else:
+                self.error = payload
+        if self.result is None and self.error is None and not alive:
+            # 結果を送らずに終了した(強制終了された等)
+            self.error = f"計算プロセスが終了しました(終了コード: {self.process.exitcode})"
+        return self.result is not None or self.error is not None
+
+    def cancel(self):
+        # 計算を中断する(ソルバーの子プロセスも終了する)
+        if not self.process.is_alive():
+            return
+        if hasattr(os, "killpg"):
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self.process.terminate()
+        self.process.join(timeout=5)